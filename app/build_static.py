@@ -0,0 +1,72 @@
+"""Build content-hashed, precompressed frontend assets.
+
+Usage: python -m app.build_static
+
+Writes `<STATIC_DIR>/dist/` with `app.<hash>.js` / `styles.<hash>.css`,
+their `.gz` (and `.br` when brotli is installed) variants, a rewritten
+`index.html` referencing them and a `manifest.json`. The app serves
+`dist/index.html` whenever it exists.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+from typing import Dict
+
+from .config import STATIC_DIR
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+ASSETS = ("app.js", "styles.css")
+
+
+def build(static_dir: str = STATIC_DIR) -> Dict[str, str]:
+    dist = os.path.join(static_dir, "dist")
+    staging = dist + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    manifest: Dict[str, str] = {}
+    for name in ASSETS:
+        with open(os.path.join(static_dir, name), "rb") as f:
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        stem, ext = os.path.splitext(name)
+        hashed = f"{stem}.{digest}{ext}"
+        out = os.path.join(staging, hashed)
+        with open(out, "wb") as f:
+            f.write(data)
+        with open(out + ".gz", "wb") as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(out + ".br", "wb") as f:
+                f.write(brotli.compress(data, quality=11))
+        manifest[name] = f"dist/{hashed}"
+
+    with open(os.path.join(static_dir, "index.html"), encoding="utf-8") as f:
+        html = f.read()
+    for name, hashed in manifest.items():
+        html = html.replace(f"/static/{name}", f"/static/{hashed}")
+    with open(os.path.join(staging, "index.html"), "w", encoding="utf-8") as f:
+        f.write(html)
+    with open(os.path.join(staging, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    # Swap the whole folder so a running server never sees a half-built dist
+    old = dist + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.isdir(dist):
+        os.rename(dist, old)
+    os.rename(staging, dist)
+    shutil.rmtree(old, ignore_errors=True)
+    return manifest
+
+
+if __name__ == "__main__":
+    for src, out in build().items():
+        print(f"{src} -> {out}")
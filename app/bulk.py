@@ -0,0 +1,191 @@
+import codecs
+import json
+import re
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from .config import BULK_MAX_RECORD_SIZE
+
+
+_decoder = json.JSONDecoder()
+# Characters that matter when looking for where an array element ends
+_STRUCTURE = re.compile(r'[\\"\[\]{},]')
+
+
+class _ElementScan:
+    """Finds the `,` or `]` ending an array element, outside strings and brackets.
+
+    Resumable: an element arriving over many chunks is scanned once, however
+    it is split, and even when it isn't valid JSON.
+    """
+
+    __slots__ = ("pos", "depth", "in_string")
+
+    def __init__(self):
+        self.pos = 0
+        self.depth = 0
+        self.in_string = False
+
+    def end(self, text: str) -> Optional[int]:
+        """Index of the separator after the element, None until it has arrived."""
+        i = self.pos
+        while True:
+            m = _STRUCTURE.search(text, i)
+            if m is None:
+                self.pos = len(text)
+                return None
+            i = m.start()
+            c = text[i]
+            if self.in_string:
+                if c == "\\":
+                    if i + 1 == len(text):
+                        # Resume at the backslash once the escaped character is here
+                        self.pos = i
+                        return None
+                    i += 1
+                elif c == '"':
+                    self.in_string = False
+            elif c == '"':
+                self.in_string = True
+            elif c in "[{":
+                self.depth += 1
+            elif self.depth > 0:
+                if c in "]}":
+                    self.depth -= 1
+            elif c in ",]":
+                self.pos = i
+                return i
+            i += 1
+
+
+def _parse_element(text: str) -> Tuple[Any, Optional[str]]:
+    try:
+        value, end = _decoder.raw_decode(text)
+    except json.JSONDecodeError as e:
+        return None, f"JSON: {e.msg}"
+    if text[end:].strip():
+        return None, "JSON: лишние символы после значения"
+    return value, None
+
+
+async def iter_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, Any, Optional[str]]]:
+    """Parse an NDJSON body or a JSON array incrementally, as chunks arrive.
+
+    Yields (record number, value, error) — record numbers are 1-based NDJSON
+    line numbers (or array positions); `error` is set instead of `value` for
+    records that fail to parse, and parsing goes on with the next line or
+    array element. Only the current partial record is buffered, up to
+    BULK_MAX_RECORD_SIZE characters: a longer NDJSON line is reported and
+    skipped, a longer array element ends the stream with an error.
+    """
+    text = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    buf = ""
+    mode: Optional[str] = None
+    number = 0
+    done = False
+    scan: Optional[_ElementScan] = None  # set while an element doesn't parse yet
+    skip_line = False
+    too_long = f"JSON: запись длиннее {BULK_MAX_RECORD_SIZE} символов"
+
+    def drain_array(final: bool):
+        nonlocal buf, number, done, scan
+        while not done:
+            if scan is None:
+                buf = buf.lstrip(" \t\r\n,")
+                if not buf:
+                    return
+                if buf[0] == "]":
+                    buf = ""
+                    done = True
+                    return
+                try:
+                    value, end = _decoder.raw_decode(buf)
+                except json.JSONDecodeError:
+                    # Incomplete or malformed: find the element's end either way
+                    scan = _ElementScan()
+                else:
+                    if end == len(buf) and not final:
+                        # A number at the end of the buffer may go on in the next chunk
+                        return
+                    number += 1
+                    buf = buf[end:]
+                    yield number, value, None
+                    continue
+            end = scan.end(buf)
+            if end is None:
+                if not final and len(buf) <= BULK_MAX_RECORD_SIZE:
+                    return
+                number += 1
+                error = _parse_element(buf)[1] if final else too_long
+                buf = ""
+                done = True
+                yield number, None, error
+                return
+            number += 1
+            value, error = _parse_element(buf[:end])
+            buf = buf[end:]
+            scan = None
+            yield number, value, error
+
+    def parse_line(line: str):
+        try:
+            return json.loads(line), None
+        except json.JSONDecodeError as e:
+            return None, f"JSON: {e.msg}"
+
+    async for chunk in chunks:
+        if done:
+            continue
+        buf += text.decode(chunk)
+        if mode is None:
+            stripped = buf.lstrip()
+            if not stripped:
+                continue
+            mode = "array" if stripped[0] == "[" else "ndjson"
+            buf = stripped[1:] if mode == "array" else buf
+        if mode == "array":
+            for rec in drain_array(final=False):
+                yield rec
+            continue
+        if skip_line:
+            newline = buf.find("\n")
+            if newline < 0:
+                buf = ""
+                continue
+            buf = buf[newline + 1:]
+            skip_line = False
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            number += 1
+            if line.strip():
+                value, error = parse_line(line)
+                yield number, value, error
+        if len(buf) > BULK_MAX_RECORD_SIZE:
+            number += 1
+            buf = ""
+            skip_line = True
+            yield number, None, too_long
+
+    buf += text.decode(b"", final=True)
+    if mode == "array":
+        for rec in drain_array(final=True):
+            yield rec
+        if not done:
+            yield number + 1, None, "JSON: массив не закрыт"
+    elif buf.strip() and not skip_line:
+        number += 1
+        value, error = parse_line(buf)
+        yield number, value, error
+
+
+async def iter_lines(chunks: AsyncIterator[bytes], encoding: str = "utf-8") -> AsyncIterator[str]:
+    """Decode a streamed text body and yield it line by line."""
+    text = codecs.getincrementaldecoder(encoding)(errors="replace")
+    buf = ""
+    async for chunk in chunks:
+        buf += text.decode(chunk)
+        *lines, buf = buf.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buf += text.decode(b"", final=True)
+    if buf:
+        yield buf.rstrip("\r")
@@ -0,0 +1,356 @@
+"""Per-generation decode bundles: everything a device needs to decode a generation's frames.
+
+A bundle is built from the generation's non-deprecated canData rows, sorted
+by (CAN ID, 29-bit flag, start bit, parameter) so clients can binary-search
+it. Each entry carries the PID, payload mask, bit window (start bit and
+length, frame bit numbering as in `app.decoder`), byte order, formula text
+and, when the formula is `scale * value + offset`, the two numbers so the
+formula need not be evaluated at all.
+
+Bundles are written once per content hash under `BUNDLE_DIR/<generation>/`
+as JSON and packed binary, each with `.gz`/`.br` siblings; a superseded
+bundle is deleted only `BUNDLE_GRACE_S` after its replacement was written. Triggers on
+canData bump a per-generation version in `canDataVersions`; a request only
+looks at that counter and rebuilds (rereads and rehashes the rows) when it
+moved, and files are rewritten only when the content hash changed.
+
+Binary layout (little-endian):
+    header  "WCDB", u16 format, u16 reserved, u32 generation id,
+            u32 entry count, 32 bytes SHA-256 content hash, u32 strings size
+    entries ENTRY_STRUCT each (see below), in bundle order
+    strings NUL-terminated UTF-8 formula texts; an entry's `formula` field
+            is a byte offset into them, 0xFFFFFFFF for none
+Entry: u32 CAN ID, u8 flags (1 = 29-bit, 2 = big-endian, 4 = affine,
+8 = formula error), u8 start bit, u8 length in bits, u8 reserved, 8 bytes
+payload mask, u32 parameter id, i32 dimension id, i16 CAN bus id, i16 bus
+type, i16 condition offset, i16 condition length (-1 = none), f64 scale,
+f64 offset (1 and 0 unless affine), u32 formula offset.
+"""
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from .config import BUNDLE_DIR, BUNDLE_ENDIAN, BUNDLE_GRACE_S, TABLES
+from .db import db
+from .decoder import FormulaError, affine_formula
+from .exports import write_atomic
+
+try:  # optional: brotli siblings are only written when the package is installed
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+BUNDLE_FORMAT = 1
+BUNDLE_FORMATS = ("json", "bin")
+VERSION_TABLE = "canDataVersions"
+
+HEADER_STRUCT = struct.Struct("<4sHHII32sI")
+ENTRY_STRUCT = struct.Struct("<IBBBx8sIihhhhddI")
+NO_FORMULA = 0xFFFFFFFF
+
+FLAG_29BIT = 1
+FLAG_BIG_ENDIAN = 2
+FLAG_AFFINE = 4
+FLAG_FORMULA_ERROR = 8
+
+
+class BundleRef(NamedTuple):
+    generation_id: int
+    hash: str
+    count: int
+    directory: str
+
+    def path(self, fmt: str) -> str:
+        return os.path.join(self.directory, f"{self.hash}.{fmt}")
+
+
+def version_trigger_sql() -> Dict[str, str]:
+    """Triggers bumping a generation's version on every canData write that touches it."""
+    cd = TABLES["can_data"]
+    t, gen = cd["table"], cd["generation_id"]
+
+    def bump(ref: str) -> str:
+        return (
+            f"INSERT INTO {VERSION_TABLE} (generationId, version) SELECT {ref}.{gen}, 1 WHERE {ref}.{gen} IS NOT NULL "
+            f"ON CONFLICT (generationId) DO UPDATE SET version = version + 1;"
+        )
+
+    return {
+        "trg_webcan_bundle_insert": f"CREATE TRIGGER trg_webcan_bundle_insert AFTER INSERT ON {t} BEGIN {bump('NEW')} END",
+        "trg_webcan_bundle_delete": f"CREATE TRIGGER trg_webcan_bundle_delete AFTER DELETE ON {t} BEGIN {bump('OLD')} END",
+        "trg_webcan_bundle_update": (
+            f"CREATE TRIGGER trg_webcan_bundle_update AFTER UPDATE ON {t} "
+            f"BEGIN {bump('OLD')} {bump('NEW')} END"
+        ),
+    }
+
+
+bundle_report: Dict[str, Any] = {"versioned": False}
+
+
+def provision_bundles() -> Dict[str, Any]:
+    """Create the per-generation version table and its triggers on canData."""
+    cd = TABLES["can_data"]
+    con = db.connection()
+    present = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    if cd["table"] not in present:
+        return bundle_report
+    try:
+        with db.transaction() as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                "generationId INTEGER PRIMARY KEY, version INTEGER NOT NULL)"
+            )
+            for name, sql in version_trigger_sql().items():
+                if name not in present:
+                    con.execute(sql)
+        bundle_report["versioned"] = True
+    except sqlite3.OperationalError:
+        # Read-only file: every request rehashes the generation's rows instead
+        bundle_report["versioned"] = False
+    return bundle_report
+
+
+def can_id_value(pid: Any) -> int:
+    """CAN ID as a number: canData `pid` blobs are big-endian, text is hex (`7E8`, `0x7E8`)."""
+    if isinstance(pid, (bytes, bytearray, memoryview)):
+        return int.from_bytes(bytes(pid), "big")
+    if isinstance(pid, int):
+        return pid
+    try:
+        return int(str(pid), 16)
+    except (TypeError, ValueError):
+        return 0
+
+
+def mask_bytes(mask: Any) -> bytes:
+    if isinstance(mask, (bytes, bytearray, memoryview)):
+        return bytes(mask)
+    if isinstance(mask, int):
+        return mask.to_bytes(8, "big")
+    return b""
+
+
+def mask_bits(mask: bytes) -> List[int]:
+    # Frame bit numbering: byte * 8 + bit, bit 0 = LSB of the byte
+    return [i * 8 + b for i, byte in enumerate(mask) for b in range(8) if byte >> b & 1]
+
+
+def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+    mask = mask_bytes(row["pidMask"])
+    bits = mask_bits(mask)
+    formula = row["formula"] or ""
+    entry: Dict[str, Any] = {
+        "can_id": can_id_value(row["pid"]),
+        "is29bit": bool(row["is29Bit"]),
+        "pid": mask_bytes(row["pid"]).hex().upper() if not isinstance(row["pid"], str) else row["pid"],
+        "mask": mask.hex().upper(),
+        "start_bit": bits[0] if bits else None,
+        "length_bits": len(bits),
+        "endian": BUNDLE_ENDIAN,
+        "parameter_id": row["parameter_id"],
+        "formula": formula,
+        "scale": None,
+        "offset": None,
+        "dimension_id": row["dimension"],
+        "can_bus_id": row["canBusId"],
+        "bus_type_id": row["busType"],
+        "condition": (
+            [row["conditionOffset"], row["conditionLength"]]
+            if row["conditionOffset"] is not None and row["conditionLength"] is not None else None
+        ),
+    }
+    try:
+        affine = affine_formula(formula)
+    except FormulaError as e:
+        entry["error"] = str(e)
+    else:
+        if affine is not None:
+            entry["scale"], entry["offset"] = affine
+    return entry
+
+
+def _rows(generation_id: int) -> List[sqlite3.Row]:
+    cd = TABLES["can_data"]
+    return db.query(
+        f"SELECT pid, pidMask, is29Bit, formula, canBusId, busType, dimension, conditionOffset, conditionLength, "
+        f"{cd['parameter_id']} AS parameter_id "
+        f"FROM {cd['table']} WHERE {cd['generation_id']} = ? AND COALESCE(deprecated, 0) = 0",
+        (generation_id,),
+    )
+
+
+def _sort_key(entry: Dict[str, Any]) -> Tuple[Any, ...]:
+    return (
+        entry["can_id"], entry["is29bit"], entry["start_bit"] if entry["start_bit"] is not None else -1,
+        entry["parameter_id"] or 0, entry["mask"], entry["formula"], entry["dimension_id"] or 0,
+        entry["can_bus_id"] or 0, entry["bus_type_id"] or 0, entry["condition"] or [],
+    )
+
+
+def _content_hash(generation_id: int, entries: List[Dict[str, Any]], names: Dict[str, str]) -> str:
+    canonical = json.dumps(
+        {"format": BUNDLE_FORMAT, "generation_id": generation_id, "entries": entries, "parameters": names},
+        ensure_ascii=False, separators=(",", ":"), sort_keys=True,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def _small(value: Optional[int], low: int, high: int) -> int:
+    return value if value is not None and low <= value <= high else -1
+
+
+def pack_bundle(generation_id: int, content_hash: str, entries: List[Dict[str, Any]]) -> bytes:
+    """The packed binary bundle (layout in the module docstring)."""
+    strings = bytearray()
+    offsets: Dict[str, int] = {}
+    packed = []
+    for e in entries:
+        flags = (FLAG_29BIT if e["is29bit"] else 0) | (FLAG_BIG_ENDIAN if e["endian"] == "big" else 0)
+        if e["scale"] is not None:
+            flags |= FLAG_AFFINE
+        if "error" in e:
+            flags |= FLAG_FORMULA_ERROR
+        formula_offset = NO_FORMULA
+        if e["formula"]:
+            formula_offset = offsets.get(e["formula"], len(strings))
+            if formula_offset == len(strings):
+                offsets[e["formula"]] = formula_offset
+                strings += e["formula"].encode("utf-8") + b"\0"
+        condition = e["condition"] or (None, None)
+        packed.append(ENTRY_STRUCT.pack(
+            e["can_id"] & 0xFFFFFFFF, flags, e["start_bit"] or 0, min(e["length_bits"], 255),
+            bytes.fromhex(e["mask"])[:8].ljust(8, b"\0"), (e["parameter_id"] or 0) & 0xFFFFFFFF,
+            _small(e["dimension_id"], 0, 0x7FFFFFFF), _small(e["can_bus_id"], 0, 0x7FFF),
+            _small(e["bus_type_id"], 0, 0x7FFF), _small(condition[0], 0, 0x7FFF), _small(condition[1], 0, 0x7FFF),
+            e["scale"] if e["scale"] is not None else 1.0, e["offset"] if e["offset"] is not None else 0.0,
+            formula_offset,
+        ))
+    header = HEADER_STRUCT.pack(
+        b"WCDB", BUNDLE_FORMAT, 0, generation_id & 0xFFFFFFFF, len(entries), bytes.fromhex(content_hash), len(strings)
+    )
+    return header + b"".join(packed) + bytes(strings)
+
+
+def _generation_exists(generation_id: int) -> bool:
+    gen = TABLES["generations"]
+    return bool(db.query(f"SELECT 1 FROM {gen['table']} WHERE {gen['id']} = ?", (generation_id,)))
+
+
+def _parameter_names(entries: List[Dict[str, Any]]) -> Dict[str, str]:
+    pt = TABLES["parameters"]
+    ids = sorted({e["parameter_id"] for e in entries if e["parameter_id"] is not None})
+    names: Dict[str, str] = {}
+    for i in range(0, len(ids), 500):
+        chunk = ids[i:i + 500]
+        rows = db.query(
+            f"SELECT {pt['id']} AS id, {pt['name']} AS name FROM {pt['table']} "
+            f"WHERE {pt['id']} IN ({','.join('?' * len(chunk))})",
+            chunk,
+        )
+        names.update({str(r["id"]): r["name"] for r in rows})
+    return names
+
+
+def _write_variants(path: str, data: bytes) -> None:
+    write_atomic(path, data)
+    write_atomic(path + ".gz", gzip.compress(data, mtime=0))
+    if brotli is not None:
+        write_atomic(path + ".br", brotli.compress(data))
+
+
+def _write_bundle(ref: BundleRef, entries: List[Dict[str, Any]], names: Dict[str, str]) -> None:
+    os.makedirs(ref.directory, exist_ok=True)
+    body = {
+        "format": BUNDLE_FORMAT,
+        "generation_id": ref.generation_id,
+        "hash": ref.hash,
+        "count": ref.count,
+        "entries": entries,
+        "parameters": names,
+    }
+    _write_variants(ref.path("bin"), pack_bundle(ref.generation_id, ref.hash, entries))
+    _write_variants(ref.path("json"), json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+    _remove_superseded(ref.directory, ref.hash)
+
+
+def _remove_superseded(directory: str, current: str, grace_s: float = BUNDLE_GRACE_S) -> None:
+    """Delete older bundles once the one that replaced them is `grace_s` old.
+
+    A bundle is superseded when the next newer one is written; until the grace
+    period passes its files stay, so a response that already resolved the old
+    path (FileResponse stats, then opens) does not fail or get cut short.
+    """
+    written: Dict[str, float] = {}
+    for name in os.listdir(directory):
+        if name.startswith(".tmp-"):
+            continue
+        try:
+            mtime = os.stat(os.path.join(directory, name)).st_mtime
+        except FileNotFoundError:
+            continue
+        key = name.split(".", 1)[0]
+        written[key] = max(written.get(key, 0.0), mtime)
+    written[current] = time.time()
+    # Each hash was superseded when the next newer one was written
+    ordered = sorted(written, key=written.__getitem__)
+    expired = {
+        key for key, newer in zip(ordered, ordered[1:])
+        if key != current and time.time() - written[newer] > grace_s
+    }
+    for name in os.listdir(directory):
+        if name.split(".", 1)[0] not in expired:
+            continue
+        path = os.path.join(directory, name)
+        if os.path.isdir(path):
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+
+_lock = threading.Lock()
+# Builds are rare; one at a time keeps the cleanup of old files from racing a build
+_build_lock = threading.Lock()
+# generation id -> (canDataVersions version, bundle)
+_known: Dict[int, Tuple[int, BundleRef]] = {}
+
+
+def _version(generation_id: int) -> Optional[int]:
+    if not bundle_report["versioned"]:
+        return None
+    rows = db.query(f"SELECT version FROM {VERSION_TABLE} WHERE generationId = ?", (generation_id,))
+    return rows[0][0] if rows else 0
+
+
+def generation_bundle(generation_id: int, bundle_dir: str = BUNDLE_DIR) -> Optional[BundleRef]:
+    """The current bundle of a generation, built on first use; None for unknown generations."""
+    version = _version(generation_id)
+    with _lock:
+        known = _known.get(generation_id)
+    if known is not None and version is not None and known[0] == version and os.path.exists(known[1].path("json")):
+        # Unchanged since the last build: no row is read
+        return known[1]
+
+    if not _generation_exists(generation_id):
+        return None
+    entries = sorted((_entry(r) for r in _rows(generation_id)), key=_sort_key)
+    names = _parameter_names(entries)
+    content_hash = _content_hash(generation_id, entries, names)
+    ref = BundleRef(generation_id, content_hash, len(entries), os.path.join(bundle_dir, str(generation_id)))
+    with _build_lock:
+        if not all(os.path.exists(ref.path(fmt)) for fmt in BUNDLE_FORMATS):
+            _write_bundle(ref, entries, names)
+    if version is not None:
+        with _lock:
+            _known[generation_id] = (version, ref)
+    return ref
@@ -0,0 +1,146 @@
+"""Catalog change feed for offline clients (GET /api/catalog/changes?since=<version>).
+
+Triggers on the makes, models, generations and parameters tables append
+`(version, kind, rowId)` to `catalogChanges` on every insert, update and
+delete, whoever writes (the app's writer, `ensure_parameter`, the export
+apply tool, manual edits). `version` is an AUTOINCREMENT key, so it only
+grows. A client keeps the highest version it has seen and asks for what
+came after it: rows that changed since then are returned as they are now,
+rows that are gone as deletions.
+
+The log is trimmed to the last `WEB_CAN_CATALOG_CHANGES_KEEP` entries at
+startup; a client whose version is older than what is left (or newer than
+the database, e.g. after it was replaced) gets the full catalog instead.
+"""
+import sqlite3
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from .config import CATALOG_CHANGES_KEEP, TABLES
+from .db import db, generation_label
+
+CHANGES_TABLE = "catalogChanges"
+# Feed name -> TABLES key
+CHANGE_KINDS = {
+    "makes": "manufacturers",
+    "models": "models",
+    "generations": "generations",
+    "parameters": "parameters",
+}
+
+changes_report: Dict[str, Any] = {"ready": False}
+
+
+def change_trigger_sql() -> Dict[str, str]:
+    """Triggers logging every write to the catalog tables into `catalogChanges`."""
+    triggers: Dict[str, str] = {}
+    for kind, key in CHANGE_KINDS.items():
+        t = TABLES[key]
+        for op, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            name = f"trg_webcan_changes_{kind}_{op.lower()}"
+            log = f"INSERT INTO {CHANGES_TABLE} (kind, rowId) VALUES ('{kind}', {ref}.{t['id']});"
+            if op == "UPDATE":
+                # A changed id is a delete of the old row and an insert of the new one
+                log = (
+                    f"INSERT INTO {CHANGES_TABLE} (kind, rowId) "
+                    f"SELECT '{kind}', OLD.{t['id']} WHERE OLD.{t['id']} IS NOT NEW.{t['id']}; " + log
+                )
+            triggers[name] = f"CREATE TRIGGER {name} AFTER {op} ON {t['table']} BEGIN {log} END"
+    return triggers
+
+
+def provision_changes(keep: int = CATALOG_CHANGES_KEEP) -> Dict[str, Any]:
+    """Create the change log and its triggers, and trim the log to the last `keep` entries."""
+    con = db.connection()
+    present = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    if any(TABLES[key]["table"] not in present for key in CHANGE_KINDS.values()):
+        changes_report["ready"] = False
+        return changes_report
+    try:
+        with db.transaction() as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {CHANGES_TABLE} ("
+                "version INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, rowId INTEGER)"
+            )
+            for name, sql in change_trigger_sql().items():
+                if name not in present:
+                    con.execute(sql)
+            if CHANGES_TABLE not in present:
+                # Rows older than the log only come with the full catalog; the marker
+                # gives a freshly provisioned log a version clients can sync from
+                con.execute(f"INSERT INTO {CHANGES_TABLE} (kind, rowId) VALUES ('start', NULL)")
+            con.execute(
+                f"DELETE FROM {CHANGES_TABLE} WHERE version <= (SELECT MAX(version) FROM {CHANGES_TABLE}) - ?",
+                (keep,),
+            )
+        changes_report["ready"] = True
+    except sqlite3.OperationalError:
+        # Read-only file: nobody records changes, so every request gets the full catalog
+        changes_report["ready"] = False
+    return changes_report
+
+
+def _select(kind: str) -> str:
+    if kind == "makes":
+        t = TABLES["manufacturers"]
+        return f"SELECT {t['id']} AS id, {t['name']} AS name FROM {t['table']}"
+    if kind == "models":
+        t = TABLES["models"]
+        return f"SELECT {t['id']} AS id, {t['name']} AS name, {t['manufacturer_id']} AS make_id FROM {t['table']}"
+    if kind == "generations":
+        t = TABLES["generations"]
+        return (
+            f"SELECT {t['id']} AS id, {t['model_id']} AS model_id, {t['name']} AS name, "
+            f"{t['major']} AS major, {t['minor']} AS minor FROM {t['table']}"
+        )
+    t = TABLES["parameters"]
+    return f"SELECT {t['id']} AS id, {t['name']} AS name FROM {t['table']}"
+
+
+def _row(kind: str, r: sqlite3.Row) -> Dict[str, Any]:
+    row = dict(r)
+    if kind == "generations":
+        row["label"] = generation_label(r)
+    return row
+
+
+def _rows(kind: str, ids: Optional[Iterable[int]] = None) -> List[Dict[str, Any]]:
+    sql = _select(kind)
+    id_col = TABLES[CHANGE_KINDS[kind]]["id"]
+    if ids is None:
+        return [_row(kind, r) for r in db.query(sql + f" ORDER BY {id_col}")]
+    wanted = sorted(ids)
+    out: List[Dict[str, Any]] = []
+    for i in range(0, len(wanted), 500):
+        chunk = wanted[i:i + 500]
+        rows = db.query(sql + f" WHERE {id_col} IN ({','.join('?' * len(chunk))}) ORDER BY {id_col}", chunk)
+        out.extend(_row(kind, r) for r in rows)
+    return out
+
+
+def get_changes(since: int = 0) -> Dict[str, Any]:
+    """Catalog rows changed after version `since`; the full catalog when the log can't tell."""
+    if not changes_report["ready"]:
+        return {"version": 0, "full": True, **{kind: {"upsert": _rows(kind), "delete": []} for kind in CHANGE_KINDS}}
+    bounds = db.query(f"SELECT MIN(version), MAX(version) FROM {CHANGES_TABLE}")[0]
+    first, version = bounds[0] or 0, bounds[1] or 0
+    # `since` must still be in the log (first - 1 is its last trimmed entry);
+    # version 0 is a client without a local copy
+    if since <= 0 or since < first - 1 or since > version:
+        return {"version": version, "full": True, **{kind: {"upsert": _rows(kind), "delete": []} for kind in CHANGE_KINDS}}
+
+    changed: Dict[str, Set[int]] = {}
+    # Bounded by `version`, read first: whatever commits later is picked up next time
+    rows = db.query(
+        f"SELECT DISTINCT kind, rowId FROM {CHANGES_TABLE} WHERE version > ? AND version <= ? AND rowId IS NOT NULL",
+        (since, version),
+    )
+    for r in rows:
+        changed.setdefault(r["kind"], set()).add(r["rowId"])
+    result: Dict[str, Any] = {"version": version, "full": False}
+    for kind, ids in changed.items():
+        if kind not in CHANGE_KINDS:
+            continue
+        upsert = _rows(kind, ids)
+        present = {row["id"] for row in upsert}
+        result[kind] = {"upsert": upsert, "delete": sorted(ids - present)}
+    return result
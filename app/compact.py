@@ -0,0 +1,320 @@
+"""Compact the export tree into daily archives and apply exports to a target DB.
+
+Usage:
+    python -m app.compact compact [--before YYYY-MM-DD] [--keep-files]
+    python -m app.compact apply --db target.sqlite [--batch 500]
+
+`compact` turns every finished `exports/YYYY/MM/DD/` folder into
+`exports/YYYY/MM/DD.ndjson.gz` plus `DD.index.json`. Each export (JSON
+snapshot + `_insert.sql` script) is one NDJSON line stored as its own gzip
+member, so the archive is still a plain `.ndjson.gz` while the index
+(name -> offset/length) lets a reader decompress a single record. The loose
+files are removed once the archive and index are on disk; re-running on a
+folder that gained late files appends them to the existing archive.
+
+`apply` runs the `_insert.sql` scripts of all exports (archived or loose,
+in day and number order) against the target DB, many exports per
+transaction. The script's own BEGIN/COMMIT are dropped, each export runs in
+a SAVEPOINT, and its key is recorded in `appliedExports` in the same
+transaction, so an interrupted run resumes where it stopped and exports are
+never applied twice.
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import tempfile
+from datetime import date
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Set
+
+from .config import APPLY_BATCH_SIZE, EXPORT_DIR
+from .exports import write_atomic
+
+
+log = logging.getLogger(__name__)
+
+APPLIED_TABLE = "appliedExports"
+
+_YEAR = re.compile(r"^\d{4}$")
+_TWO_DIGITS = re.compile(r"^\d{2}$")
+_ARCHIVE = re.compile(r"^(\d{2})\.ndjson\.gz$")
+_SNAPSHOT = re.compile(r"^(\d+)_(.+)\.json$")
+
+
+class Export(NamedTuple):
+    day: str
+    name: str
+    sql: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.day}/{self.name}"
+
+
+def _number(name: str) -> int:
+    return int(name.split("_", 1)[0])
+
+
+def _archive_paths(month_dir: str, dd: str):
+    return os.path.join(month_dir, f"{dd}.ndjson.gz"), os.path.join(month_dir, f"{dd}.index.json")
+
+
+def _read_text(path: str) -> Optional[str]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def iter_days(root: str = EXPORT_DIR) -> Iterator[str]:
+    """Days (ISO dates) that have an archive or a loose folder, in order. `catalog/` is skipped."""
+    for year in sorted(n for n in os.listdir(root) if _YEAR.match(n)) if os.path.isdir(root) else ():
+        year_dir = os.path.join(root, year)
+        for month in sorted(n for n in os.listdir(year_dir) if _TWO_DIGITS.match(n)):
+            days: Set[str] = set()
+            for entry in os.scandir(os.path.join(year_dir, month)):
+                m = _ARCHIVE.match(entry.name)
+                if m:
+                    days.add(m.group(1))
+                elif entry.is_dir() and _TWO_DIGITS.match(entry.name):
+                    days.add(entry.name)
+            for dd in sorted(days):
+                yield f"{year}-{month}-{dd}"
+
+
+def _day_paths(root: str, day: str):
+    year, month, dd = day.split("-")
+    month_dir = os.path.join(root, year, month)
+    return month_dir, os.path.join(month_dir, dd), dd
+
+
+def load_index(index_path: str) -> Dict[str, Any]:
+    try:
+        with open(index_path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"records": []}
+
+
+def _loose_exports(folder: str) -> List[str]:
+    """Export names (`NNN_label`) with a JSON snapshot in a day folder, by number."""
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return []
+    found = [n[:-len(".json")] for n in names if _SNAPSHOT.match(n)]
+    return sorted(found, key=lambda n: (_number(n), n))
+
+
+def compact_day(day: str, root: str = EXPORT_DIR, keep_files: bool = False) -> int:
+    """Move a day's loose exports into its archive; returns how many were added."""
+    month_dir, folder, dd = _day_paths(root, day)
+    archive_path, index_path = _archive_paths(month_dir, dd)
+    index = load_index(index_path)
+    known = {r["name"] for r in index["records"]}
+    names = _loose_exports(folder)
+    fresh = [n for n in names if n not in known]
+    if not names:
+        return 0
+
+    if fresh:
+        fd, tmp = tempfile.mkstemp(dir=month_dir, prefix=".tmp-", suffix=os.path.basename(archive_path))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                digest = hashlib.sha256()
+                # Existing members are copied as they are, so their offsets stay valid
+                if os.path.exists(archive_path):
+                    with open(archive_path, "rb") as src:
+                        for block in iter(lambda: src.read(1 << 20), b""):
+                            out.write(block)
+                            digest.update(block)
+                for name in fresh:
+                    snapshot = _read_text(os.path.join(folder, name + ".json"))
+                    if snapshot is None:
+                        continue
+                    record = {
+                        "name": name,
+                        "export": json.loads(snapshot),
+                        "sql": _read_text(os.path.join(folder, name + "_insert.sql")),
+                    }
+                    line = json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n"
+                    member = gzip.compress(line.encode("utf-8"), mtime=0)
+                    index["records"].append({"name": name, "offset": out.tell(), "length": len(member)})
+                    out.write(member)
+                    digest.update(member)
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(tmp, archive_path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+        index.update({"day": day, "archive": os.path.basename(archive_path), "count": len(index["records"]), "sha256": digest.hexdigest()})
+        # Written after the archive: a crash in between leaves unindexed bytes that are never read
+        write_atomic(index_path, json.dumps(index, ensure_ascii=False, indent=1), fsync=True)
+
+    if not keep_files:
+        for name in names:
+            for suffix in (".json", "_insert.sql"):
+                try:
+                    os.unlink(os.path.join(folder, name + suffix))
+                except FileNotFoundError:
+                    pass
+        try:
+            os.rmdir(folder)
+        except OSError:
+            # Something else is still in there (stray files, or a writer that just added one)
+            pass
+    return len(fresh)
+
+
+def compact(root: str = EXPORT_DIR, before: Optional[date] = None, keep_files: bool = False) -> Dict[str, int]:
+    """Compact every day before `before` (today by default: its folder is still being written)."""
+    limit = (before or date.today()).isoformat()
+    result = {"days": 0, "exports": 0}
+    for day in iter_days(root):
+        if day >= limit:
+            continue
+        added = compact_day(day, root, keep_files)
+        if added:
+            result["days"] += 1
+            result["exports"] += added
+            log.info("Compacted %s: %d exports", day, added)
+    return result
+
+
+def iter_exports(day: str, root: str = EXPORT_DIR) -> Iterator[Export]:
+    """A day's exports, archived or loose, in number order."""
+    month_dir, folder, dd = _day_paths(root, day)
+    archive_path, index_path = _archive_paths(month_dir, dd)
+    records = {r["name"]: r for r in load_index(index_path)["records"]}
+    items: List[Any] = list(records.items())
+    # Loose files of an archived export are leftovers of an interrupted compaction
+    items += [(n, None) for n in _loose_exports(folder) if n not in records]
+    items.sort(key=lambda item: (_number(item[0]), item[0]))
+    archive = open(archive_path, "rb") if records else None
+    try:
+        for name, record in items:
+            if record is not None:
+                archive.seek(record["offset"])
+                sql = json.loads(gzip.decompress(archive.read(record["length"])))["sql"]
+            else:
+                sql = _read_text(os.path.join(folder, name + "_insert.sql"))
+            if sql:
+                yield Export(day, name, sql)
+    finally:
+        if archive is not None:
+            archive.close()
+
+
+def split_script(sql: str) -> Iterator[str]:
+    """Statements of an `_insert.sql` script, without its own BEGIN/COMMIT."""
+    buf = ""
+    for line in sql.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            statement = buf.strip()
+            buf = ""
+            head = " ".join(statement.rstrip(";").split()).upper()
+            if head in ("BEGIN", "BEGIN TRANSACTION", "COMMIT", "END", "END TRANSACTION"):
+                continue
+            yield statement
+    if buf.strip() and not all(l.strip().startswith("--") for l in buf.strip().splitlines()):
+        raise ValueError("incomplete SQL statement at the end of the script")
+
+
+def ensure_applied_table(con: sqlite3.Connection) -> None:
+    con.execute(
+        f"""
+        CREATE TABLE IF NOT EXISTS {APPLIED_TABLE} (
+            exportKey TEXT PRIMARY KEY,
+            appliedAt TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        """
+    )
+
+
+def _applied_keys(con: sqlite3.Connection, day: str) -> Set[str]:
+    # Keys are `YYYY-MM-DD/NNN_label`: one range scan per day
+    rows = con.execute(
+        f"SELECT exportKey FROM {APPLIED_TABLE} WHERE exportKey >= ? AND exportKey < ?", (day + "/", day + "0")
+    )
+    return {r[0] for r in rows}
+
+
+def apply(target: str, root: str = EXPORT_DIR, batch: int = APPLY_BATCH_SIZE) -> Dict[str, Any]:
+    """Apply every export not yet recorded in `appliedExports`; committed every `batch` exports."""
+    con = sqlite3.connect(target)
+    con.isolation_level = None
+    result: Dict[str, Any] = {"applied": 0, "skipped": 0, "failed": []}
+    try:
+        con.execute("PRAGMA busy_timeout = 30000")
+        ensure_applied_table(con)
+        in_batch = 0
+        for day in iter_days(root):
+            applied = _applied_keys(con, day)
+            for export in iter_exports(day, root):
+                if export.key in applied:
+                    result["skipped"] += 1
+                    continue
+                if not con.in_transaction:
+                    con.execute("BEGIN IMMEDIATE")
+                con.execute("SAVEPOINT export")
+                try:
+                    for statement in split_script(export.sql):
+                        con.execute(statement)
+                    con.execute(f"INSERT INTO {APPLIED_TABLE}(exportKey) VALUES (?)", (export.key,))
+                    con.execute("RELEASE export")
+                except (sqlite3.Error, ValueError) as e:
+                    # Only this export is undone; it stays pending and is retried next run
+                    con.execute("ROLLBACK TO export")
+                    con.execute("RELEASE export")
+                    log.warning("Export %s not applied: %s", export.key, e)
+                    result["failed"].append({"export": export.key, "error": str(e)})
+                    continue
+                result["applied"] += 1
+                in_batch += 1
+                if in_batch >= batch:
+                    con.execute("COMMIT")
+                    in_batch = 0
+        if con.in_transaction:
+            con.execute("COMMIT")
+    finally:
+        if con.in_transaction:
+            con.execute("ROLLBACK")
+        con.close()
+    return result
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Compact the export tree and apply exports to a database")
+    parser.add_argument("--exports", default=EXPORT_DIR, help="export tree root")
+    commands = parser.add_subparsers(dest="command", required=True)
+    p_compact = commands.add_parser("compact", help="archive finished days into DD.ndjson.gz + DD.index.json")
+    p_compact.add_argument("--before", type=date.fromisoformat, help="only days before this date (default: today)")
+    p_compact.add_argument("--keep-files", action="store_true", help="do not delete the loose files")
+    p_apply = commands.add_parser("apply", help="run pending _insert.sql scripts against a database")
+    p_apply.add_argument("--db", required=True, help="target SQLite file")
+    p_apply.add_argument("--batch", type=int, default=APPLY_BATCH_SIZE, help="exports per transaction")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.command == "compact":
+        result = compact(args.exports, args.before, args.keep_files)
+        print(f"days: {result['days']}, exports: {result['exports']}")
+    else:
+        result = apply(args.db, args.exports, args.batch)
+        print(f"applied: {result['applied']}, skipped: {result['skipped']}, failed: {len(result['failed'])}")
+        for failure in result["failed"]:
+            print(f"  {failure['export']}: {failure['error']}")
+
+
+if __name__ == "__main__":
+    main()
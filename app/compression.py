@@ -0,0 +1,171 @@
+import mimetypes
+import os
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import COMPRESS_MIN_SIZE
+
+try:  # optional: brotli is preferred when installed, gzip otherwise
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+COMPRESSIBLE_TYPES = (
+    "text/",
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "application/xml",
+    "image/svg+xml",
+)
+
+# Content-hashed build output never changes under the same URL
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Encodings the client accepts (q > 0) from an Accept-Encoding header."""
+    out = set()
+    for part in accept_encoding.split(","):
+        token, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        if token and q > 0:
+            out.add(token.strip().lower())
+    return out
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    accepted = accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding: str):
+        self.encoding = encoding
+        if encoding == "br":
+            self._br = brotli.Compressor(quality=5)
+        else:
+            self._gz = zlib.compressobj(6, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes) -> bytes:
+        return self._br.process(data) if self.encoding == "br" else self._gz.compress(data)
+
+    def flush(self) -> bytes:
+        # Emit what we have so streamed chunks reach the client promptly
+        return self._br.flush() if self.encoding == "br" else self._gz.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._br.finish() if self.encoding == "br" else self._gz.flush()
+
+
+class CompressionMiddleware:
+    """Brotli/gzip response compression above a size threshold.
+
+    Works for buffered and streamed responses alike; responses that already
+    carry a Content-Encoding (precompressed static files) pass through.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start: Optional[Message] = None
+        encoder: Optional[_Encoder] = None
+        passthrough = False
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal start, encoder, passthrough
+            if message["type"] == "http.response.start":
+                start = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+            if passthrough:
+                await send(message)
+                return
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if encoder is None:
+                assert start is not None
+                headers = MutableHeaders(raw=start["headers"])
+                content_type = headers.get("content-type", "")
+                if (
+                    start["status"] in (204, 304)
+                    or "content-encoding" in headers
+                    or not content_type.startswith(COMPRESSIBLE_TYPES)
+                    or (not more_body and len(body) < self.minimum_size)
+                ):
+                    passthrough = True
+                    await send(start)
+                    await send(message)
+                    return
+                encoder = _Encoder(encoding)
+                headers["Content-Encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if not more_body:
+                    data = encoder.compress(body) + encoder.finish()
+                    headers["Content-Length"] = str(len(data))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": data})
+                    return
+                del headers["Content-Length"]
+                await send(start)
+            data = encoder.compress(body) + (encoder.flush() if more_body else encoder.finish())
+            await send({"type": "http.response.body", "body": data, "more_body": more_body})
+
+        await self.app(scope, receive, send_wrapper)
+
+
+class PrecompressedStaticFiles(StaticFiles):
+    """StaticFiles that serves `.br`/`.gz` siblings built by `app.build_static`.
+
+    Files under `dist/` are content-hashed and get immutable cache headers.
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        rel = os.path.relpath(full_path, self.directory) if self.directory else ""
+        hashed = rel.startswith("dist" + os.sep) and not rel.endswith((".html", ".json"))
+        if hashed:
+            accepted = accepted_encodings(Headers(scope=scope).get("accept-encoding", ""))
+            for encoding, suffix in (("br", ".br"), ("gzip", ".gz")):
+                variant = full_path + suffix
+                if encoding in accepted and os.path.isfile(variant):
+                    content_type = mimetypes.guess_type(full_path)[0] or "application/octet-stream"
+                    if content_type.startswith("text/"):
+                        content_type += "; charset=utf-8"
+                    response = super().file_response(variant, os.stat(variant), scope, status_code)
+                    response.headers["content-type"] = content_type
+                    response.headers["content-encoding"] = encoding
+                    response.headers.add_vary_header("Accept-Encoding")
+                    response.headers["cache-control"] = IMMUTABLE_CACHE
+                    return response
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if hashed:
+            response.headers["cache-control"] = IMMUTABLE_CACHE
+        return response
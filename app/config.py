@@ -5,6 +5,63 @@ import os
 DB_PATH = os.getenv("WEB_CAN_DB", os.path.join(os.path.dirname(os.path.dirname(__file__)), "db.sqlite"))
 
 
+# Connection tuning for the pooled SQLite connections (see app/db.py)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("WEB_CAN_DB_BUSY_TIMEOUT_MS", "5000"))
+DB_CACHE_SIZE_KB = int(os.getenv("WEB_CAN_DB_CACHE_SIZE_KB", "16384"))
+DB_MMAP_SIZE = int(os.getenv("WEB_CAN_DB_MMAP_SIZE", str(256 * 1024 * 1024)))
+DB_STATEMENT_CACHE = int(os.getenv("WEB_CAN_DB_STATEMENT_CACHE", "256"))
+
+# Group-commit writer: queued write jobs (503 + Retry-After beyond this), how long
+# to wait for more jobs to join a commit, the most jobs per commit, and how long a
+# request waits for its job to commit before giving up with 503
+WRITE_QUEUE_SIZE = int(os.getenv("WEB_CAN_WRITE_QUEUE_SIZE", "1000"))
+WRITE_BATCH_WINDOW_MS = float(os.getenv("WEB_CAN_WRITE_BATCH_WINDOW_MS", "2"))
+WRITE_MAX_BATCH = int(os.getenv("WEB_CAN_WRITE_MAX_BATCH", "256"))
+WRITE_RETRY_AFTER_S = int(os.getenv("WEB_CAN_WRITE_RETRY_AFTER_S", "1"))
+WRITE_TIMEOUT_S = float(os.getenv("WEB_CAN_WRITE_TIMEOUT_S", "30"))
+
+# Worker threads of the request executors (see app/executors.py): catalog/search
+# reads, and writes/uploads/file I/O. Kept apart so slow writes never hold up reads
+DB_EXECUTOR_WORKERS = int(os.getenv("WEB_CAN_DB_EXECUTOR_WORKERS", "8"))
+IO_EXECUTOR_WORKERS = int(os.getenv("WEB_CAN_IO_EXECUTOR_WORKERS", "16"))
+
+# Records per transaction for POST /api/submissions/bulk (overridable per request)
+BULK_CHUNK_SIZE = int(os.getenv("WEB_CAN_BULK_CHUNK_SIZE", "500"))
+# Longest single bulk record (characters) held while waiting for its end
+BULK_MAX_RECORD_SIZE = int(os.getenv("WEB_CAN_BULK_MAX_RECORD_SIZE", str(1 << 20)))
+
+# Responses smaller than this (bytes) are sent uncompressed
+COMPRESS_MIN_SIZE = int(os.getenv("WEB_CAN_COMPRESS_MIN_SIZE", "1024"))
+
+# Folder with frontend assets; `python -m app.build_static` writes hashed builds to <STATIC_DIR>/dist
+STATIC_DIR = os.getenv(
+    "WEB_CAN_STATIC_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "static"),
+)
+
+# Max number of per-make/model entries kept by the in-process catalog cache
+CATALOG_CACHE_SIZE = int(os.getenv("WEB_CAN_CATALOG_CACHE_SIZE", "512"))
+
+# Serve catalog reads from an in-memory copy of the reference tables (see app/snapshot.py),
+# and how often (milliseconds) to check the file for catalog changes
+CATALOG_SNAPSHOT = os.getenv("WEB_CAN_CATALOG_SNAPSHOT", "0").lower() in ("1", "true", "yes", "on")
+CATALOG_SNAPSHOT_POLL_MS = float(os.getenv("WEB_CAN_CATALOG_SNAPSHOT_POLL_MS", "500"))
+
+# Entries kept in the catalog change log (GET /api/catalog/changes); older clients get the full catalog
+CATALOG_CHANGES_KEEP = int(os.getenv("WEB_CAN_CATALOG_CHANGES_KEEP", "100000"))
+
+# Generations whose bit-overlap index (see app/overlap.py) is kept in memory, and whether
+# submissions whose bits overlap an existing mapping are rejected (409) instead of accepted with a warning
+OVERLAP_CACHE_SIZE = int(os.getenv("WEB_CAN_OVERLAP_CACHE_SIZE", "256"))
+OVERLAP_REJECT = os.getenv("WEB_CAN_OVERLAP_REJECT", "0").lower() in ("1", "true", "yes", "on")
+
+# Compiled formulas / bit layouts kept by the signal decoder (LRU, keyed by text)
+DECODER_CACHE_SIZE = int(os.getenv("WEB_CAN_DECODER_CACHE_SIZE", "4096"))
+
+# SQL statements slower than this (milliseconds) are logged and counted
+SLOW_QUERY_MS = float(os.getenv("WEB_CAN_SLOW_QUERY_MS", "200"))
+
+
 # Table and column mappings aligned to your schema screenshot
 # manufacturers(manufacturerId, manufacturerName)
 # carsModels(carModelId, carModelName, manufacturerId)
@@ -35,6 +92,12 @@ TABLES = {
         # Use Russian names for autocomplete (e.g., "Обороты двигателя")
         "name": os.getenv("WEB_CAN_COL_PARAM_NAME", "canParameterName_ru"),
     },
+    # canData(generationId, canParameterId, pid, pidMask, ...)
+    "can_data": {
+        "table": os.getenv("WEB_CAN_TBL_CAN_DATA", "canData"),
+        "generation_id": os.getenv("WEB_CAN_COL_CAN_DATA_GENERATION_ID", "generationId"),
+        "parameter_id": os.getenv("WEB_CAN_COL_CAN_DATA_PARAM_ID", "canParameterId"),
+    },
     "submissions": {
         "table": os.getenv("WEB_CAN_TBL_SUBMISSIONS", "submissions"),
     },
@@ -46,6 +109,20 @@ EXPORT_DIR = os.getenv(
     os.path.join(os.path.dirname(os.path.dirname(__file__)), "exports"),
 )
 
+# Decode bundles per generation (GET /api/generations/<id>/bundle) are cached here.
+# canData has no byte-order column; multi-byte windows are described with this one
+BUNDLE_DIR = os.getenv(
+    "WEB_CAN_BUNDLE_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "bundles"),
+)
+BUNDLE_ENDIAN = "little" if os.getenv("WEB_CAN_BUNDLE_ENDIAN", "big").lower() == "little" else "big"
+# Files of a superseded bundle stay this long after the newer one was written, so responses
+# that already picked the old path finish streaming it
+BUNDLE_GRACE_S = float(os.getenv("WEB_CAN_BUNDLE_GRACE_S", "600"))
+
+# Exports applied per transaction by `python -m app.compact apply`
+APPLY_BATCH_SIZE = int(os.getenv("WEB_CAN_APPLY_BATCH_SIZE", "500"))
+
 
 def ensure_submission_table_sql(table_name: str) -> str:
     return f"""
@@ -66,6 +143,7 @@ def ensure_submission_table_sql(table_name: str) -> str:
         dimension_id INTEGER,
         is29bit INTEGER,
         notes TEXT,
-        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+        status TEXT NOT NULL DEFAULT 'new'
     );
     """
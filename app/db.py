@@ -1,37 +1,205 @@
+import contextlib
+import functools
+import hashlib
+import json
+import logging
 import os
 import sqlite3
-from typing import Any, Dict, Iterable, List, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Hashable, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote
 
-from .config import DB_PATH, TABLES, ensure_submission_table_sql
+from .config import (
+    CATALOG_CACHE_SIZE,
+    CATALOG_SNAPSHOT,
+    CATALOG_SNAPSHOT_POLL_MS,
+    DB_BUSY_TIMEOUT_MS,
+    DB_CACHE_SIZE_KB,
+    DB_MMAP_SIZE,
+    DB_PATH,
+    DB_STATEMENT_CACHE,
+    TABLES,
+    ensure_submission_table_sql,
+)
+from .metrics import observe_query
+from .search import ParameterIndex
+from .snapshot import VERSION_TABLE, CatalogSnapshot, version_trigger_sql
+from .writer import GroupCommitWriter
+
+
+log = logging.getLogger(__name__)
+
+SUBMISSION_INDEXES = (
+    ("idx_webcan_submissions_vehicle", "vehicle_id"),
+    ("idx_webcan_submissions_parameter", "parameter_id"),
+    ("idx_webcan_submissions_can_id", "can_id COLLATE NOCASE"),
+    ("idx_webcan_submissions_status", "status"),
+    ("idx_webcan_submissions_created", "created_at"),
+)
 
 
 class DB:
+    """SQLite access with one long-lived connection per thread.
+
+    Connections are opened lazily on first use in a thread, tuned once
+    (WAL, synchronous=NORMAL, mmap, page cache, busy timeout) and reused
+    for every following query. `close()` releases all of them on shutdown.
+    """
+
     def __init__(self, path: Optional[str] = None):
         self.path = path or DB_PATH
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[sqlite3.Connection] = []
 
     def available(self) -> bool:
         return os.path.exists(self.path)
 
+    def uri(self) -> str:
+        # mode=rw never creates the file: a missing database stays missing (503)
+        # instead of turning into an empty one without tables
+        return "file:" + quote(os.path.abspath(self.path)) + "?mode=rw"
+
     def connect(self) -> sqlite3.Connection:
-        con = sqlite3.connect(self.path)
+        """Open a new tuned connection (not pooled; caller closes it)."""
+        con = sqlite3.connect(
+            self.uri(),
+            uri=True,
+            timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False,
+            cached_statements=DB_STATEMENT_CACHE,
+        )
         con.row_factory = sqlite3.Row
+        try:
+            # journal_mode is persistent in the file; fails harmlessly on read-only DBs
+            con.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError:
+            pass
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA busy_timeout={int(DB_BUSY_TIMEOUT_MS)}")
+        con.execute(f"PRAGMA cache_size={-int(DB_CACHE_SIZE_KB)}")
+        con.execute(f"PRAGMA mmap_size={int(DB_MMAP_SIZE)}")
+        con.execute("PRAGMA temp_store=MEMORY")
         return con
 
+    def connection(self) -> sqlite3.Connection:
+        """Return this thread's pooled connection, opening it on first use."""
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self.connect()
+            self._local.con = con
+            with self._lock:
+                self._connections.append(con)
+        return con
+
+    def close(self) -> None:
+        """Close every pooled connection (called on application shutdown)."""
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for con in connections:
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+        # Threads that still hold a closed connection will reopen on next use
+        self._local = threading.local()
+
     def query(self, sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
-        with self.connect() as con:
-            cur = con.execute(sql, tuple(params))
-            return cur.fetchall()
+        con = self.connection()
+        start = time.perf_counter()
+        cur = con.execute(sql, tuple(params))
+        rows = cur.fetchall()
+        observe_query(sql, time.perf_counter() - start, len(rows))
+        return rows
 
     def execute(self, sql: str, params: Iterable[Any] = ()) -> int:
-        with self.connect() as con:
+        con = self.connection()
+        start = time.perf_counter()
+        with con:
+            cur = con.execute(sql, tuple(params))
+        observe_query(sql, time.perf_counter() - start)
+        return cur.lastrowid
+
+    def iter_query(self, sql: str, params: Iterable[Any] = (), batch: int = 500) -> Iterator[sqlite3.Row]:
+        """Yield rows as the cursor produces them, on a dedicated connection.
+
+        Meant for streaming responses, whose iteration may hop between
+        threads; the connection is closed when the generator finishes or is
+        closed.
+        """
+        con = self.connect()
+        busy = 0.0
+        count = 0
+        try:
+            start = time.perf_counter()
             cur = con.execute(sql, tuple(params))
+            while True:
+                rows = cur.fetchmany(batch)
+                busy += time.perf_counter() - start
+                if not rows:
+                    break
+                count += len(rows)
+                yield from rows
+                start = time.perf_counter()
+        finally:
+            con.close()
+            # Time spent in SQLite only, not while the consumer held the rows
+            observe_query(sql, busy, count)
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a block in one write transaction on this thread's connection.
+
+        BEGIN IMMEDIATE takes the write lock up front, so the block never
+        fails half-way on lock upgrade; any exception rolls everything back.
+        """
+        con = self.connection()
+        con.execute("BEGIN IMMEDIATE")
+        try:
+            yield con
+        except BaseException:
+            con.rollback()
+            raise
+        else:
             con.commit()
-            return cur.lastrowid
+
+    def ensure_indexes(self, specs: Iterable[Tuple[str, str, Sequence[str]]]) -> List[str]:
+        """Create indexes from (name, table, columns) specs unless already covered.
+
+        An existing index counts as covering when its leading columns equal
+        the wanted ones, whatever it is called. Specs for missing tables or
+        columns are skipped. Returns the names of the indexes created.
+        """
+        created: List[str] = []
+        con = self.connection()
+        for name, table, columns in specs:
+            table_cols = {r[1] for r in con.execute(f"PRAGMA table_info({table})")}
+            if not table_cols or any(c not in table_cols for c in columns):
+                continue
+            covered = False
+            for idx in con.execute(f"PRAGMA index_list({table})").fetchall():
+                idx_cols = [r[2] for r in con.execute(f"PRAGMA index_info({idx[1]})")]
+                if idx_cols[:len(columns)] == list(columns):
+                    covered = True
+                    break
+            if not covered:
+                try:
+                    with con:
+                        con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({', '.join(columns)})")
+                except sqlite3.OperationalError:
+                    # e.g. read-only database file: keep serving with what exists
+                    continue
+                created.append(name)
+        return created
 
     def ensure_submissions_table(self) -> None:
         table = TABLES["submissions"]["table"]
         sql = ensure_submission_table_sql(table)
-        with self.connect() as con:
+        con = self.connection()
+        with con:
             con.executescript(sql)
 
             # Migration: ensure `parameter_name` exists and `parameter_id` is nullable
@@ -63,13 +231,14 @@ class DB:
                         dimension_id INTEGER,
                         is29bit INTEGER,
                         notes TEXT,
-                        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+                        created_at TEXT DEFAULT CURRENT_TIMESTAMP,
+                        status TEXT NOT NULL DEFAULT 'new'
                     );
                     """
                 )
                 # Copy data; parameter_name will be NULL
                 existing_cols = [c for c in [
-                    "id","vehicle_id","parameter_id","parameter_name","byte_indices","bit_indices","can_id","formula","endian","bus_type_id","can_bus_id","offset_bits","length_bits","dimension_id","is29bit","notes","created_at"
+                    "id","vehicle_id","parameter_id","parameter_name","byte_indices","bit_indices","can_id","formula","endian","bus_type_id","can_bus_id","offset_bits","length_bits","dimension_id","is29bit","notes","created_at","status"
                 ] if c in cols]
                 col_list = ",".join(existing_cols)
                 con.execute(
@@ -78,11 +247,172 @@ class DB:
                 con.execute(f"DROP TABLE {table}")
                 con.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
                 con.execute("COMMIT")
+            elif "status" not in cols:
+                con.execute(f"ALTER TABLE {table} ADD COLUMN status TEXT NOT NULL DEFAULT 'new'")
+
+            # Review queries (GET /api/submissions) filter on one of these and page by id;
+            # the rowid is the implicit last column of every index, so no sort is needed
+            for name, columns in SUBMISSION_INDEXES:
+                con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table} ({columns})")
 
 
 db = DB()
+# Every write to submissions/canParameters goes through this one connection
+writer = GroupCommitWriter(db.connect)
+
+
+class CatalogEntry(NamedTuple):
+    value: Any
+    body: bytes  # compact JSON encoding of `value`, ready to send
+    etag: str
+    last_modified: str  # HTTP-date
+
+
+class CatalogCache:
+    """In-memory cache for reference lists (makes, models, generations, ...).
+
+    Entries stay valid until the database really changes: every lookup
+    compares `PRAGMA data_version` (bumped by commits from any other
+    connection or process) and the file inode against the values seen when
+    the entries were loaded. Keyed entries (per make/model) are LRU-bounded.
+    """
+
+    def __init__(
+        self,
+        database: DB,
+        max_entries: int = CATALOG_CACHE_SIZE,
+        version_source: Optional[Callable[[], Optional[Tuple[int, int]]]] = None,
+    ):
+        self._db = database
+        self._version_source = version_source
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._global: Dict[Hashable, CatalogEntry] = {}
+        self._keyed: "OrderedDict[Hashable, CatalogEntry]" = OrderedDict()
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_ino: Optional[int] = None
+        self._version: Optional[Tuple[int, int]] = None
+        self._last_modified = formatdate(time.time(), usegmt=True)
+
+    def _current_version(self) -> Optional[Tuple[int, int]]:
+        # Caller holds self._lock. With an active catalog snapshot, entries
+        # follow the snapshot and no lookup touches the file.
+        if self._version_source is not None:
+            version = self._version_source()
+            if version is not None:
+                return version
+        # The probe connection never writes, so its data_version changes
+        # exactly when someone else commits.
+        try:
+            ino = os.stat(self._db.path).st_ino
+        except OSError:
+            return None
+        if self._probe is None or self._probe_ino != ino:
+            if self._probe is not None:
+                self._probe.close()
+            self._probe = sqlite3.connect(self._db.uri(), uri=True, check_same_thread=False)
+            self._probe_ino = ino
+        return ino, self._probe.execute("PRAGMA data_version").fetchone()[0]
 
+    def _validate(self) -> Optional[Tuple[int, int]]:
+        version = self._current_version()
+        if version != self._version:
+            self._global.clear()
+            self._keyed.clear()
+            self._version = version
+            self._last_modified = formatdate(time.time(), usegmt=True)
+        return version
 
+    def version(self) -> Optional[Tuple[int, int]]:
+        """Current database version token; drops cached entries if it moved."""
+        with self._lock:
+            return self._validate()
+
+    def get(self, key: Hashable, loader: Callable[[], Any], keyed: bool = False) -> CatalogEntry:
+        with self._lock:
+            version = self._validate()
+            store = self._keyed if keyed else self._global
+            entry = store.get(key)
+            if entry is not None:
+                if keyed:
+                    self._keyed.move_to_end(key)
+                return entry
+            last_modified = self._last_modified
+
+        value = loader()
+        body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        # Weak: the compression middleware sends gzip/br/identity bodies under the same tag
+        etag = 'W/"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+        entry = CatalogEntry(value, body, etag, last_modified)
+
+        with self._lock:
+            # Don't store a result that may predate a concurrent change
+            if self._version == version:
+                store = self._keyed if keyed else self._global
+                store[key] = entry
+                if keyed:
+                    self._keyed.move_to_end(key)
+                    while len(self._keyed) > self._max_entries:
+                        self._keyed.popitem(last=False)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._global.clear()
+            self._keyed.clear()
+            self._version = None
+
+    def close(self) -> None:
+        with self._lock:
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+            self._global.clear()
+            self._keyed.clear()
+            self._version = None
+
+
+def snapshot_tables() -> List[str]:
+    """Tables copied into the in-memory catalog snapshot."""
+    names = [TABLES[key]["table"] for key in ("manufacturers", "models", "generations", "parameters")]
+    return names + ["busType", "canBuses", "dimensions", COVERAGE_TABLE]
+
+
+snapshot = CatalogSnapshot(lambda: db.path, snapshot_tables, CATALOG_SNAPSHOT_POLL_MS)
+catalog = CatalogCache(db, version_source=snapshot.version)
+
+
+def catalog_query(sql: str, params: Iterable[Any] = ()) -> List[sqlite3.Row]:
+    """Run a catalog read on the in-memory snapshot when active, else on the file."""
+    rows = snapshot.query(sql, params)
+    return rows if rows is not None else db.query(sql, params)
+
+
+def catalog_iter_query(sql: str, params: Iterable[Any] = ()) -> Iterator[sqlite3.Row]:
+    rows = snapshot.iter_query(sql, params)
+    return rows if rows is not None else db.iter_query(sql, params)
+
+
+def catalog_cached(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Serve `func(*args)` from the catalog cache.
+
+    The wrapped function returns the cached value; `func.entry(*args)` returns
+    the full `CatalogEntry` (with ETag/Last-Modified) for HTTP responses.
+    Cached values are shared between callers and must not be mutated.
+    """
+
+    def entry(*args: Any) -> CatalogEntry:
+        return catalog.get((func.__name__,) + args, lambda: func(*args), keyed=bool(args))
+
+    @functools.wraps(func)
+    def wrapper(*args: Any) -> Any:
+        return entry(*args).value
+
+    wrapper.entry = entry  # type: ignore[attr-defined]
+    return wrapper
+
+
+@catalog_cached
 def get_makes() -> List[str]:
     mt = TABLES["manufacturers"]
     sql = (
@@ -90,29 +420,33 @@ def get_makes() -> List[str]:
         f"WHERE {mt['name']} IS NOT NULL AND TRIM({mt['name']}) <> '' "
         f"ORDER BY {mt['name']}"
     )
-    rows = db.query(sql)
+    rows = catalog_query(sql)
     return [r["make"] for r in rows]
 
 
-def get_models(make: str) -> List[str]:
+def _models_sql() -> str:
     mt = TABLES["manufacturers"]
     mdl = TABLES["models"]
-    sql = (
+    return (
         f"SELECT DISTINCT m.{mdl['name']} AS model "
         f"FROM {mdl['table']} m "
         f"JOIN {mt['table']} mf ON m.{mdl['manufacturer_id']} = mf.{mt['id']} "
         f"WHERE mf.{mt['name']} = ? AND m.{mdl['name']} IS NOT NULL AND TRIM(m.{mdl['name']}) <> '' "
         f"ORDER BY m.{mdl['name']}"
     )
-    rows = db.query(sql, (make,))
+
+
+@catalog_cached
+def get_models(make: str) -> List[str]:
+    rows = catalog_query(_models_sql(), (make,))
     return [r["model"] for r in rows]
 
 
-def get_generations(make: str, model: str) -> List[Dict[str, Any]]:
+def _generations_sql() -> str:
     mt = TABLES["manufacturers"]
     mdl = TABLES["models"]
     gen = TABLES["generations"]
-    sql = (
+    return (
         f"SELECT g.{gen['id']} AS id, g.{gen['name']} AS name, "
         f"g.{gen['major']} AS major, g.{gen['minor']} AS minor "
         f"FROM {gen['table']} g "
@@ -121,19 +455,27 @@ def get_generations(make: str, model: str) -> List[Dict[str, Any]]:
         f"WHERE mf.{mt['name']} = ? AND m.{mdl['name']} = ? "
         f"ORDER BY g.{gen['name']}, g.{gen['major']}, g.{gen['minor']}"
     )
-    rows = db.query(sql, (make, model))
-    result: List[Dict[str, Any]] = []
-    for r in rows:
-        label_parts = [r["name"]] if r["name"] else []
-        if r["major"] is not None and r["minor"] is not None:
-            label_parts.append(f"v{r['major']}.{r['minor']}")
-        result.append({"id": r["id"], "label": " ".join(label_parts) or str(r["id"])})
-    return result
 
 
-def get_vehicles(make: Optional[str] = None, model: Optional[str] = None) -> List[Dict[str, Any]]:
+def generation_label(row: Any) -> str:
+    """Display name of a generation row (id, name, major, minor): `Name v1.2`."""
+    label_parts = [row["name"]] if row["name"] else []
+    if row["major"] is not None and row["minor"] is not None:
+        label_parts.append(f"v{row['major']}.{row['minor']}")
+    return " ".join(label_parts) or str(row["id"])
+
+
+@catalog_cached
+def get_generations(make: str, model: str) -> List[Dict[str, Any]]:
+    rows = catalog_query(_generations_sql(), (make, model))
+    return [{"id": r["id"], "label": generation_label(r)} for r in rows]
+
+
+def _vehicles_sql(make: Optional[str], model: Optional[str], after: Optional[Sequence[Any]]) -> Tuple[str, List[Any]]:
     mt = TABLES["manufacturers"]
     mdl = TABLES["models"]
+    # Keyset order (make, model, id); COALESCE so NULL names still get a place in it
+    key = f"COALESCE(mf.{mt['name']}, ''), COALESCE(m.{mdl['name']}, ''), m.{mdl['id']}"
     cols = (
         f"m.{mdl['id']} AS id, mf.{mt['name']} AS make, m.{mdl['name']} AS model"
     )
@@ -150,70 +492,237 @@ def get_vehicles(make: Optional[str] = None, model: Optional[str] = None) -> Lis
     if model:
         where.append(f"m.{mdl['name']} = ?")
         params.append(model)
+    if after is not None:
+        where.append(f"({key}) > (?, ?, ?)")
+        params.extend(after)
     if where:
         sql += " WHERE " + " AND ".join(where)
-    sql += f" ORDER BY mf.{mt['name']}, m.{mdl['name']}"
-    rows = db.query(sql, params)
+    sql += f" ORDER BY {key}"
+    return sql, params
+
+
+def vehicle_key(row: Dict[str, Any]) -> List[Any]:
+    """Keyset cursor position of a vehicle row: (make, model, id)."""
+    return [row["make"] or "", row["model"] or "", row["id"]]
+
+
+def get_vehicles(
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    after: Optional[Sequence[Any]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    sql, params = _vehicles_sql(make, model, after)
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    rows = catalog_query(sql, params)
     return [dict(r) for r in rows]
 
 
-def get_parameters(query: Optional[str] = None, limit: int = 200) -> List[Dict[str, Any]]:
+def iter_vehicles(
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    after: Optional[Sequence[Any]] = None,
+) -> Iterator[Dict[str, Any]]:
+    """Stream vehicles in keyset order without materializing the result."""
+    sql, params = _vehicles_sql(make, model, after)
+    for r in catalog_iter_query(sql, params):
+        yield dict(r)
+
+
+def _parameters_page_sql(after: Optional[Sequence[Any]]) -> Tuple[str, List[Any]]:
     pt = TABLES["parameters"]
     cols = f"{pt['id']} AS id, {pt['name']} AS name"
-    sql = f"SELECT {cols} FROM {pt['table']}"
+    sql = (
+        f"SELECT {cols} FROM {pt['table']} "
+        f"WHERE {pt['name']} IS NOT NULL AND TRIM({pt['name']}) <> '' "
+    )
     params: List[Any] = []
-    where = [f"{pt['name']} IS NOT NULL", f"TRIM({pt['name']}) <> ''"]
-    if query:
-        where.append(f"{pt['name']} LIKE ?")
-        params.append(f"%{query}%")
-    if where:
-        sql += " WHERE " + " AND ".join(where)
-    sql += f" ORDER BY {pt['name']} LIMIT ?"
-    params.append(limit)
-    rows = db.query(sql, params)
+    if after is not None:
+        sql += f"AND ({pt['name']}, {pt['id']}) > (?, ?) "
+        params.extend(after)
+    sql += f"ORDER BY {pt['name']}, {pt['id']}"
+    return sql, params
+
+
+def parameter_key(row: Dict[str, Any]) -> List[Any]:
+    """Keyset cursor position of a parameter row: (name, id)."""
+    return [row["name"], row["id"]]
+
+
+def get_parameters(
+    query: Optional[str] = None,
+    limit: int = 200,
+    after: Optional[Sequence[Any]] = None,
+) -> List[Dict[str, Any]]:
+    if query and query.strip():
+        refresh_parameter_index()
+        return parameter_index.search(query, limit)
+    sql, params = _parameters_page_sql(after)
+    rows = catalog_query(sql + " LIMIT ?", (*params, limit))
     return [dict(r) for r in rows]
 
 
+def iter_parameters(after: Optional[Sequence[Any]] = None) -> Iterator[Dict[str, Any]]:
+    sql, params = _parameters_page_sql(after)
+    for r in catalog_iter_query(sql, params):
+        yield dict(r)
+
+
+parameter_index = ParameterIndex()
+_parameter_index_lock = threading.Lock()
+_parameter_index_state: Dict[str, Any] = {"version": None, "fingerprint": None}
+
+
+def _parameter_fingerprint() -> Tuple[int, int, float]:
+    pt = TABLES["parameters"]
+    sql = (
+        f"SELECT COUNT(*), COALESCE(MAX({pt['id']}), 0), TOTAL(LENGTH({pt['name']})) "
+        f"FROM {pt['table']} WHERE {pt['name']} IS NOT NULL AND TRIM({pt['name']}) <> ''"
+    )
+    row = catalog_query(sql)[0]
+    return int(row[0]), int(row[1]), float(row[2])
+
+
+def refresh_parameter_index(force: bool = False) -> None:
+    """Rebuild the autocomplete index if the parameter table changed.
+
+    Cheap when nothing was committed since the last call (a data_version
+    check); otherwise a fingerprint query decides whether other tables
+    changed (e.g. a submission) or the parameters did.
+    """
+    with _parameter_index_lock:
+        version = catalog.version()
+        if not force and version == _parameter_index_state["version"]:
+            return
+        fingerprint = _parameter_fingerprint()
+        if force or fingerprint != _parameter_index_state["fingerprint"]:
+            pt = TABLES["parameters"]
+            rows = catalog_query(f"SELECT {pt['id']} AS id, {pt['name']} AS name FROM {pt['table']} WHERE {pt['name']} IS NOT NULL")
+            parameter_index.rebuild((int(r["id"]), r["name"]) for r in rows)
+        _parameter_index_state["version"] = version
+        _parameter_index_state["fingerprint"] = fingerprint
+
+
+def parameters_fingerprint() -> Tuple[int, int, float]:
+    """(count, max id, total name length) of the parameter table, kept current cheaply."""
+    refresh_parameter_index()
+    return _parameter_index_state["fingerprint"]
+
+
+def _index_new_parameter(pid: int, name: str) -> None:
+    with _parameter_index_lock:
+        parameter_index.add(pid, name)
+        fp = _parameter_index_state["fingerprint"]
+        if fp is not None and name.strip():
+            # Keep the fingerprint in step so our own insert doesn't force a rebuild
+            _parameter_index_state["fingerprint"] = (fp[0] + 1, max(fp[1], pid), fp[2] + len(name))
+
+
+def _parameters_created(created: Sequence[Tuple[int, str]]) -> None:
+    """Make parameters just committed by the writer visible to search and catalog reads."""
+    if not created:
+        return
+    for pid, name in created:
+        _index_new_parameter(pid, name)
+    # Search sees them already; swap the catalog snapshot now rather than at the next poll
+    snapshot.request_refresh()
+
+
 def get_parameter_by_name(name: str) -> Optional[int]:
     pt = TABLES["parameters"]
     sql = f"SELECT {pt['id']} AS id FROM {pt['table']} WHERE {pt['name']} = ? LIMIT 1"
-    rows = db.query(sql, (name,))
+    rows = catalog_query(sql, (name,))
     return int(rows[0]["id"]) if rows else None
 
 
+def get_parameter_name(parameter_id: int) -> Optional[str]:
+    pt = TABLES["parameters"]
+    sql = f"SELECT {pt['name']} AS name FROM {pt['table']} WHERE {pt['id']} = ?"
+    rows = catalog_query(sql, (parameter_id,))
+    return rows[0]["name"] if rows else None
+
+
 def ensure_parameter(name: str) -> int:
     """Return parameter id by name, creating it if absent."""
     existing = get_parameter_by_name(name)
     if existing is not None:
         return existing
     pt = TABLES["parameters"]
-    # Insert only the name column; other columns default/null
-    insert_sql = f"INSERT INTO {pt['table']} ({pt['name']}) VALUES (?)"
-    return db.execute(insert_sql, (name,))
 
+    def job(con: sqlite3.Connection) -> Tuple[int, bool]:
+        # Checked again on the writer: another request may have created it meanwhile
+        row = con.execute(f"SELECT {pt['id']} FROM {pt['table']} WHERE {pt['name']} = ? LIMIT 1", (name,)).fetchone()
+        if row is not None:
+            return int(row[0]), False
+        # Insert only the name column; other columns default/null
+        cur = con.execute(f"INSERT INTO {pt['table']} ({pt['name']}) VALUES (?)", (name,))
+        return cur.lastrowid, True
 
-def parameter_exists_in_generation(generation_id: int, parameter_id: int) -> bool:
-    # canData(generationId, canParameterId, ...)
-    sql = (
-        "SELECT 1 FROM canData WHERE generationId = ? AND canParameterId = ? LIMIT 1"
+    pid, created = writer.run(job)
+    if created:
+        _parameters_created([(pid, name)])
+    return pid
+
+
+def _parameter_exists_sql() -> str:
+    cd = TABLES["can_data"]
+    return (
+        f"SELECT 1 FROM {cd['table']} WHERE {cd['generation_id']} = ? AND {cd['parameter_id']} = ? LIMIT 1"
     )
-    rows = db.query(sql, (generation_id, parameter_id))
+
+
+def parameter_exists_in_generation(generation_id: int, parameter_id: int) -> bool:
+    rows = db.query(_parameter_exists_sql(), (generation_id, parameter_id))
     return len(rows) > 0
 
 
-def get_generation_parameters(generation_id: int) -> List[Dict[str, Any]]:
+def _generation_parameters_sql() -> str:
     pt = TABLES["parameters"]
-    sql = (
-        f"SELECT p.{pt['id']} AS id, p.{pt['name']} AS name, COUNT(*) AS entries "
-        f"FROM canData d JOIN {pt['table']} p ON d.canParameterId = p.{pt['id']} "
-        f"WHERE d.generationId = ? "
-        f"GROUP BY p.{pt['id']}, p.{pt['name']} "
+    return (
+        f"SELECT p.{pt['id']} AS id, p.{pt['name']} AS name, c.entries AS entries "
+        f"FROM {_coverage_source()} c JOIN {pt['table']} p ON c.canParameterId = p.{pt['id']} "
+        f"WHERE c.generationId = ? "
         f"ORDER BY p.{pt['name']}"
     )
-    rows = db.query(sql, (generation_id,))
+
+
+def get_generation_parameters(generation_id: int) -> List[Dict[str, Any]]:
+    rows = catalog_query(_generation_parameters_sql(), (generation_id,))
     return [dict(r) for r in rows]
 
 
+@catalog_cached
+def get_coverage(make: str, model: str) -> Dict[str, Any]:
+    """Parameter x generation matrix of canData entry counts for one model."""
+    generations = get_generations(make, model)
+    pt = TABLES["parameters"]
+    mt = TABLES["manufacturers"]
+    mdl = TABLES["models"]
+    gen = TABLES["generations"]
+    rows = catalog_query(
+        f"SELECT c.generationId AS generation_id, p.{pt['id']} AS id, p.{pt['name']} AS name, c.entries AS entries "
+        f"FROM {_coverage_source()} c "
+        f"JOIN {gen['table']} g ON c.generationId = g.{gen['id']} "
+        f"JOIN {mdl['table']} m ON g.{gen['model_id']} = m.{mdl['id']} "
+        f"JOIN {mt['table']} mf ON m.{mdl['manufacturer_id']} = mf.{mt['id']} "
+        f"JOIN {pt['table']} p ON c.canParameterId = p.{pt['id']} "
+        f"WHERE mf.{mt['name']} = ? AND m.{mdl['name']} = ? "
+        f"ORDER BY p.{pt['name']}, p.{pt['id']}",
+        (make, model),
+    )
+    column = {g["id"]: i for i, g in enumerate(generations)}
+    parameters: List[Dict[str, Any]] = []
+    for r in rows:
+        if not parameters or parameters[-1]["id"] != r["id"]:
+            parameters.append({"id": r["id"], "name": r["name"], "entries": [0] * len(generations)})
+        i = column.get(r["generation_id"])
+        if i is not None:
+            parameters[-1]["entries"][i] = r["entries"]
+    return {"generations": generations, "parameters": parameters}
+
+
 def insert_submission(
     vehicle_id: Optional[int],
     parameter_id: Optional[int],
@@ -236,27 +745,458 @@ def insert_submission(
         INSERT INTO {st} (vehicle_id, parameter_id, parameter_name, can_id, formula, endian, notes, byte_indices, bit_indices, bus_type_id, can_bus_id, offset_bits, length_bits, dimension_id, is29bit)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
     """
-    import json
-    return db.execute(sql, (
+    params = (
         vehicle_id, parameter_id, parameter_name, can_id, formula, endian, notes,
         json.dumps(byte_indices or []), json.dumps(bit_indices or []),
         bus_type_id, can_bus_id, offset_bits, length_bits, dimension_id, is29bit,
-    ))
+    )
+    return writer.run(lambda con: con.execute(sql, params).lastrowid)
+
+
+def catalog_index_specs() -> List[Tuple[str, str, Tuple[str, ...]]]:
+    """Indexes the hot lookups rely on, named after the configured columns."""
+    mt = TABLES["manufacturers"]
+    mdl = TABLES["models"]
+    gen = TABLES["generations"]
+    pt = TABLES["parameters"]
+    cd = TABLES["can_data"]
+    return [
+        ("idx_webcan_can_data_generation_parameter", cd["table"], (cd["generation_id"], cd["parameter_id"])),
+        ("idx_webcan_models_manufacturer", mdl["table"], (mdl["manufacturer_id"], mdl["name"])),
+        ("idx_webcan_manufacturers_name", mt["table"], (mt["name"], mt["id"])),
+        ("idx_webcan_generations_model", gen["table"], (gen["model_id"],)),
+        ("idx_webcan_parameters_name", pt["table"], (pt["name"],)),
+    ]
+
+
+index_report: Dict[str, Any] = {"created": [], "analyzed": False, "checked_at": None}
+
+
+def provision_indexes() -> Dict[str, Any]:
+    """Create missing catalog indexes, refresh planner statistics, remember the outcome."""
+    created = db.ensure_indexes(catalog_index_specs())
+    con = db.connection()
+    has_stats = bool(con.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchall())
+    analyzed = False
+    try:
+        if created or not has_stats:
+            # Sample-based ANALYZE keeps startup bounded on multi-million-row tables
+            con.execute("PRAGMA analysis_limit=1000")
+            con.execute("ANALYZE")
+            con.commit()
+            analyzed = True
+        con.execute("PRAGMA optimize")
+    except sqlite3.OperationalError as e:
+        # e.g. read-only or locked database file: keep serving with the statistics there are
+        log.warning("Could not refresh planner statistics: %s", e)
+        if con.in_transaction:
+            con.rollback()
+    index_report.update(
+        created=created,
+        analyzed=analyzed,
+        checked_at=formatdate(time.time(), usegmt=True),
+    )
+    return index_report
+
+
+def query_plans() -> Dict[str, List[str]]:
+    """EXPLAIN QUERY PLAN of the hot lookups, as SQLite would run them now."""
+    hot = {
+        "parameter_exists_in_generation": (_parameter_exists_sql(), (0, 0)),
+        "get_generation_parameters": (_generation_parameters_sql(), (0,)),
+        "get_models": (_models_sql(), ("",)),
+        "get_generations": (_generations_sql(), ("", "")),
+        "get_submissions_by_vehicle": _submissions_sql({"vehicle_id": 0}, (0,)),
+    }
+    con = db.connection()
+    plans: Dict[str, List[str]] = {}
+    for name, (sql, params) in hot.items():
+        try:
+            plans[name] = [r[3] for r in con.execute("EXPLAIN QUERY PLAN " + sql, params)]
+        except sqlite3.Error as e:
+            plans[name] = [f"error: {e}"]
+    return plans
+
+
+COVERAGE_TABLE = "canDataCoverage"
+coverage_report: Dict[str, Any] = {"ready": False, "rebuilt": False, "checked_at": None}
+
+
+def _coverage_source() -> str:
+    """The coverage summary table, or the equivalent GROUP BY when it could not be provisioned."""
+    if coverage_report["ready"]:
+        return COVERAGE_TABLE
+    cd = TABLES["can_data"]
+    return (
+        f"(SELECT {cd['generation_id']} AS generationId, {cd['parameter_id']} AS canParameterId, COUNT(*) AS entries "
+        f"FROM {cd['table']} GROUP BY {cd['generation_id']}, {cd['parameter_id']})"
+    )
+
+
+def coverage_trigger_sql() -> Dict[str, str]:
+    """Triggers keeping canDataCoverage in step with every canData write, whoever makes it."""
+    cd = TABLES["can_data"]
+    t, gen, par = cd["table"], cd["generation_id"], cd["parameter_id"]
+    add = (
+        f"INSERT INTO {COVERAGE_TABLE} (generationId, canParameterId, entries) "
+        f"SELECT NEW.{gen}, NEW.{par}, 1 WHERE NEW.{gen} IS NOT NULL AND NEW.{par} IS NOT NULL "
+        f"ON CONFLICT (generationId, canParameterId) DO UPDATE SET entries = entries + 1;"
+    )
+    remove = (
+        f"UPDATE {COVERAGE_TABLE} SET entries = entries - 1 "
+        f"WHERE generationId = OLD.{gen} AND canParameterId = OLD.{par}; "
+        f"DELETE FROM {COVERAGE_TABLE} "
+        f"WHERE generationId = OLD.{gen} AND canParameterId = OLD.{par} AND entries <= 0;"
+    )
+    return {
+        "trg_webcan_coverage_insert": f"CREATE TRIGGER trg_webcan_coverage_insert AFTER INSERT ON {t} BEGIN {add} END",
+        "trg_webcan_coverage_delete": f"CREATE TRIGGER trg_webcan_coverage_delete AFTER DELETE ON {t} BEGIN {remove} END",
+        "trg_webcan_coverage_update": (
+            f"CREATE TRIGGER trg_webcan_coverage_update AFTER UPDATE OF {gen}, {par} ON {t} "
+            f"WHEN OLD.{gen} IS NOT NEW.{gen} OR OLD.{par} IS NOT NEW.{par} "
+            f"BEGIN {remove} {add} END"
+        ),
+    }
+
+
+def rebuild_coverage(con: sqlite3.Connection) -> None:
+    cd = TABLES["can_data"]
+    con.execute(f"DELETE FROM {COVERAGE_TABLE}")
+    con.execute(
+        f"INSERT INTO {COVERAGE_TABLE} (generationId, canParameterId, entries) "
+        f"SELECT {cd['generation_id']}, {cd['parameter_id']}, COUNT(*) FROM {cd['table']} "
+        f"WHERE {cd['generation_id']} IS NOT NULL AND {cd['parameter_id']} IS NOT NULL "
+        f"GROUP BY {cd['generation_id']}, {cd['parameter_id']}"
+    )
+
+
+def provision_coverage() -> Dict[str, Any]:
+    """Create the coverage summary and its triggers; rebuild it when it is new or out of step.
+
+    The triggers live in the database, so writes from other tools keep the
+    summary current too. The startup check compares its total against
+    canData and rebuilds on mismatch (e.g. rows written before the triggers
+    existed). Without write access the GROUP BY fallback is used instead.
+    """
+    cd = TABLES["can_data"]
+    con = db.connection()
+    if not con.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (cd["table"],)).fetchall():
+        coverage_report.update(ready=False, rebuilt=False, checked_at=formatdate(time.time(), usegmt=True))
+        return coverage_report
+    rebuilt = False
+    try:
+        with db.transaction() as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {COVERAGE_TABLE} ("
+                "generationId INTEGER NOT NULL, canParameterId INTEGER NOT NULL, entries INTEGER NOT NULL, "
+                "PRIMARY KEY (generationId, canParameterId)) WITHOUT ROWID"
+            )
+            existing = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'")}
+            missing = False
+            for name, sql in coverage_trigger_sql().items():
+                if name not in existing:
+                    con.execute(sql)
+                    missing = True
+            summary_total = con.execute(f"SELECT COALESCE(SUM(entries), 0) FROM {COVERAGE_TABLE}").fetchone()[0]
+            data_total = con.execute(
+                f"SELECT COUNT(*) FROM {cd['table']} "
+                f"WHERE {cd['generation_id']} IS NOT NULL AND {cd['parameter_id']} IS NOT NULL"
+            ).fetchone()[0]
+            if missing or summary_total != data_total:
+                rebuild_coverage(con)
+                rebuilt = True
+        ready = True
+    except sqlite3.OperationalError:
+        # e.g. read-only database file: a summary nobody maintains can't be trusted
+        ready = False
+    coverage_report.update(ready=ready, rebuilt=rebuilt, checked_at=formatdate(time.time(), usegmt=True))
+    return coverage_report
+
+
+def provision_catalog_snapshot() -> Dict[str, Any]:
+    """Install the catalog version triggers and load the first snapshot (WEB_CAN_CATALOG_SNAPSHOT=1)."""
+    if not CATALOG_SNAPSHOT:
+        return snapshot.report
+    con = db.connection()
+    present = {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")}
+    try:
+        with db.transaction() as con:
+            con.execute(
+                f"CREATE TABLE IF NOT EXISTS {VERSION_TABLE} ("
+                "tableName TEXT PRIMARY KEY, version INTEGER NOT NULL) WITHOUT ROWID"
+            )
+            tables = [t for t in snapshot_tables() if t in present]
+            for name, sql in version_trigger_sql(tables).items():
+                if name not in present:
+                    con.execute(sql)
+    except sqlite3.OperationalError:
+        # Read-only file: every commit then counts as a catalog change
+        pass
+    snapshot.start()
+    return snapshot.report
+
+
+# Bound for `IN (...)` lists; stays under SQLITE_MAX_VARIABLE_NUMBER of old builds
+IN_CHUNK = 500
+
+SUBMISSION_COLUMNS = (
+    "vehicle_id", "parameter_id", "parameter_name", "can_id", "formula", "endian", "notes",
+    "byte_indices", "bit_indices", "bus_type_id", "can_bus_id", "offset_bits", "length_bits",
+    "dimension_id", "is29bit",
+)
+
+
+class DuplicateParameterError(Exception):
+    """Some parameters of a batch already exist for the generation in canData."""
 
+    def __init__(self, parameter_ids: Sequence[int]):
+        super().__init__(f"parameters already in canData: {sorted(parameter_ids)}")
+        self.parameter_ids = list(parameter_ids)
 
+
+def _chunks(values: Sequence[Any], size: int = IN_CHUNK) -> Iterator[Sequence[Any]]:
+    for i in range(0, len(values), size):
+        yield values[i:i + size]
+
+
+def resolve_parameter_ids(con: sqlite3.Connection, names: Iterable[str]) -> Dict[str, int]:
+    """Map parameter names to ids with batched `IN (...)` lookups."""
+    pt = TABLES["parameters"]
+    wanted = list(dict.fromkeys(names))
+    found: Dict[str, int] = {}
+    for chunk in _chunks(wanted):
+        marks = ",".join("?" * len(chunk))
+        sql = f"SELECT {pt['id']}, {pt['name']} FROM {pt['table']} WHERE {pt['name']} IN ({marks})"
+        for pid, name in con.execute(sql, tuple(chunk)):
+            found.setdefault(name, int(pid))
+    return found
+
+
+def existing_generation_parameters(con: sqlite3.Connection, generation_id: int, parameter_ids: Iterable[int]) -> List[int]:
+    """Return those of `parameter_ids` that already have canData rows for the generation."""
+    cd = TABLES["can_data"]
+    wanted = list(dict.fromkeys(parameter_ids))
+    hits: List[int] = []
+    for chunk in _chunks(wanted):
+        marks = ",".join("?" * len(chunk))
+        sql = (
+            f"SELECT DISTINCT {cd['parameter_id']} FROM {cd['table']} "
+            f"WHERE {cd['generation_id']} = ? AND {cd['parameter_id']} IN ({marks})"
+        )
+        hits.extend(int(r[0]) for r in con.execute(sql, (generation_id, *chunk)))
+    return hits
+
+
+def _create_missing_parameters(con: sqlite3.Connection, rows: Sequence[Dict[str, Any]]) -> List[Tuple[int, str]]:
+    """Give rows that only carry `parameter_name` an id, creating missing parameters together.
+
+    Rows are updated in place; returns the (id, name) pairs that were created.
+    """
+    pt = TABLES["parameters"]
+    created: List[Tuple[int, str]] = []
+    names = [r["parameter_name"] for r in rows if r.get("parameter_id") is None and r.get("parameter_name")]
+    if not names:
+        return created
+    ids = resolve_parameter_ids(con, names)
+    missing = [n for n in dict.fromkeys(names) if n not in ids]
+    if missing:
+        con.executemany(
+            f"INSERT INTO {pt['table']} ({pt['name']}) VALUES (?)",
+            [(n,) for n in missing],
+        )
+        ids.update(resolve_parameter_ids(con, missing))
+        created = [(ids[n], n) for n in missing if n in ids]
+    for r in rows:
+        if r.get("parameter_id") is None and r.get("parameter_name") in ids:
+            r["parameter_id"] = ids[r["parameter_name"]]
+            # Having an id, no need to store name separately in submissions
+            r["parameter_name"] = None
+    return created
+
+
+def _write_submission_rows(con: sqlite3.Connection, entries: Sequence[Tuple[Optional[int], Dict[str, Any]]]) -> List[int]:
+    """executemany the (vehicle_id, row) pairs into submissions; returns their ids in order."""
+    if not entries:
+        return []
+    st = TABLES["submissions"]["table"]
+    cols = ", ".join(SUBMISSION_COLUMNS)
+    marks = ", ".join("?" * len(SUBMISSION_COLUMNS))
+    con.executemany(
+        f"INSERT INTO {st} ({cols}) VALUES ({marks})",
+        [
+            (
+                vehicle_id, r.get("parameter_id"), r.get("parameter_name"), r["can_id"],
+                r.get("formula"), r.get("endian"), r.get("notes"),
+                json.dumps(r.get("byte_indices") or []), json.dumps(r.get("bit_indices") or []),
+                r.get("bus_type_id"), r.get("can_bus_id"), r.get("offset_bits"),
+                r.get("length_bits"), r.get("dimension_id"), r.get("is29bit"),
+            )
+            for vehicle_id, r in entries
+        ],
+    )
+    # The transaction holds the write lock, so the new rowids are contiguous
+    last = con.execute("SELECT last_insert_rowid()").fetchone()[0]
+    return list(range(last - len(entries) + 1, last + 1))
+
+
+def insert_submissions(vehicle_id: Optional[int], items: Sequence[Dict[str, Any]]) -> List[int]:
+    """Insert a validated batch of submissions atomically (one writer job).
+
+    Each item carries the `insert_submission` fields (minus `vehicle_id`).
+    Parameter names without an id are resolved with one lookup and missing
+    ones are created together; when `vehicle_id` is set, the whole batch is
+    rejected with DuplicateParameterError if any parameter is already
+    mapped for that generation. Nothing is written unless everything is.
+    """
+    if not items:
+        return []
+    rows = [dict(it) for it in items]
+
+    def job(con: sqlite3.Connection) -> Tuple[List[int], List[Tuple[int, str]]]:
+        created = _create_missing_parameters(con, rows)
+        if vehicle_id is not None:
+            dups = existing_generation_parameters(
+                con, vehicle_id, [r["parameter_id"] for r in rows if r.get("parameter_id") is not None]
+            )
+            if dups:
+                raise DuplicateParameterError(dups)
+        return _write_submission_rows(con, [(vehicle_id, r) for r in rows]), created
+
+    ids, created = writer.run(job)
+    _parameters_created(created)
+    return ids
+
+
+def import_submissions(entries: Sequence[Tuple[Optional[int], Dict[str, Any]]]) -> List[Optional[int]]:
+    """Bulk-import variant of `insert_submissions` for rows of mixed generations.
+
+    One atomic writer job per call. Rows whose parameter is already mapped for
+    their generation in canData are skipped (None in the result) instead
+    of failing the others; the rest get their new submission id.
+    """
+    rows = [(vehicle_id, dict(r)) for vehicle_id, r in entries]
+
+    def job(con: sqlite3.Connection) -> Tuple[List[Optional[int]], List[Tuple[int, str]]]:
+        result: List[Optional[int]] = [None] * len(rows)
+        created = _create_missing_parameters(con, [r for _, r in rows])
+        by_generation: Dict[int, List[int]] = {}
+        for vehicle_id, r in rows:
+            if vehicle_id is not None and r.get("parameter_id") is not None:
+                by_generation.setdefault(vehicle_id, []).append(r["parameter_id"])
+        taken = {
+            (gen, pid)
+            for gen, pids in by_generation.items()
+            for pid in existing_generation_parameters(con, gen, pids)
+        }
+        keep = [i for i, (vehicle_id, r) in enumerate(rows) if (vehicle_id, r.get("parameter_id")) not in taken]
+        ids = _write_submission_rows(con, [rows[i] for i in keep])
+        for i, sid in zip(keep, ids):
+            result[i] = sid
+        return result, created
+
+    result, created = writer.run(job)
+    _parameters_created(created)
+    return result
+
+
+def get_submission(submission_id: int) -> Optional[Dict[str, Any]]:
+    st = TABLES["submissions"]["table"]
+    rows = db.query(f"SELECT * FROM {st} WHERE id = ?", (submission_id,))
+    return dict(rows[0]) if rows else None
+
+
+SUBMISSION_FILTERS = ("vehicle_id", "parameter_id", "can_id", "status", "created_from", "created_to")
+
+
+def _submissions_sql(filters: Dict[str, Any], after: Optional[Sequence[Any]]) -> Tuple[str, List[Any]]:
+    """Newest first, keyset on id. `created_to` is exclusive."""
+    st = TABLES["submissions"]["table"]
+    where: List[str] = []
+    params: List[Any] = []
+    for column in ("vehicle_id", "parameter_id", "status"):
+        if filters.get(column) is not None:
+            where.append(f"{column} = ?")
+            params.append(filters[column])
+    if filters.get("can_id") is not None:
+        where.append("can_id = ? COLLATE NOCASE")
+        params.append(filters["can_id"])
+    if filters.get("created_from") is not None:
+        where.append("created_at >= ?")
+        params.append(filters["created_from"])
+    if filters.get("created_to") is not None:
+        where.append("created_at < ?")
+        params.append(filters["created_to"])
+    if after is not None:
+        where.append("id < ?")
+        params.append(after[0])
+    sql = f"SELECT * FROM {st}"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    return sql + " ORDER BY id DESC", params
+
+
+def submission_row(row: sqlite3.Row) -> Dict[str, Any]:
+    """A submission with its stored JSON byte/bit selections decoded into lists."""
+    out = dict(row)
+    for column in ("byte_indices", "bit_indices"):
+        value = out.get(column)
+        try:
+            out[column] = json.loads(value) if value else []
+        except ValueError:
+            out[column] = []
+    return out
+
+
+def submission_key(row: Dict[str, Any]) -> List[Any]:
+    """Keyset cursor position of a submission row: (id,)."""
+    return [row["id"]]
+
+
+def get_submissions(
+    filters: Dict[str, Any],
+    after: Optional[Sequence[Any]] = None,
+    limit: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    sql, params = _submissions_sql(filters, after)
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    return [submission_row(r) for r in db.query(sql, params)]
+
+
+def iter_submissions(filters: Dict[str, Any], after: Optional[Sequence[Any]] = None) -> Iterator[Dict[str, Any]]:
+    sql, params = _submissions_sql(filters, after)
+    for r in db.iter_query(sql, params):
+        yield submission_row(r)
+
+
+@catalog_cached
 def get_bus_types() -> List[Dict[str, Any]]:
-    rows = db.query("SELECT idBus AS id, busName AS name FROM busType ORDER BY id")
+    rows = catalog_query("SELECT idBus AS id, busName AS name FROM busType ORDER BY id")
     return [dict(r) for r in rows]
 
 
+@catalog_cached
 def get_can_buses() -> List[Dict[str, Any]]:
-    rows = db.query("SELECT canBusId AS id, canBusName AS name, canBaudrate AS baudrate FROM canBuses ORDER BY canBaudrate")
+    rows = catalog_query("SELECT canBusId AS id, canBusName AS name, canBaudrate AS baudrate FROM canBuses ORDER BY canBaudrate")
     return [dict(r) for r in rows]
 
 
+@catalog_cached
 def get_dimensions() -> List[Dict[str, Any]]:
     # Not all DBs have a 'priority' column; order by name safely
-    rows = db.query(
+    rows = catalog_query(
         "SELECT id, COALESCE(dimension_ru, dimension_en) AS name FROM dimensions ORDER BY name"
     )
     return [dict(r) for r in rows]
+
+
+@catalog_cached
+def get_bootstrap() -> Dict[str, Any]:
+    """Everything the form needs on first load, in one cacheable document."""
+    return {
+        "makes": get_makes(),
+        "bus_types": get_bus_types(),
+        "can_buses": get_can_buses(),
+        "dimensions": get_dimensions(),
+    }
@@ -0,0 +1,306 @@
+"""Vector DBC importer: signal definitions -> submission rows.
+
+Usage: python -m app.dbc FILE.dbc --vehicle-id GENERATION_ID [--encoding cp1252]
+
+`BO_`/`SG_` lines are parsed as a stream, so multi-megabyte files never sit
+in memory as a whole. Each signal becomes a submission for the generation:
+CAN ID and 29-bit flag from the message, bit window and byte order from
+the signal, `value * factor + offset` as formula, the unit mapped to
+`dimensions` and the signal name to `canParameters` (created if missing).
+Rows go through the same batch insert path and export writer as
+`/api/submissions`.
+"""
+import argparse
+import logging
+import re
+import sqlite3
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from .config import OVERLAP_REJECT
+from .db import catalog_query, db, import_submissions
+from .exports import ExportJob, export_writer
+from .overlap import overlap_detector
+from .search import fold
+from .writer import WriterBusy
+
+
+log = logging.getLogger(__name__)
+
+BO_RE = re.compile(r"^\s*BO_\s+(\d+)\s+(\w+)\s*:\s*(\d+)\s+(\w+)")
+SG_RE = re.compile(
+    r"^\s*SG_\s+(\w+)\s*(M|m\d+M?)?\s*:\s*(\d+)\s*\|\s*(\d+)\s*@\s*([01])\s*([+-])"
+    r"\s*\(\s*([^,\s]+)\s*,\s*([^)\s]+)\s*\)"
+    r"\s*\[\s*([^|\]]*)\|([^\]]*)\]"
+    r"\s*\"([^\"]*)\""
+)
+
+EXTENDED_ID_FLAG = 0x80000000
+# Pseudo message "VECTOR__INDEPENDENT_SIG_MSG" holding signals not sent on the bus
+INDEPENDENT_SIGNALS_ID = 0xC0000000
+
+
+class DbcSignal(NamedTuple):
+    message_id: int
+    is29bit: bool
+    message_name: str
+    name: str
+    start_bit: int
+    length: int
+    little_endian: bool
+    signed: bool
+    factor: str
+    offset: str
+    minimum: str
+    maximum: str
+    unit: str
+    multiplex: Optional[str]
+
+
+class DbcParser:
+    """Line-at-a-time DBC parser; remembers the current `BO_` message."""
+
+    def __init__(self):
+        self.message: Optional[Tuple[int, bool, str]] = None
+
+    def feed(self, line: str) -> Optional[DbcSignal]:
+        m = BO_RE.match(line)
+        if m:
+            raw_id = int(m.group(1))
+            if raw_id == INDEPENDENT_SIGNALS_ID:
+                self.message = None
+            else:
+                self.message = (raw_id & ~EXTENDED_ID_FLAG, bool(raw_id & EXTENDED_ID_FLAG), m.group(2))
+            return None
+        if self.message is None:
+            return None
+        s = SG_RE.match(line)
+        if s is None:
+            if not line.strip():
+                # A blank line ends the message's signal block
+                self.message = None
+            return None
+        message_id, is29bit, message_name = self.message
+        return DbcSignal(
+            message_id=message_id,
+            is29bit=is29bit,
+            message_name=message_name,
+            name=s.group(1),
+            start_bit=int(s.group(3)),
+            length=int(s.group(4)),
+            little_endian=s.group(5) == "1",
+            signed=s.group(6) == "-",
+            factor=s.group(7),
+            offset=s.group(8),
+            minimum=s.group(9).strip(),
+            maximum=s.group(10).strip(),
+            unit=s.group(11).strip(),
+            multiplex=s.group(2),
+        )
+
+
+def iter_signals(lines: Iterable[str]) -> Iterator[DbcSignal]:
+    """Yield the signals of a DBC file line by line."""
+    parser = DbcParser()
+    for line in lines:
+        signal = parser.feed(line)
+        if signal is not None:
+            yield signal
+
+
+def signal_bits(start_bit: int, length: int, little_endian: bool) -> List[int]:
+    """Frame bit indices (byte * 8 + bit, bit 0 = LSB) covered by a signal.
+
+    Intel signals start at their LSB and run upwards; Motorola signals start
+    at their MSB and run down the byte, continuing at bit 7 of the next one.
+    """
+    if little_endian:
+        return list(range(start_bit, start_bit + length))
+    bits = []
+    pos = start_bit
+    for _ in range(length):
+        bits.append(pos)
+        pos = pos + 15 if pos % 8 == 0 else pos - 1
+    return sorted(bits)
+
+
+def _number(text: str) -> str:
+    value = float(text)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def signal_formula(signal: DbcSignal) -> Optional[str]:
+    factor, offset = float(signal.factor), float(signal.offset)
+    expr = "value"
+    if factor != 1:
+        expr = f"value * {_number(signal.factor)}"
+    if offset > 0:
+        expr += f" + {_number(signal.offset)}"
+    elif offset < 0:
+        expr += f" - {_number(signal.offset.lstrip('-'))}"
+    return None if expr == "value" else expr
+
+
+def dimension_lookup() -> Dict[str, int]:
+    """Folded unit text (ru or en) -> dimensions.id."""
+    out: Dict[str, int] = {}
+    for r in catalog_query("SELECT id, dimension_ru, dimension_en FROM dimensions"):
+        for name in (r["dimension_en"], r["dimension_ru"]):
+            if name and fold(name) not in out:
+                out[fold(name)] = int(r["id"])
+    return out
+
+
+def signal_item(signal: DbcSignal, dimensions: Dict[str, int]) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(normalized row for `import_submissions`, raw item for the export snapshot)."""
+    bits = signal_bits(signal.start_bit, signal.length, signal.little_endian)
+    byte_indices = sorted({b // 8 for b in bits})
+    # The offset/length window is a contiguous bit range; Motorola signals crossing
+    # a byte boundary aren't one, so they are described by `bit_indices` alone
+    contiguous = bool(bits) and max(bits) - min(bits) + 1 == len(bits)
+    notes = f"DBC: {signal.message_name}.{signal.name}"
+    if signal.signed:
+        notes += ", signed"
+    if signal.multiplex:
+        notes += f", mux {signal.multiplex}"
+    if signal.minimum or signal.maximum:
+        notes += f", range [{signal.minimum}|{signal.maximum}]"
+    if signal.unit and fold(signal.unit) not in dimensions:
+        notes += f", unit {signal.unit}"
+    row = {
+        "parameter_id": None,
+        "parameter_name": signal.name,
+        "can_id": f"{signal.message_id:X}",
+        "formula": signal_formula(signal),
+        "endian": "little" if signal.little_endian else "big",
+        "notes": notes,
+        "byte_indices": byte_indices,
+        "bit_indices": bits,
+        "bus_type_id": None,
+        "can_bus_id": None,
+        "offset_bits": min(bits) if contiguous else None,
+        "length_bits": signal.length if contiguous else None,
+        "dimension_id": dimensions.get(fold(signal.unit)) if signal.unit else None,
+        "is29bit": 1 if signal.is29bit else 0,
+    }
+    item = {
+        "parameter_id": None,
+        "parameter_name": row["parameter_name"],
+        "can_id": row["can_id"],
+        "formula": row["formula"],
+        "endian": row["endian"],
+        "is29bit": signal.is29bit,
+        "bus_type_id": None,
+        "can_bus_id": None,
+        "offset_bits": row["offset_bits"],
+        "length_bits": row["length_bits"],
+        "dimension_id": row["dimension_id"],
+        "notes": notes,
+        "selected_bits": bits,
+        "selected_bytes": byte_indices,
+    }
+    return row, item
+
+
+def import_signal_chunk(vehicle_id: int, signals: List[DbcSignal], dimensions: Dict[str, int]) -> Dict[str, Any]:
+    """Insert one chunk of signals in a single transaction and queue its export."""
+    # Refuse before writing: once saved, the rows must be able to queue their export
+    if export_writer.full():
+        raise WriterBusy()
+    pairs = [signal_item(s, dimensions) for s in signals]
+    found = signal_conflicts(vehicle_id, signals, [row for row, _ in pairs])
+    conflicts = [{"signal": signals[i].name, **c} for i, c in found]
+    if found and OVERLAP_REJECT:
+        rejected = {i for i, _ in found}
+        kept = [i for i in range(len(signals)) if i not in rejected]
+        signals, pairs = [signals[i] for i in kept], [pairs[i] for i in kept]
+    ids = import_submissions([(vehicle_id, row) for row, _ in pairs]) if pairs else []
+    overlap_detector.added(vehicle_id, [row for row, _ in pairs], ids)
+    saved_ids = [sid for sid in ids if sid is not None]
+    items = [item for (_, item), sid in zip(pairs, ids) if sid is not None]
+    if saved_ids:
+        try:
+            export_writer.submit(ExportJob(
+                payload={"vehicle_id": vehicle_id, "items": items},
+                items=items,
+                saved_ids=saved_ids,
+                gen_id=vehicle_id,
+                is_custom_vehicle=False,
+                created=datetime.now(),
+            ))
+        except Exception:
+            log.exception("Could not queue export for DBC submissions %s", saved_ids)
+    return {
+        "saved": len(saved_ids),
+        "duplicates": [s.name for s, sid in zip(signals, ids) if sid is None],
+        "conflicts": conflicts,
+    }
+
+
+def signal_conflicts(
+    vehicle_id: int, signals: List[DbcSignal], rows: List[Dict[str, Any]]
+) -> List[Tuple[int, Dict[str, Any]]]:
+    """(signal position, conflict) for bit overlaps with the generation's mappings and within the chunk.
+
+    Multiplexed signals (`mNN`) share their message's bits by design and are
+    not checked.
+    """
+    checked = [i for i, s in enumerate(signals) if not (s.multiplex or "").startswith("m")]
+    try:
+        conflicts = overlap_detector.check(vehicle_id, [rows[i] for i in checked], checked)
+    except sqlite3.Error as e:
+        log.warning("Overlap check failed for generation %s: %s", vehicle_id, e)
+        return []
+    return [(c.pop("item"), c) for c in conflicts]
+
+
+class DbcImport:
+    """Accumulates streamed signals and imports them chunk by chunk."""
+
+    def __init__(self, vehicle_id: int, chunk_size: int = 500):
+        self.vehicle_id = vehicle_id
+        self.chunk_size = chunk_size
+        self.dimensions = dimension_lookup()
+        self.pending: List[DbcSignal] = []
+        self.result: Dict[str, Any] = {"signals": 0, "saved": 0, "duplicates": [], "conflicts": []}
+
+    def add(self, signal: DbcSignal) -> bool:
+        """Queue a signal; True when a full chunk is ready for `flush()`."""
+        self.pending.append(signal)
+        self.result["signals"] += 1
+        return len(self.pending) >= self.chunk_size
+
+    def flush(self) -> None:
+        if not self.pending:
+            return
+        chunk, self.pending = self.pending, []
+        outcome = import_signal_chunk(self.vehicle_id, chunk, self.dimensions)
+        self.result["saved"] += outcome["saved"]
+        self.result["duplicates"].extend(outcome["duplicates"])
+        self.result["conflicts"].extend(outcome["conflicts"])
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Import DBC signals as submissions")
+    parser.add_argument("file")
+    parser.add_argument("--vehicle-id", type=int, required=True, help="generationId to attach the signals to")
+    parser.add_argument("--encoding", default="cp1252")
+    parser.add_argument("--chunk-size", type=int, default=500)
+    args = parser.parse_args(argv)
+
+    job = DbcImport(args.vehicle_id, args.chunk_size)
+    with open(args.file, encoding=args.encoding, errors="replace") as f:
+        for signal in iter_signals(f):
+            if job.add(signal):
+                job.flush()
+    job.flush()
+    export_writer.stop()
+    db.close()
+    print(
+        f"signals: {job.result['signals']}, saved: {job.result['saved']}, "
+        f"duplicates: {len(job.result['duplicates'])}, conflicts: {len(job.result['conflicts'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
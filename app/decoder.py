@@ -0,0 +1,288 @@
+"""Decode CAN frames with the mapping stored in a submission.
+
+Formulas are compiled once into a plain Python function from a restricted
+AST (arithmetic on `value`/`x` and a few numeric helpers — no attribute
+access, subscripts or arbitrary calls) and cached by formula text. Bit
+windows are turned into (shift, mask, out_shift) runs over the frame read
+as one integer, so decoding a frame is a handful of integer operations.
+
+Bit numbering follows the form: frame bit `byte * 8 + bit`, bit 0 = LSB of
+the byte. Little-endian (Intel) signals take their lowest frame bit as LSB;
+big-endian (Motorola) signals read bytes in order, the first byte being the
+most significant.
+"""
+import ast
+import json
+import math
+from functools import lru_cache
+from typing import Any, Callable, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from .config import DECODER_CACHE_SIZE
+
+
+class FormulaError(ValueError):
+    pass
+
+
+VARIABLES = ("value", "x")
+FUNCTIONS: Dict[str, Callable[..., Any]] = {
+    "abs": abs,
+    "min": min,
+    "max": max,
+    "round": round,
+    "int": int,
+    "float": float,
+    "sqrt": math.sqrt,
+}
+_BIN_OPS = (
+    ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow,
+    ast.BitAnd, ast.BitOr, ast.BitXor, ast.LShift, ast.RShift,
+)
+_UNARY_OPS = (ast.UAdd, ast.USub, ast.Invert)
+# Keeps `2 ** 10 ** 10` style formulas from stalling the evaluator
+MAX_EXPONENT = 64
+MAX_SHIFT = 64
+# Likewise for huge literals and `round(value, -10 ** 8)` (builds 10 ** 10 ** 8)
+MAX_CONSTANT = 2 ** 64
+MAX_ROUND_DIGITS = 15
+
+
+def _has_pow(node: ast.AST) -> bool:
+    return any(isinstance(n, ast.BinOp) and isinstance(n.op, ast.Pow) for n in ast.walk(node))
+
+
+def _check(node: ast.AST) -> None:
+    if isinstance(node, ast.Expression):
+        _check(node.body)
+    elif isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise FormulaError(f"Недопустимая константа: {node.value!r}")
+        if abs(node.value) > MAX_CONSTANT:
+            raise FormulaError(f"Константа по модулю больше {MAX_CONSTANT}")
+    elif isinstance(node, ast.Name):
+        if node.id not in VARIABLES:
+            raise FormulaError(f"Неизвестное имя: {node.id}")
+    elif isinstance(node, ast.UnaryOp):
+        if not isinstance(node.op, _UNARY_OPS):
+            raise FormulaError("Недопустимая операция")
+        _check(node.operand)
+    elif isinstance(node, ast.BinOp):
+        if not isinstance(node.op, _BIN_OPS):
+            raise FormulaError("Недопустимая операция")
+        _check(node.left)
+        _check(node.right)
+        if isinstance(node.op, (ast.Pow, ast.LShift)):
+            limit = MAX_EXPONENT if isinstance(node.op, ast.Pow) else MAX_SHIFT
+            right = node.right.operand if isinstance(node.right, ast.UnaryOp) else node.right
+            if not isinstance(right, ast.Constant) or abs(right.value) > limit:
+                raise FormulaError(f"Показатель/сдвиг должен быть константой не больше {limit}")
+            # `((9 ** 64) ** 64) ** 64 ...` multiplies the exponents: one power level only
+            if isinstance(node.op, ast.Pow) and _has_pow(node.left):
+                raise FormulaError("Вложенное возведение в степень недопустимо")
+    elif isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS or node.keywords:
+            raise FormulaError("Недопустимый вызов функции")
+        for arg in node.args:
+            _check(arg)
+        if node.func.id == "round" and len(node.args) > 1:
+            digits = node.args[1]
+            sign = -1 if isinstance(digits, ast.UnaryOp) and isinstance(digits.op, ast.USub) else 1
+            digits = digits.operand if isinstance(digits, ast.UnaryOp) else digits
+            if (
+                len(node.args) > 2 or not isinstance(digits, ast.Constant) or not isinstance(digits.value, int)
+                or abs(sign * digits.value) > MAX_ROUND_DIGITS
+            ):
+                raise FormulaError(f"round: число знаков должно быть целой константой от -{MAX_ROUND_DIGITS} до {MAX_ROUND_DIGITS}")
+    else:
+        raise FormulaError(f"Недопустимое выражение: {type(node).__name__}")
+
+
+def _identity(value: float) -> float:
+    return value
+
+
+class _RenameX(ast.NodeTransformer):
+    def visit_Name(self, node: ast.Name) -> ast.AST:
+        return ast.copy_location(ast.Name(id="value", ctx=node.ctx), node) if node.id == "x" else node
+
+
+@lru_cache(maxsize=DECODER_CACHE_SIZE)
+def compile_formula(formula: Optional[str]) -> Callable[[float], float]:
+    """Compile a formula into `f(value) -> number`; empty formulas are identity."""
+    text = (formula or "").strip()
+    if not text:
+        return _identity
+    try:
+        tree = ast.parse(text, mode="eval")
+    except SyntaxError as e:
+        raise FormulaError(f"Синтаксическая ошибка в формуле: {e.msg}") from None
+    _check(tree)
+    # Compiled once as `lambda value: <expr>`, with `x` as an alias of `value`
+    body = ast.Lambda(
+        args=ast.arguments(
+            posonlyargs=[], args=[ast.arg("value")], vararg=None,
+            kwonlyargs=[], kw_defaults=[], kwarg=None, defaults=[],
+        ),
+        body=_RenameX().visit(tree.body),
+    )
+    code = compile(ast.fix_missing_locations(ast.Expression(body)), "<formula>", "eval")
+    return eval(code, {"__builtins__": {}, **FUNCTIONS})
+
+
+_AFFINE_OPS = {
+    ast.Add: lambda l, r: l + r,
+    ast.Sub: lambda l, r: l - r,
+    ast.Mult: lambda l, r: l * r,
+    ast.Div: lambda l, r: l / r,
+}
+
+
+def _affine(node: ast.AST) -> Optional[Tuple[float, float]]:
+    # (scale, offset) of `scale * value + offset`, or None when not of that form
+    if isinstance(node, ast.Constant):
+        return 0.0, float(node.value)
+    if isinstance(node, ast.Name):
+        return 1.0, 0.0
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.UAdd, ast.USub)):
+        inner = _affine(node.operand)
+        if inner is None or isinstance(node.op, ast.UAdd):
+            return inner
+        return -inner[0], -inner[1]
+    if isinstance(node, ast.BinOp) and type(node.op) in _AFFINE_OPS:
+        left, right = _affine(node.left), _affine(node.right)
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, (ast.Add, ast.Sub)):
+            sign = 1.0 if isinstance(node.op, ast.Add) else -1.0
+            return left[0] + sign * right[0], left[1] + sign * right[1]
+        if isinstance(node.op, ast.Mult):
+            if left[0] == 0:
+                return left[1] * right[0], left[1] * right[1]
+            if right[0] == 0:
+                return right[1] * left[0], right[1] * left[1]
+            return None
+        if right[0] == 0 and right[1] != 0:
+            return left[0] / right[1], left[1] / right[1]
+    return None
+
+
+@lru_cache(maxsize=DECODER_CACHE_SIZE)
+def affine_formula(formula: Optional[str]) -> Optional[Tuple[float, float]]:
+    """(scale, offset) when the formula is `scale * value + offset`; None otherwise.
+
+    Empty formulas are (1, 0). Raises FormulaError like `compile_formula`.
+    """
+    text = (formula or "").strip()
+    if not text:
+        return 1.0, 0.0
+    compile_formula(text)
+    result = _affine(ast.parse(text, mode="eval").body)
+    # + 0.0 turns -0.0 into 0.0
+    return None if result is None else (result[0] + 0.0, result[1] + 0.0)
+
+
+class BitLayout(NamedTuple):
+    """How to pull a signal out of a frame read as a single integer."""
+    byteorder: str  # "little" / "big": how the frame bytes are read
+    frame_bytes: int
+    runs: Tuple[Tuple[int, int, int], ...]  # (shift, mask, out_shift)
+    length: int
+
+    def extract(self, data: bytes) -> int:
+        n = self.frame_bytes
+        frame = int.from_bytes(data[:n].ljust(n, b"\0"), self.byteorder)
+        if len(self.runs) == 1:
+            shift, mask, _ = self.runs[0]
+            return (frame >> shift) & mask
+        raw = 0
+        for shift, mask, out_shift in self.runs:
+            raw |= ((frame >> shift) & mask) << out_shift
+        return raw
+
+
+@lru_cache(maxsize=DECODER_CACHE_SIZE)
+def bit_layout(bits: Tuple[int, ...], endian: str) -> BitLayout:
+    """Precompute the shift/mask runs for a set of frame bits (see module docstring)."""
+    if not bits:
+        raise ValueError("Не выбраны биты сигнала")
+    if min(bits) < 0:
+        raise ValueError("Номер бита не может быть отрицательным")
+    frame_bytes = max(8, max(bits) // 8 + 1)
+    big = str(endian).lower() == "big"
+    if big:
+        # Reading the bytes big-endian makes a Motorola signal contiguous in the integer
+        positions = sorted((frame_bytes - 1 - b // 8) * 8 + b % 8 for b in set(bits))
+    else:
+        positions = sorted(set(bits))
+    runs = []
+    start = prev = positions[0]
+    out = 0
+    for p in positions[1:] + [None]:
+        if p is not None and p == prev + 1:
+            prev = p
+            continue
+        width = prev - start + 1
+        runs.append((start, (1 << width) - 1, out))
+        out += width
+        if p is not None:
+            start = prev = p
+    return BitLayout("big" if big else "little", frame_bytes, tuple(runs), len(positions))
+
+
+def window_bits(
+    bit_indices: Optional[Sequence[int]],
+    offset_bits: Optional[int],
+    length_bits: Optional[int],
+) -> Tuple[int, ...]:
+    """Explicit bit selection, or the `offset_bits`/`length_bits` window."""
+    if bit_indices:
+        return tuple(sorted(set(int(b) for b in bit_indices)))
+    if offset_bits is not None and length_bits:
+        return tuple(range(int(offset_bits), int(offset_bits) + int(length_bits)))
+    return ()
+
+
+class SignalDecoder:
+    """Raw and physical value of one mapped signal."""
+
+    __slots__ = ("layout", "formula", "signed", "_sign_bit", "_func")
+
+    def __init__(self, bits: Iterable[int], endian: Optional[str], formula: Optional[str], signed: bool = False):
+        self.layout = bit_layout(tuple(sorted(set(bits))), (endian or "little").lower())
+        self.formula = formula
+        self.signed = signed
+        self._sign_bit = 1 << (self.layout.length - 1)
+        self._func = compile_formula(formula)
+
+    def raw(self, data: bytes) -> int:
+        raw = self.layout.extract(data)
+        if self.signed and raw & self._sign_bit:
+            raw -= self._sign_bit << 1
+        return raw
+
+    def decode(self, data: bytes) -> float:
+        return self.apply(self.raw(data))
+
+    def apply(self, raw: int) -> float:
+        try:
+            return self._func(raw)
+        except (ArithmeticError, MemoryError) as e:
+            # Division by zero, float overflow and the like on real frame data
+            raise FormulaError(f"Ошибка вычисления формулы {self.formula!r}: {e}") from None
+
+
+def _indices(value: Any) -> Optional[Sequence[int]]:
+    # Submissions store byte/bit selections as JSON text
+    if isinstance(value, str):
+        value = json.loads(value) if value.strip() else None
+    return value or None
+
+
+def decoder_for(row: Dict[str, Any], signed: bool = False) -> SignalDecoder:
+    """Build a decoder from a submission row (or a `/api/submissions` item)."""
+    bits = window_bits(
+        _indices(row.get("bit_indices", row.get("selected_bits"))),
+        row.get("offset_bits"),
+        row.get("length_bits"),
+    )
+    return SignalDecoder(bits, row.get("endian"), row.get("formula"), signed=signed)
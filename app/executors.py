@@ -0,0 +1,81 @@
+"""Bounded thread pools that run the blocking parts of the async endpoints.
+
+Endpoints are `async def`; SQLite and file work is handed to one of two
+executors instead of Starlette's shared threadpool:
+
+- `db_executor`: catalog, search and other reads (`WEB_CAN_DB_EXECUTOR_WORKERS`);
+- `io_executor`: writes (which wait on the group-commit writer), uploads and
+  spooled files (`WEB_CAN_IO_EXECUTOR_WORKERS`).
+
+A burst of submissions can then fill `io` without taking the threads that
+serve dropdowns. Both report queue wait, run time, queued and active tasks
+to /api/metrics.
+"""
+import asyncio
+import functools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from .config import DB_EXECUTOR_WORKERS, IO_EXECUTOR_WORKERS
+from .metrics import executor_active, executor_queue_wait, executor_queued, executor_run_time
+
+
+T = TypeVar("T")
+
+
+class BoundedExecutor:
+    """A fixed-size thread pool with queue-time metrics, usable from coroutines."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = max(1, workers)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        # Created on first use, so the pool can be stopped at shutdown and started again
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"webcan-{self.name}")
+            return self._pool
+
+    def _task(self, func: Callable[..., T], queued_at: float) -> T:
+        started = time.perf_counter()
+        executor_queued.dec(1, self.name)
+        executor_queue_wait.observe(started - queued_at, self.name)
+        executor_active.inc(1, self.name)
+        try:
+            return func()
+        finally:
+            executor_active.dec(1, self.name)
+            executor_run_time.observe(time.perf_counter() - started, self.name)
+
+    def _dropped(self, future: "Future[Any]") -> None:
+        # Cancelled before a thread picked it up: it never left the queue
+        if future.cancelled():
+            executor_queued.dec(1, self.name)
+
+    async def run(self, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        """Run `func(*args, **kwargs)` on a pool thread and await its result."""
+        call = functools.partial(func, *args, **kwargs)
+        executor_queued.inc(1, self.name)
+        try:
+            future = self._executor().submit(self._task, call, time.perf_counter())
+        except BaseException:
+            executor_queued.dec(1, self.name)
+            raise
+        future.add_done_callback(self._dropped)
+        return await asyncio.wrap_future(future)
+
+    def stop(self) -> None:
+        """Finish running tasks and release the threads."""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+db_executor = BoundedExecutor("db", DB_EXECUTOR_WORKERS)
+io_executor = BoundedExecutor("io", IO_EXECUTOR_WORKERS)
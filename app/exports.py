@@ -0,0 +1,314 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+import queue
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from datetime import date, datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Union
+
+from .config import EXPORT_DIR, TABLES
+from .db import db, parameters_fingerprint, writer
+from .metrics import export_failures, export_write_latency
+
+
+log = logging.getLogger(__name__)
+
+EXPORT_COUNTER_TABLE = "exportCounters"
+CATALOG_DIR = os.path.join(EXPORT_DIR, "catalog")
+
+
+class ExportJob(NamedTuple):
+    payload: Dict[str, Any]
+    items: Optional[List[Dict[str, Any]]]
+    saved_ids: List[int]
+    gen_id: Optional[int]
+    is_custom_vehicle: bool
+    created: datetime
+
+
+def ensure_export_counter_table() -> None:
+    with db.transaction() as con:
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {EXPORT_COUNTER_TABLE} ("
+            "day TEXT PRIMARY KEY, last_index INTEGER NOT NULL)"
+        )
+
+
+def day_dir(day: date) -> str:
+    return os.path.join(EXPORT_DIR, f"{day.year:04d}", f"{day.month:02d}", f"{day.day:02d}")
+
+
+def _max_existing_index(base_dir: str) -> int:
+    # Only consulted once per day, to continue numbering of files written before the counter existed
+    best = 0
+    try:
+        names = os.listdir(base_dir)
+    except FileNotFoundError:
+        return 0
+    for name in names:
+        m = re.match(r"^(\d+)_", name)
+        if m and name.lower().endswith(".json"):
+            best = max(best, int(m.group(1)))
+    return best
+
+
+def next_export_index(day: date) -> int:
+    """Hand out the next file number for a day, atomically across threads and processes."""
+    key = day.isoformat()
+
+    def job(con: sqlite3.Connection) -> int:
+        cur = con.execute(
+            f"UPDATE {EXPORT_COUNTER_TABLE} SET last_index = last_index + 1 WHERE day = ?", (key,)
+        )
+        if cur.rowcount == 0:
+            con.execute(
+                f"INSERT INTO {EXPORT_COUNTER_TABLE} (day, last_index) VALUES (?, ?)",
+                (key, _max_existing_index(day_dir(day)) + 1),
+            )
+        row = con.execute(f"SELECT last_index FROM {EXPORT_COUNTER_TABLE} WHERE day = ?", (key,)).fetchone()
+        return int(row[0])
+
+    # Goes through the single writer like every other write, so it never competes for the lock
+    return writer.run(job)
+
+
+def export_filename(index: int, payload: Dict[str, Any], items: Optional[List[Dict[str, Any]]]) -> str:
+    idx_str = f"{index:03d}"
+    file_label = "MULTI"
+    if items and len(items) > 0:
+        can_for_name = str(items[0].get("can_id", "")).strip()
+    else:
+        can_for_name = str(payload.get("can_id", "")).strip()
+    if can_for_name:
+        file_label = re.sub(r"[^0-9A-Za-zx]+", "-", can_for_name)
+    return f"{idx_str}_{file_label}.json" if (not items or len(items) == 1) else f"{idx_str}_MULTI.json"
+
+
+def build_snapshot(job: ExportJob) -> Dict[str, Any]:
+    payload, items = job.payload, job.items
+    snapshot = {
+        "db_submission_ids": job.saved_ids,
+        "count": len(job.saved_ids),
+        "timestamp": job.created.isoformat(),
+        "make": payload.get("make") or payload.get("make_custom"),
+        "model": payload.get("model") or payload.get("model_custom"),
+        "generation_label": payload.get("generation_label") or payload.get("generation_custom"),
+        "generation_id": job.gen_id,
+        "items": items if items else [payload],
+    }
+    # If generation is custom (no id) — reference the full parameter catalog for future use
+    if job.gen_id is None:
+        snapshot["parameter_catalog"] = parameter_catalog_ref()
+    return snapshot
+
+
+_catalog_lock = threading.Lock()
+_catalog_state: Dict[str, Any] = {"fingerprint": None, "ref": None}
+
+
+def parameter_catalog_ref() -> Dict[str, Any]:
+    """Reference to the content-addressed parameter catalog, writing it if needed.
+
+    The catalog lives in `exports/catalog/<sha256>.json.gz` (hash of the
+    uncompressed JSON) and is only regenerated when the parameter table
+    fingerprint changes; identical content maps to the same existing file.
+    """
+    with _catalog_lock:
+        fingerprint = parameters_fingerprint()
+        if fingerprint == _catalog_state["fingerprint"] and _catalog_state["ref"] is not None:
+            return _catalog_state["ref"]
+        pt = TABLES["parameters"]
+        rows = db.query(
+            f"SELECT {pt['id']} AS id, {pt['name']} AS name FROM {pt['table']} "
+            f"WHERE {pt['name']} IS NOT NULL AND TRIM({pt['name']}) <> '' ORDER BY {pt['id']}"
+        )
+        data = json.dumps([dict(r) for r in rows], ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        rel_path = f"catalog/{digest}.json.gz"
+        path = os.path.join(EXPORT_DIR, rel_path)
+        if not os.path.exists(path):
+            os.makedirs(CATALOG_DIR, exist_ok=True)
+            # mtime=0 keeps the archive bytes a pure function of the content
+            write_atomic(path, gzip.compress(data, mtime=0))
+        ref = {"sha256": digest, "path": rel_path, "count": len(rows)}
+        _catalog_state.update(fingerprint=fingerprint, ref=ref)
+        return ref
+
+
+def sql_escape(s: Optional[str]) -> str:
+    return (s or "").replace("'", "''")
+
+
+# pid — строкой из 4 цифр (с лидирующими нулями), без перевода в hex
+def fmt_pid(s: str) -> str:
+    ss = ''.join(ch for ch in (s or '') if ch.isalnum())
+    # Если строка вида 0x...., берём числовую часть как int, но возвращаем десятичную строку
+    try:
+        if ss.lower().startswith('0x'):
+            val = int(ss, 16)
+        else:
+            val = int(ss or '0')
+    except Exception:
+        val = 0
+    return f"{val:04d}"
+
+
+def build_insert_sql(job: ExportJob) -> str:
+    """SQL script that applies the submission to a canData database."""
+    payload, items, gen_id = job.payload, job.items, job.gen_id
+    sql_lines: List[str] = []
+    sql_lines.append("BEGIN TRANSACTION;")
+    # If no generation id, generate inserts for manufacturer/model/generation
+    if gen_id is None and job.is_custom_vehicle:
+        make = (payload.get("make") or payload.get("make_custom") or "").replace("'", "''")
+        model = (payload.get("model") or payload.get("model_custom") or "").replace("'", "''")
+        gen_label = (payload.get("generation_label") or payload.get("generation_custom") or "").replace("'", "''")
+        sql_lines.append(f"INSERT INTO manufacturers(manufacturerName) VALUES ('{make}');")
+        sql_lines.append("-- manufacturerId = last_insert_rowid()")
+        sql_lines.append(f"INSERT INTO carsModels(carModelName, manufacturerId) VALUES ('{model}', last_insert_rowid());")
+        sql_lines.append("-- carModelId = last_insert_rowid()")
+        sql_lines.append(f"INSERT INTO generations(generationName, carModelId, MajorVersion, MinorVersion) VALUES ('{gen_label}', last_insert_rowid(), 0, 0);")
+        sql_lines.append("-- generationId = last_insert_rowid()")
+        sql_lines.append("WITH g(id) AS (SELECT last_insert_rowid()) SELECT * FROM g;")
+    elif gen_id is not None:
+        sql_lines.append(f"-- Using existing generationId = {gen_id}")
+
+    # Insert parameters into canData (create canParameters if needed)
+    src_items = items if items else [payload]
+    for it in src_items:
+        p_id = it.get("parameter_id")
+        p_name = it.get("parameter_name")
+        if not p_id and p_name:
+            sql_lines.append(f"INSERT INTO canParameters(canParameterName_ru) VALUES ('{sql_escape(p_name)}');")
+            sql_lines.append("-- canParameterId = last_insert_rowid()")
+            p_ref = "last_insert_rowid()"
+        else:
+            p_ref = str(p_id)
+
+        dim_id = it.get("dimension_id")
+        dim_expr = str(int(dim_id)) if dim_id not in (None, "") else "NULL"
+        can_bus_id = it.get("can_bus_id")
+        bus_type_id = it.get("bus_type_id")
+        # Off/len should be NULL per requirement
+        formula = sql_escape(it.get("formula"))
+        # PID and mask
+        pid_text = fmt_pid(it.get("can_id", "0"))
+        pid_blob = f"X'{pid_text}'"
+        is29 = str(it.get("is29bit")).lower() in ("1", "true", "yes", "on")
+        # payload mask: 8 байт, по выбранным байтам FF, иначе 00
+        sel_bits = it.get("selected_bits") or []
+        sel_bytes = set((b // 8) for b in sel_bits)
+        if not sel_bytes and (it.get("offset_bits") not in (None, "") and it.get("length_bits") not in (None, "")):
+            try:
+                off = int(it.get("offset_bits")); ln = int(it.get("length_bits"));
+                for idx in range(off, min(64, off + ln)):
+                    sel_bytes.add(idx // 8)
+            except Exception:
+                pass
+        mask_bytes = ''.join('FF' if i in sel_bytes else '00' for i in range(8))
+        mask_blob = f"X'{mask_bytes}'"
+
+        sql_lines.append(
+            "INSERT INTO canData (pid, pidMask, is29Bit, formula, canBusId, canParameterId, generationId, busType, deprecated, conditionOffset, conditionLength, dimension)\n"
+            f"VALUES ({pid_blob}, {mask_blob}, {1 if is29 else 0}, '{formula}', {int(can_bus_id) if can_bus_id else 'NULL'}, {p_ref}, "
+            + ("last_insert_rowid()" if gen_id is None else str(gen_id))
+            + f", {int(bus_type_id) if bus_type_id is not None else 'NULL'}, 0, NULL, NULL, {dim_expr});"
+        )
+
+    sql_lines.append("COMMIT;")
+    return "\n".join(sql_lines)
+
+
+def write_atomic(path: str, data: Union[str, bytes], fsync: bool = False) -> None:
+    """Write via a temp file in the same folder and rename, so readers never see partial files.
+
+    With `fsync` the data reaches the disk before the rename (needed when the
+    sources are deleted right after).
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data.encode("utf-8") if isinstance(data, str) else data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_export(job: ExportJob) -> str:
+    """Number and write the JSON snapshot and `_insert.sql` script; returns the JSON path."""
+    day = job.created.date()
+    base_dir = day_dir(day)
+    os.makedirs(base_dir, exist_ok=True)
+    out_path = os.path.join(base_dir, export_filename(next_export_index(day), job.payload, job.items))
+    write_atomic(out_path, json.dumps(build_snapshot(job), ensure_ascii=False, indent=2))
+    # Also generate SQL script for DB insertion
+    write_atomic(out_path[:-5] + "_insert.sql", build_insert_sql(job))
+    return out_path
+
+
+class ExportWriter:
+    """Background thread that writes export files off the request path."""
+
+    def __init__(self, maxsize: int = 1000):
+        self._queue: "queue.Queue[Optional[ExportJob]]" = queue.Queue(maxsize=maxsize)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="export-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, job: ExportJob) -> None:
+        self.start()
+        self._queue.put_nowait(job)
+
+    def _run(self) -> None:
+        while True:
+            job = self._queue.get()
+            try:
+                if job is None:
+                    return
+                start = time.perf_counter()
+                write_export(job)
+                export_write_latency.observe(time.perf_counter() - start)
+            except Exception:
+                export_failures.inc()
+                log.exception("Export failed for submissions %s", job.saved_ids if job else None)
+            finally:
+                self._queue.task_done()
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def full(self) -> bool:
+        return self._queue.full()
+
+    def flush(self) -> None:
+        self._queue.join()
+
+    def stop(self) -> None:
+        """Write everything still queued, then stop the thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
+
+
+export_writer = ExportWriter()
@@ -0,0 +1,395 @@
+"""Check a submitted mapping against a recorded CAN log.
+
+Usage: python -m app.logcheck LOG --submission ID
+       python -m app.logcheck LOG --can-id 7E8 --bits 24-39 --endian little --formula "value * 0.25"
+
+Supported logs (detected from the first lines, or forced with --format):
+- candump:        `(1436509052.249713) can0 7E8#0011223344556677`
+- candump (text): `can0  7E8   [8]  00 11 22 33 44 55 66 77` (optionally `-t` timestamps)
+- asc (Vector):   `0.012345 1  18FEF1FEx  Rx   d 8 00 11 22 33 44 55 66 77`
+- csv:            `timestamp,can_id[,dlc],data` with hex data, spaces allowed
+
+The log is memory-mapped and scanned with a regex built for the one CAN
+ID, so only matching frames reach Python, and only as (start, end) offsets
+of their payload text; the hex is turned into bytes and decoded as NumPy
+arrays over the mapped file with the submission's bit layout and formula.
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+from .decoder import FormulaError, SignalDecoder, decoder_for
+from .search import fold
+
+
+LOG_FORMATS = ("candump", "candump-text", "asc", "csv")
+
+# Sane physical ranges per unit (folded ru/en names), used for the plausibility check
+PLAUSIBLE_RANGES: Dict[str, Tuple[float, float]] = {
+    "rpm": (0, 16000), "об/мин": (0, 16000),
+    "km/h": (0, 450), "км/ч": (0, 450),
+    "°c": (-60, 300), "degc": (-60, 300), "c": (-60, 300),
+    "v": (0, 60), "в": (0, 60),
+    "a": (-1000, 1000), "а": (-1000, 1000),
+    "%": (0, 100),
+    "kpa": (0, 1000), "кпа": (0, 1000),
+    "bar": (0, 300), "бар": (0, 300),
+    "km": (0, 2000000), "км": (0, 2000000),
+    "l": (0, 500), "л": (0, 500),
+    "°": (-720, 720), "deg": (-720, 720),
+}
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:  # pragma: no cover
+        raise RuntimeError("numpy is required for log checks (pip install numpy)") from None
+    return numpy
+
+
+def parse_can_id(text: Any) -> int:
+    """`7E8`, `0x7E8`, `18FEF1FEx` -> int (CAN IDs are hex)."""
+    s = str(text or "").strip().lower()
+    if s.startswith("0x"):
+        s = s[2:]
+    s = s.rstrip("x")
+    if not s or not all(ch in "0123456789abcdef" for ch in s):
+        raise ValueError(f"Некорректный CAN ID: {text}")
+    return int(s, 16)
+
+
+def detect_format(head: bytes) -> str:
+    for line in head.splitlines():
+        s = line.strip()
+        if not s or s.startswith((b"date", b"base", b"//", b"internal", b"Begin", b"End")):
+            if s.startswith((b"date", b"base")):
+                return "asc"
+            continue
+        if s.startswith(b"(") and b"#" in s:
+            return "candump"
+        if re.search(rb"\s\[\d+\]\s", s):
+            return "candump-text"
+        if re.match(rb"^[\d.]+\s+\d+\s+[0-9A-Fa-f]+x?\s+(Rx|Tx)\b", s):
+            return "asc"
+        if b"," in s or b";" in s:
+            return "csv"
+    return "candump"
+
+
+def frame_pattern(log_format: str, can_id: int, is29bit: bool) -> "re.Pattern[bytes]":
+    """Regex matching only the frames of one CAN ID; groups `ts` and `data`."""
+    hex_bytes = rb"(?P<data>(?:[0-9A-Fa-f]{2}[ \t]?)*)"
+    if log_format == "candump":
+        ident = f"{can_id:08X}" if is29bit else f"{can_id:03X}"
+        return re.compile(
+            rb"^\((?P<ts>[\d.]+)\)\s+\S+\s+" + ident.encode() + rb"#(?:#[0-9A-Fa-f])?(?P<data>[0-9A-Fa-f]*)",
+            re.MULTILINE | re.IGNORECASE,
+        )
+    if log_format == "candump-text":
+        ident = f"{can_id:08X}" if is29bit else f"{can_id:03X}"
+        return re.compile(
+            rb"^\s*(?:\((?P<ts>[\d.]+)\)\s+)?\S+\s+" + ident.encode() + rb"\s+\[\d+\]\s+" + hex_bytes,
+            re.MULTILINE | re.IGNORECASE,
+        )
+    if log_format == "asc":
+        ident = f"0*{can_id:X}" + ("x" if is29bit else "(?!x)")
+        return re.compile(
+            rb"^\s*(?P<ts>[\d.]+)\s+\d+\s+" + ident.encode() + rb"\s+(?:Rx|Tx)\s+d\s+\d+\s+" + hex_bytes,
+            re.MULTILINE | re.IGNORECASE,
+        )
+    if log_format == "csv":
+        ident = f"(?:0x)?0*{can_id:X}x?"
+        return re.compile(
+            rb"^\s*\"?(?P<ts>[\d.]+)\"?[,;]\s*\"?" + ident.encode() + rb"\"?[,;](?:\s*\"?\d{1,2}\"?[,;])?\s*\"?"
+            + hex_bytes,
+            re.MULTILINE | re.IGNORECASE,
+        )
+    raise ValueError(f"Неизвестный формат лога: {log_format}")
+
+
+_hex_table = None
+
+
+def _hex_digits():
+    """ASCII byte -> nibble value; 255 for anything that is not a hex digit."""
+    global _hex_table
+    if _hex_table is None:
+        np = _numpy()
+        table = np.full(256, 255, dtype=np.uint8)
+        for i, ch in enumerate(b"0123456789abcdef"):
+            table[ch] = i
+            table[bytes([ch]).upper()[0]] = i
+        _hex_table = table
+    return _hex_table
+
+
+def hex_payloads(buf, starts, ends, chunk: int = 65536):
+    """(payload bytes, byte counts) of the hex text in `buf[start:end]` spans, as NumPy arrays.
+
+    Whitespace between the byte pairs is skipped; rows are zero-padded to
+    the longest payload. Works on the mapped log without copying the spans.
+    """
+    np = _numpy()
+    table = _hex_digits()
+    n = len(starts)
+    width = (int((ends - starts).max()) + 1) // 2 if n else 0
+    payloads = np.zeros((n, width), dtype=np.uint8)
+    lengths = np.zeros(n, dtype=np.int64)
+    cols = np.arange(width * 2, dtype=np.int64)
+    last = len(buf) - 1
+    for lo in range(0, n, chunk):
+        s, e = starts[lo:lo + chunk, None], ends[lo:lo + chunk, None]
+        idx = s + cols
+        nibbles = table[buf[np.minimum(idx, last)]]
+        inside = idx < e
+        keep = inside & (nibbles != 255)
+        digits = np.where(keep, nibbles, 0)
+        # Move each row's digits to the front, in order, zeros after them.
+        # Usually the separators sit in the same columns on every line
+        # (`7E8#00112233`, `00 11 22 33`) and dropping those columns is enough.
+        columns = keep.any(axis=0)
+        if np.array_equal(keep, inside & columns):
+            digits = digits[:, columns]
+        else:
+            digits = np.take_along_axis(digits, np.argsort(~keep, axis=1, kind="stable"), axis=1)
+        if digits.shape[1] % 2:
+            digits = np.pad(digits, ((0, 0), (0, 1)))
+        packed = (digits[:, 0::2] << 4) | digits[:, 1::2]
+        payloads[lo:lo + chunk, :packed.shape[1]] = packed
+        lengths[lo:lo + chunk] = keep.sum(axis=1) // 2
+    return payloads, lengths
+
+
+def scan_log(path: str, can_id: int, is29bit: bool, log_format: str = "auto"):
+    """(timestamps, payload bytes, byte counts, format) of all frames with the given ID.
+
+    Payloads come back as an (frames, bytes) uint8 array, see `hex_payloads`.
+    """
+    np = _numpy()
+    starts, ends = array("q"), array("q")
+    timestamps: List[Optional[bytes]] = []
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return [], np.zeros((0, 0), dtype=np.uint8), np.zeros(0, dtype=np.int64), log_format
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if log_format == "auto":
+                log_format = detect_format(mm[:65536])
+            pattern = frame_pattern(log_format, can_id, is29bit)
+            for m in pattern.finditer(mm):
+                timestamps.append(m.group("ts"))
+                starts.append(m.start("data"))
+                ends.append(m.end("data"))
+            buf = np.frombuffer(mm, dtype=np.uint8)
+            try:
+                payloads, lengths = hex_payloads(buf, np.frombuffer(starts, dtype=np.int64), np.frombuffer(ends, dtype=np.int64))
+            finally:
+                # The map can't be closed while an array still points into it
+                del buf
+    return timestamps, payloads, lengths, log_format
+
+
+def decode_frames(decoder: SignalDecoder, payloads, lengths):
+    """(raw values, physical values, short frame count) as NumPy arrays."""
+    np = _numpy()
+    layout = decoder.layout
+    n = layout.frame_bytes
+    frames = np.zeros((len(payloads), n), dtype=np.uint8)
+    w = min(n, payloads.shape[1])
+    frames[:, :w] = payloads[:, :w]
+    needed = _bytes_needed(layout)
+    if n == 8 and layout.length < 64:
+        frames = frames.view(">u8" if layout.byteorder == "big" else "<u8").ravel()
+        raw = np.zeros(len(frames), dtype=np.uint64)
+        for shift, mask, out_shift in layout.runs:
+            raw |= ((frames >> np.uint64(shift)) & np.uint64(mask)) << np.uint64(out_shift)
+        raw = raw.astype(np.int64)
+        if decoder.signed:
+            sign = np.int64(1) << np.int64(layout.length - 1)
+            raw = np.where(raw & sign, raw - (sign << np.int64(1)), raw)
+    else:
+        # CAN FD frames / 64-bit signals: Python ints per frame
+        raw = np.array([decoder.raw(row.tobytes()) for row in frames], dtype=object)
+    return raw, evaluate(decoder, raw), int((lengths < needed).sum())
+
+
+def _physical(decoder: SignalDecoder, raw: int) -> float:
+    value = decoder.apply(raw)
+    try:
+        return float(value)
+    except OverflowError as e:
+        raise FormulaError(f"Ошибка вычисления формулы {decoder.formula!r}: {e}") from None
+
+
+def evaluate(decoder: SignalDecoder, raw):
+    """Physical values of raw values, failing like `SignalDecoder.decode` would.
+
+    The formula runs on float64 (int64 would wrap silently) with overflow,
+    division by zero and invalid results raised; formulas that don't
+    broadcast (bit operations, min/max/int()) run per frame on Python ints.
+    Non-finite results are a FormulaError too.
+    """
+    np = _numpy()
+    try:
+        with np.errstate(divide="raise", over="raise", invalid="raise"):
+            values = np.asarray(decoder.apply(raw if raw.dtype == object else raw.astype(np.float64)), dtype=np.float64)
+        if values.shape != raw.shape:
+            raise ValueError
+    except FormulaError:
+        raise
+    except Exception:
+        values = np.fromiter((_physical(decoder, v) for v in raw.tolist()), dtype=np.float64, count=len(raw))
+    bad = np.flatnonzero(~np.isfinite(values))
+    if bad.size:
+        i = int(bad[0])
+        raise FormulaError(f"Формула {decoder.formula!r} даёт {values[i]} для raw = {raw[i]} (кадр {i + 1})")
+    return values
+
+
+def _bytes_needed(layout) -> int:
+    """Payload length the bit window reaches into."""
+    if layout.byteorder == "big":
+        return layout.frame_bytes - min(shift for shift, _, _ in layout.runs) // 8
+    return (max(shift + mask.bit_length() for shift, mask, _ in layout.runs) - 1) // 8 + 1
+
+
+def summarize(raw, values, timestamps: List[Optional[bytes]], bins: int = 20,
+              dimension: Optional[str] = None) -> Dict[str, Any]:
+    np = _numpy()
+    n = int(values.size)
+    summary: Dict[str, Any] = {"frames": n}
+    if n == 0:
+        return summary
+    if all(ts is not None for ts in timestamps):
+        ts = np.array(timestamps, dtype="S32").astype(np.float64)
+        duration = float(ts.max() - ts.min())
+        summary["duration_s"] = round(duration, 6)
+        summary["rate_hz"] = round((n - 1) / duration, 3) if duration > 0 else None
+    finite = values[np.isfinite(values)]
+    raw_i = np.asarray(raw, dtype=np.float64)
+    summary["raw"] = {"min": float(raw_i.min()), "max": float(raw_i.max()), "distinct": int(np.unique(raw_i).size)}
+    if finite.size == 0:
+        summary["value"] = None
+        return summary
+    summary["value"] = {
+        "min": float(finite.min()),
+        "max": float(finite.max()),
+        "mean": float(finite.mean()),
+        "std": float(finite.std()),
+        "first": float(finite[0]),
+        "last": float(finite[-1]),
+    }
+    if finite.min() == finite.max():
+        # np.histogram pads a constant to ±0.5, which has no width at large magnitudes
+        summary["histogram"] = {"edges": [float(finite[0])] * 2, "counts": [int(finite.size)]}
+    else:
+        counts, edges = np.histogram(finite, bins=bins)
+        summary["histogram"] = {"edges": [float(e) for e in edges], "counts": [int(c) for c in counts]}
+
+    diffs = np.diff(finite)
+    if diffs.size:
+        up, down = int((diffs > 0).sum()), int((diffs < 0).sum())
+        if up == 0 and down == 0:
+            trend = "constant"
+        elif down == 0:
+            trend = "non-decreasing"
+        elif up == 0:
+            trend = "non-increasing"
+        else:
+            trend = None
+        summary["monotonicity"] = {
+            "trend": trend,
+            "increasing_share": round(up / diffs.size, 4),
+            "decreasing_share": round(down / diffs.size, 4),
+            "max_step": float(np.abs(diffs).max()),
+        }
+
+    bounds = PLAUSIBLE_RANGES.get(fold(dimension)) if dimension else None
+    if bounds is not None:
+        lo, hi = bounds
+        inside = float(((finite >= lo) & (finite <= hi)).mean())
+        summary["plausibility"] = {
+            "dimension": dimension,
+            "range": [lo, hi],
+            "in_range_share": round(inside, 4),
+            "plausible": inside >= 0.99,
+        }
+    else:
+        summary["plausibility"] = {"dimension": dimension, "range": None, "plausible": None}
+    return summary
+
+
+def check_log(path: str, mapping: Dict[str, Any], log_format: str = "auto", bins: int = 20,
+              dimension: Optional[str] = None, signed: bool = False) -> Dict[str, Any]:
+    """Decode every frame of the mapping's CAN ID in a log and summarize the values."""
+    can_id = parse_can_id(mapping.get("can_id"))
+    is29bit = str(mapping.get("is29bit")).lower() in ("1", "true", "yes", "on")
+    decoder = decoder_for(mapping, signed=signed)
+    timestamps, payloads, lengths, log_format = scan_log(path, can_id, is29bit, log_format)
+    np = _numpy()
+    if len(payloads):
+        raw, values, short = decode_frames(decoder, payloads, lengths)
+    else:
+        raw, values, short = np.zeros(0, dtype=np.int64), np.zeros(0), 0
+    result = {
+        "format": log_format,
+        "can_id": f"{can_id:X}",
+        "is29bit": is29bit,
+        "formula": decoder.formula,
+        "short_frames": short,
+    }
+    result.update(summarize(raw, values, timestamps, bins=bins, dimension=dimension))
+    return result
+
+
+def _parse_bits(text: str) -> List[int]:
+    out: List[int] = []
+    for part in text.split(","):
+        lo, _, hi = part.strip().partition("-")
+        out.extend(range(int(lo), int(hi or lo) + 1))
+    return out
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Check a CAN mapping against a log")
+    parser.add_argument("log")
+    parser.add_argument("--submission", type=int, help="submission id to take the mapping from")
+    parser.add_argument("--can-id")
+    parser.add_argument("--29bit", dest="is29bit", action="store_true")
+    parser.add_argument("--bits", help="frame bits, e.g. 24-39 or 0,1,4-7")
+    parser.add_argument("--endian", default="little", choices=("little", "big"))
+    parser.add_argument("--formula")
+    parser.add_argument("--dimension", help="unit for the plausibility check, e.g. rpm")
+    parser.add_argument("--signed", action="store_true")
+    parser.add_argument("--format", default="auto", choices=("auto",) + LOG_FORMATS)
+    parser.add_argument("--bins", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    dimension = args.dimension
+    if args.submission is not None:
+        from .db import get_dimensions, get_submission
+        mapping = get_submission(args.submission)
+        if mapping is None:
+            parser.error(f"submission {args.submission} not found")
+        if dimension is None and mapping.get("dimension_id") is not None:
+            dimension = next((d["name"] for d in get_dimensions() if d["id"] == mapping["dimension_id"]), None)
+    else:
+        if not args.can_id or not args.bits:
+            parser.error("--can-id and --bits are required without --submission")
+        mapping = {
+            "can_id": args.can_id,
+            "is29bit": args.is29bit,
+            "bit_indices": _parse_bits(args.bits),
+            "endian": args.endian,
+            "formula": args.formula,
+        }
+    result = check_log(args.log, mapping, args.format, args.bins, dimension, args.signed)
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,35 @@
-from typing import List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
 
-from fastapi import FastAPI, HTTPException, Query
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, JSONResponse
-from fastapi.staticfiles import StaticFiles
-
-from .db import db, get_makes, get_models, get_parameters, get_vehicles, insert_submission, get_generations, parameter_exists_in_generation, get_parameter_by_name, ensure_parameter, get_generation_parameters, get_bus_types, get_can_buses, get_dimensions
-from .config import DB_PATH, EXPORT_DIR
-import os
-import re
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
+
+from .db import db, writer, catalog, CatalogEntry, DuplicateParameterError, coverage_report, index_report, provision_catalog_snapshot, provision_coverage, provision_indexes, snapshot, query_plans, refresh_parameter_index, get_makes, get_models, get_parameters, get_vehicles, iter_parameters, iter_vehicles, get_parameter_name, get_submission, get_submissions, iter_submissions, submission_key, parameter_key, vehicle_key, import_submissions, insert_submissions, get_generations, get_generation_parameters, get_coverage, get_bus_types, get_can_buses, get_dimensions, get_bootstrap
+from .bulk import iter_lines, iter_records
+from .bundle import BUNDLE_FORMATS, generation_bundle, provision_bundles
+from .changes import get_changes, provision_changes
+from .compression import CompressionMiddleware, PrecompressedStaticFiles, accepted_encodings
+from .dbc import DbcImport, DbcParser
+from .decoder import FormulaError
+from .logcheck import LOG_FORMATS, check_log
+from .overlap import iter_overlaps, overlap_detector
+from .metrics import MetricsMiddleware, export_queue_depth, registry, write_queue_depth
+from .config import BULK_CHUNK_SIZE, DB_PATH, OVERLAP_REJECT, STATIC_DIR
+from .executors import db_executor, io_executor
+from .exports import ExportJob, ensure_export_counter_table, export_writer
+from .writer import WriterBusy, WriterUnavailable
+from datetime import datetime, timedelta, timezone
+import base64
 import json
-from datetime import datetime
+import logging
+import os
+import queue
+import sqlite3
+import tempfile
 
 
+log = logging.getLogger(__name__)
+
 app = FastAPI(title="Web CAN Submission App")
 
 # Allow same-origin and local dev
@@ -23,21 +40,76 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware)
+# Outermost, so latency and sizes are what the client actually gets
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 def startup() -> None:
     if db.available():
         db.ensure_submissions_table()
+        provision_indexes()
+        provision_coverage()
+        provision_catalog_snapshot()
+        provision_bundles()
+        provision_changes()
+        refresh_parameter_index(force=True)
+        ensure_export_counter_table()
+        # Without a database there is nothing to write; both start on first use otherwise
+        writer.start()
+        export_writer.start()
+
+
+@app.on_event("shutdown")
+def shutdown() -> None:
+    # Requests in flight may still queue writes, and exports number their
+    # files through the writer, so the writer stops last
+    io_executor.stop()
+    db_executor.stop()
+    export_writer.stop()
+    writer.stop()
+    snapshot.close()
+    catalog.close()
+    db.close()
 
 
 @app.get("/")
-def index() -> FileResponse:
-    return FileResponse("static/index.html")
+async def index() -> FileResponse:
+    # Prefer the fingerprinted build from `python -m app.build_static` when present
+    built = os.path.join(STATIC_DIR, "dist", "index.html")
+    path = built if os.path.exists(built) else os.path.join(STATIC_DIR, "index.html")
+    return FileResponse(path, headers={"Cache-Control": "no-cache"})
+
+
+@app.get("/sw.js")
+async def service_worker() -> FileResponse:
+    # Served from the root so the worker's scope covers the whole app
+    return FileResponse(
+        os.path.join(STATIC_DIR, "sw.js"),
+        media_type="application/javascript",
+        headers={"Cache-Control": "no-cache", "Service-Worker-Allowed": "/"},
+    )
+
+
+def writer_busy_detail(exc: WriterBusy) -> str:
+    if isinstance(exc, WriterUnavailable):
+        return "Запись в БД временно недоступна, повторите позже."
+    return "Очередь записи переполнена, повторите позже."
+
 
+@app.exception_handler(WriterBusy)
+async def writer_busy(request: Request, exc: WriterBusy) -> JSONResponse:
+    # Backpressure: the write queue is full (or the writer is down), the client should come back shortly
+    return JSONResponse(
+        {"detail": writer_busy_detail(exc)},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
-# Static assets
-app.mount("/static", StaticFiles(directory="static"), name="static")
+
+# Static assets (precompressed, immutable variants under /static/dist)
+app.mount("/static", PrecompressedStaticFiles(directory=STATIC_DIR), name="static")
 
 
 def require_db():
@@ -48,128 +120,322 @@ def require_db():
         )
 
 
+def catalog_response(request: Request, entry: CatalogEntry) -> Response:
+    """Send a cached catalog entry, answering 304 when the client copy is current."""
+    headers = {
+        "ETag": entry.etag,
+        "Last-Modified": entry.last_modified,
+        "Cache-Control": "no-cache",
+    }
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if "*" in tags or entry.etag.removeprefix("W/") in tags:
+            return Response(status_code=304, headers=headers)
+    elif request.headers.get("if-modified-since") == entry.last_modified:
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry.body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/bootstrap")
+async def api_bootstrap(request: Request) -> Response:
+    require_db()
+    return catalog_response(request, await db_executor.run(get_bootstrap.entry))
+
+
+@app.get("/api/catalog/changes")
+async def api_catalog_changes(since: int = Query(0, ge=0)) -> JSONResponse:
+    """Makes, models, generations and parameters changed after catalog version `since`."""
+    require_db()
+    return JSONResponse(await db_executor.run(get_changes, since), headers={"Cache-Control": "no-store"})
+
+
 @app.get("/api/makes")
-def api_makes() -> JSONResponse:
+async def api_makes(request: Request) -> Response:
     require_db()
-    return JSONResponse(get_makes())
+    return catalog_response(request, await db_executor.run(get_makes.entry))
 
 
 @app.get("/api/models")
-def api_models(make: str = Query(...)) -> JSONResponse:
+async def api_models(request: Request, make: str = Query(...)) -> Response:
     require_db()
-    return JSONResponse(get_models(make))
+    return catalog_response(request, await db_executor.run(get_models.entry, make))
+
+
+def encode_cursor(key: List[Any]) -> str:
+    raw = json.dumps(key, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], size: int) -> Optional[List[Any]]:
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        key = json.loads(raw)
+    except Exception:
+        key = None
+    if not isinstance(key, list) or len(key) != size:
+        raise HTTPException(status_code=400, detail="Некорректный cursor")
+    return key
+
+
+def wants_ndjson(request: Request, fmt: Optional[str]) -> bool:
+    return fmt == "ndjson" or "application/x-ndjson" in request.headers.get("accept", "")
+
+
+def ndjson_response(rows: Iterator[Dict[str, Any]], batch: int = 500) -> StreamingResponse:
+    """Stream rows as NDJSON while the cursor produces them; memory stays flat.
+
+    Each batch is read and encoded on the DB executor; the event loop only sends it.
+    """
+    def next_chunk() -> bytes:
+        buf = [json.dumps(row, ensure_ascii=False, separators=(",", ":")) for _, row in zip(range(batch), rows)]
+        return ("\n".join(buf) + "\n").encode("utf-8") if buf else b""
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            while True:
+                chunk = await db_executor.run(next_chunk)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            # Releases the streaming cursor's connection when the client goes away early
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+
+def page_response(request: Request, rows: List[Dict[str, Any]], limit: int, key: Callable[[Dict[str, Any]], List[Any]]) -> JSONResponse:
+    """JSON page of at most `limit` rows (`rows` holds one extra when more follow).
+
+    The position of the next page goes into `X-Next-Cursor` and a `Link: rel="next"` header.
+    """
+    headers: Dict[str, str] = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        cursor = encode_cursor(key(rows[-1]))
+        headers["X-Next-Cursor"] = cursor
+        headers["Link"] = f'<{request.url.include_query_params(cursor=cursor)}>; rel="next"'
+    return JSONResponse(rows, headers=headers)
 
 
 @app.get("/api/vehicles")
-def api_vehicles(make: Optional[str] = None, model: Optional[str] = None) -> JSONResponse:
+async def api_vehicles(
+    request: Request,
+    make: Optional[str] = None,
+    model: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(1000, ge=1, le=5000),
+    format: Optional[str] = None,
+) -> Response:
     require_db()
-    return JSONResponse(get_vehicles(make, model))
+    after = decode_cursor(cursor, 3)
+    if wants_ndjson(request, format):
+        return ndjson_response(iter_vehicles(make, model, after))
+    return page_response(request, await db_executor.run(get_vehicles, make, model, after, limit + 1), limit, vehicle_key)
 
 
 @app.get("/api/generations")
-def api_generations(make: str = Query(...), model: str = Query(...)) -> JSONResponse:
+async def api_generations(request: Request, make: str = Query(...), model: str = Query(...)) -> Response:
     require_db()
-    return JSONResponse(get_generations(make, model))
+    return catalog_response(request, await db_executor.run(get_generations.entry, make, model))
 
 
 @app.get("/api/generation-parameters")
-def api_generation_parameters(generation_id: int = Query(...)) -> JSONResponse:
+async def api_generation_parameters(generation_id: int = Query(...)) -> JSONResponse:
     require_db()
     try:
         gid = int(generation_id)
     except Exception:
         raise HTTPException(status_code=400, detail="generation_id должно быть числом")
-    return JSONResponse(get_generation_parameters(gid))
+    return JSONResponse(await db_executor.run(get_generation_parameters, gid))
+
+
+BUNDLE_MEDIA_TYPES = {"json": "application/json", "bin": "application/octet-stream"}
+
+
+@app.get("/api/generations/{generation_id}/bundle")
+async def api_generation_bundle(request: Request, generation_id: int, format: str = Query("json")) -> Response:
+    """Decode table of one generation (JSON or packed binary), served from the on-disk bundle cache."""
+    require_db()
+    if format not in BUNDLE_FORMATS:
+        raise HTTPException(status_code=400, detail="format должен быть json или bin")
+    bundle = await db_executor.run(generation_bundle, generation_id)
+    if bundle is None:
+        raise HTTPException(status_code=404, detail="Поколение не найдено")
+    headers = {
+        "Cache-Control": "no-cache",
+        "X-Bundle-Hash": bundle.hash,
+        "Vary": "Accept-Encoding",
+    }
+    path = bundle.path(format)
+    accepted = accepted_encodings(request.headers.get("accept-encoding", ""))
+    encoding = "identity"
+    for name, suffix in (("br", ".br"), ("gzip", ".gz")):
+        if name in accepted and os.path.isfile(path + suffix):
+            headers["Content-Encoding"] = encoding = name
+            path += suffix
+            break
+    # Strong ETag per stored variant: the br, gzip and identity bodies differ byte for byte
+    headers["ETag"] = f'"{bundle.hash[:32]}-{format}-{encoding}"'
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        if "*" in tags or headers["ETag"] in tags:
+            headers.pop("Content-Encoding", None)
+            return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type=BUNDLE_MEDIA_TYPES[format], headers=headers)
+
+
+@app.get("/api/coverage")
+async def api_coverage(request: Request, make: str = Query(...), model: str = Query(...)) -> Response:
+    """Which parameters are known for each generation of a model (canData entry counts)."""
+    require_db()
+    return catalog_response(request, await db_executor.run(get_coverage.entry, make, model))
 
 
 @app.get("/api/bus-types")
-def api_bus_types() -> JSONResponse:
+async def api_bus_types(request: Request) -> Response:
     require_db()
-    return JSONResponse(get_bus_types())
+    return catalog_response(request, await db_executor.run(get_bus_types.entry))
 
 
 @app.get("/api/can-buses")
-def api_can_buses() -> JSONResponse:
+async def api_can_buses(request: Request) -> Response:
     require_db()
-    return JSONResponse(get_can_buses())
+    return catalog_response(request, await db_executor.run(get_can_buses.entry))
 
 
 @app.get("/api/dimensions")
-def api_dimensions() -> JSONResponse:
+async def api_dimensions(request: Request) -> Response:
     require_db()
-    return JSONResponse(get_dimensions())
+    return catalog_response(request, await db_executor.run(get_dimensions.entry))
 
 
 @app.get("/api/parameters")
-def api_parameters(query: Optional[str] = None, limit: int = 200) -> JSONResponse:
+async def api_parameters(
+    request: Request,
+    query: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(200, ge=1, le=10000),
+    format: Optional[str] = None,
+) -> Response:
+    require_db()
+    if query and query.strip():
+        # Autocomplete: ranked top-N, no paging
+        return JSONResponse(await db_executor.run(get_parameters, query, limit))
+    after = decode_cursor(cursor, 2)
+    if wants_ndjson(request, format):
+        return ndjson_response(iter_parameters(after))
+    return page_response(request, await db_executor.run(get_parameters, None, limit + 1, after), limit, parameter_key)
+
+
+def parse_int_list(val) -> List[int]:
+    if isinstance(val, list):
+        out = []
+        for x in val:
+            try:
+                out.append(int(x))
+            except Exception:
+                continue
+        return out
+    return []
+
+
+def parse_submission_item(item: dict) -> dict:
+    """Validate one submitted parameter mapping into `insert_submissions` fields."""
+    param_id = int(item["parameter_id"]) if item.get("parameter_id") not in (None, "") else None
+    param_name = str(item.get("parameter_name")).strip() if item.get("parameter_name") else None
+    if param_id is None and not param_name:
+        raise HTTPException(status_code=400, detail="Нужно выбрать параметр из списка или указать название вручную.")
+
+    endian = item.get("endian")
+    if endian is not None:
+        endian = str(endian).lower().strip()
+        if endian not in ("little", "big"):
+            raise HTTPException(status_code=400, detail="Неверное значение 'endian'. Допустимо: little или big.")
+    else:
+        raise HTTPException(status_code=400, detail="Укажите направление чтения: little-endian или big-endian.")
+
+    return {
+        "parameter_id": param_id,
+        "parameter_name": param_name if param_id is None else None,
+        "can_id": str(item["can_id"]).strip(),
+        "formula": str(item.get("formula")).strip() if item.get("formula") else None,
+        "endian": endian,
+        "notes": str(item.get("notes")).strip() if item.get("notes") not in (None,) else None,
+        "byte_indices": parse_int_list(item.get("selected_bytes")),
+        "bit_indices": parse_int_list(item.get("selected_bits")),
+        "bus_type_id": int(item.get("bus_type_id")) if item.get("bus_type_id") not in (None, "") else None,
+        "can_bus_id": int(item.get("can_bus_id")) if item.get("can_bus_id") not in (None, "") else None,
+        "offset_bits": int(item.get("offset_bits")) if item.get("offset_bits") not in (None, "") else None,
+        "length_bits": int(item.get("length_bits")) if item.get("length_bits") not in (None, "") else None,
+        "dimension_id": int(item.get("dimension_id")) if item.get("dimension_id") not in (None, "") else None,
+        "is29bit": 1 if str(item.get("is29bit")).lower() in ("1", "true", "yes", "on") else 0,
+    }
+
+
+def parse_created_bound(value: Optional[str], name: str, upper: bool) -> Optional[str]:
+    """`created_at` bound in the stored `YYYY-MM-DD HH:MM:SS` form; a bare date as `created_to` covers that whole day."""
+    if value is None or not value.strip():
+        return None
+    text = value.strip()
+    try:
+        if len(text) == 10:
+            day = datetime.strptime(text, "%Y-%m-%d")
+            return (day + timedelta(days=1) if upper else day).strftime("%Y-%m-%d %H:%M:%S")
+        moment = datetime.fromisoformat(text.replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"{name}: ожидается дата YYYY-MM-DD или время YYYY-MM-DDTHH:MM:SS")
+    if moment.tzinfo is not None:
+        # created_at is stored in UTC (CURRENT_TIMESTAMP)
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    if upper:
+        # Inclusive upper bound; created_at has whole-second resolution
+        moment = moment.replace(microsecond=0) + timedelta(seconds=1)
+    return moment.strftime("%Y-%m-%d %H:%M:%S")
+
+
+@app.get("/api/submissions")
+async def api_submissions(
+    request: Request,
+    vehicle_id: Optional[int] = None,
+    parameter_id: Optional[int] = None,
+    can_id: Optional[str] = None,
+    status: Optional[str] = None,
+    created_from: Optional[str] = None,
+    created_to: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=5000),
+    format: Optional[str] = None,
+) -> Response:
+    """Submissions for review, newest first, filtered and paged by keyset (`cursor`)."""
     require_db()
-    return JSONResponse(get_parameters(query, limit))
+    filters = {
+        "vehicle_id": vehicle_id,
+        "parameter_id": parameter_id,
+        "can_id": can_id.strip() if can_id and can_id.strip() else None,
+        "status": status.strip() if status and status.strip() else None,
+        "created_from": parse_created_bound(created_from, "created_from", upper=False),
+        "created_to": parse_created_bound(created_to, "created_to", upper=True),
+    }
+    after = decode_cursor(cursor, 1)
+    if wants_ndjson(request, format):
+        return ndjson_response(iter_submissions(filters, after))
+    return page_response(request, await db_executor.run(get_submissions, filters, after, limit + 1), limit, submission_key)
 
 
 @app.post("/api/submissions")
-def api_submit(payload: dict) -> JSONResponse:
+async def api_submit(payload: dict) -> JSONResponse:
     require_db()
-    def parse_int_list(val):
-        if isinstance(val, list):
-            out = []
-            for x in val:
-                try:
-                    out.append(int(x))
-                except Exception:
-                    continue
-            return out
-        return []
-
-    def process_one(item: dict, gen_id_opt: Optional[int]) -> int:
-        param_id = int(item["parameter_id"]) if item.get("parameter_id") not in (None, "") else None
-        param_name = str(item.get("parameter_name")).strip() if item.get("parameter_name") else None
-        if param_id is None and not param_name:
-            raise HTTPException(status_code=400, detail="Нужно выбрать параметр из списка или указать название вручную.")
-        if param_id is None and param_name:
-            # Create parameter in DB if it does not exist yet
-            try:
-                param_id = ensure_parameter(param_name)
-                # Having an id, no need to store name separately in submissions
-                param_name = None
-            except Exception as ex:
-                # Fallback: try resolve only
-                resolved_id = get_parameter_by_name(param_name)
-                if resolved_id is not None:
-                    param_id = resolved_id
-        # Duplicate check only if есть generation и param_id
-        if gen_id_opt is not None and param_id is not None and parameter_exists_in_generation(gen_id_opt, param_id):
-            raise HTTPException(status_code=409, detail="Этот параметр уже присутствует для выбранного поколения в БД (canData).")
+    return await io_executor.run(submit_payload, payload)
 
-        bytes_sel = parse_int_list(item.get("selected_bytes"))
-        bits_sel = parse_int_list(item.get("selected_bits"))
-
-        endian = item.get("endian")
-        if endian is not None:
-            endian = str(endian).lower().strip()
-            if endian not in ("little", "big"):
-                raise HTTPException(status_code=400, detail="Неверное значение 'endian'. Допустимо: little или big.")
-        else:
-            raise HTTPException(status_code=400, detail="Укажите направление чтения: little-endian или big-endian.")
-        formula = str(item.get("formula")).strip() if item.get("formula") else None
-
-        return insert_submission(
-            gen_id_opt if gen_id_opt is not None else None,
-            param_id,
-            param_name if param_id is None else None,
-            str(item["can_id"]).strip(),
-            formula,
-            endian,
-            str(item.get("notes")).strip() if item.get("notes") not in (None,) else None,
-            byte_indices=bytes_sel,
-            bit_indices=bits_sel,
-            bus_type_id=int(item.get("bus_type_id")) if item.get("bus_type_id") not in (None, "") else None,
-            can_bus_id=int(item.get("can_bus_id")) if item.get("can_bus_id") not in (None, "") else None,
-            offset_bits=int(item.get("offset_bits")) if item.get("offset_bits") not in (None, "") else None,
-            length_bits=int(item.get("length_bits")) if item.get("length_bits") not in (None, "") else None,
-            dimension_id=int(item.get("dimension_id")) if item.get("dimension_id") not in (None, "") else None,
-            is29bit=1 if str(item.get("is29bit")).lower() in ("1","true","yes","on") else 0,
-        )
 
+def submit_payload(payload: dict) -> JSONResponse:
+    """Validate and store one `/api/submissions` body; runs on the I/O executor."""
     # Either batch of items or single legacy payload
     items = payload.get("items")
     saved_ids: list[int] = []
@@ -191,152 +457,316 @@ def api_submit(payload: dict) -> JSONResponse:
         if gen_id is None and not is_custom_vehicle:
             raise HTTPException(status_code=400, detail="Не выбрано поколение. Выберите поколение из списка, либо введите своё (кастомное), чтобы создать новую запись.")
 
+        # Validate everything first, then write the whole batch in one transaction
         if items and isinstance(items, list):
-            for it in items:
-                saved_ids.append(process_one(it, gen_id))
+            rows = [parse_submission_item(it) for it in items]
         else:
-            saved_ids.append(process_one(payload, gen_id))
+            rows = [parse_submission_item(payload)]
+        conflicts: List[Dict[str, Any]] = []
+        if gen_id is not None:
+            try:
+                conflicts = overlap_detector.check(gen_id, rows)
+            except sqlite3.Error as e:
+                # The check is advisory: it never blocks a submission by failing
+                log.warning("Overlap check failed for generation %s: %s", gen_id, e)
+        if conflicts and OVERLAP_REJECT:
+            return JSONResponse(
+                {"detail": "Выбранные биты пересекаются с уже известными сопоставлениями этого CAN ID.", "conflicts": conflicts},
+                status_code=409,
+            )
+        # Refuse before writing: once saved, a submission must be able to queue its export
+        if export_writer.full():
+            raise WriterBusy()
+        try:
+            saved_ids = insert_submissions(gen_id, rows)
+        except DuplicateParameterError:
+            raise HTTPException(status_code=409, detail="Этот параметр уже присутствует для выбранного поколения в БД (canData).")
+        if gen_id is not None:
+            overlap_detector.added(gen_id, rows, saved_ids)
+    except WriterBusy:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Insert failed: {e}")
 
-    # Save JSON snapshot to filesystem (single or multi)
+    # JSON snapshot and SQL script are written in the background (single or multi)
     try:
-        now = datetime.now()
-        y = f"{now.year:04d}"
-        m = f"{now.month:02d}"
-        d = f"{now.day:02d}"
-        base_dir = os.path.join(EXPORT_DIR, y, m, d)
-        os.makedirs(base_dir, exist_ok=True)
-
-        existing = [f for f in os.listdir(base_dir) if f.lower().endswith('.json')]
-        def parse_idx(name: str) -> int:
-            try:
-                return int(re.match(r"^(\d+)_", name).group(1))
-            except Exception:
-                return 0
-        next_idx = (max([parse_idx(n) for n in existing] + [0]) + 1)
-        idx_str = f"{next_idx:03d}"
-
-        file_label = "MULTI"
-        if items and len(items) > 0:
-            can_for_name = str(items[0].get("can_id", "")).strip()
-        else:
-            can_for_name = str(payload.get("can_id", "")).strip()
-        if can_for_name:
-            file_label = re.sub(r"[^0-9A-Za-zx]+", "-", can_for_name)
-
-        filename = f"{idx_str}_{file_label}.json" if (not items or len(items)==1) else f"{idx_str}_MULTI.json"
-        out_path = os.path.join(base_dir, filename)
-
-        snapshot = {
-            "db_submission_ids": saved_ids,
-            "count": len(saved_ids),
-            "timestamp": now.isoformat(),
-            "make": payload.get("make") or payload.get("make_custom"),
-            "model": payload.get("model") or payload.get("model_custom"),
-            "generation_label": payload.get("generation_label") or payload.get("generation_custom"),
-            "generation_id": gen_id,
-            "items": items if items else [payload],
-        }
-        # If generation is custom (no id) — include full parameter catalog for future use
-        if gen_id is None:
-            snapshot["all_parameters"] = get_parameters(None, 10000)
-
-        with open(out_path, 'w', encoding='utf-8') as f:
-            json.dump(snapshot, f, ensure_ascii=False, indent=2)
-
-        # Also generate SQL script for DB insertion
-        sql_lines: list[str] = []
-        sql_lines.append("BEGIN TRANSACTION;")
-        # If no generation id, generate inserts for manufacturer/model/generation
-        if gen_id is None and is_custom_vehicle:
-            make = (payload.get("make") or payload.get("make_custom") or "").replace("'", "''")
-            model = (payload.get("model") or payload.get("model_custom") or "").replace("'", "''")
-            gen_label = (payload.get("generation_label") or payload.get("generation_custom") or "").replace("'", "''")
-            sql_lines.append(f"INSERT INTO manufacturers(manufacturerName) VALUES ('{make}');")
-            sql_lines.append("-- manufacturerId = last_insert_rowid()")
-            sql_lines.append(f"INSERT INTO carsModels(carModelName, manufacturerId) VALUES ('{model}', last_insert_rowid());")
-            sql_lines.append("-- carModelId = last_insert_rowid()")
-            sql_lines.append(f"INSERT INTO generations(generationName, carModelId, MajorVersion, MinorVersion) VALUES ('{gen_label}', last_insert_rowid(), 0, 0);")
-            sql_lines.append("-- generationId = last_insert_rowid()")
-            sql_lines.append("WITH g(id) AS (SELECT last_insert_rowid()) SELECT * FROM g;")
-        elif gen_id is not None:
-            sql_lines.append(f"-- Using existing generationId = {gen_id}")
-
-        # Insert parameters into canData (create canParameters if needed)
-        def sql_escape(s: Optional[str]) -> str:
-            return (s or "").replace("'", "''")
-
-        src_items = items if items else [payload]
-        for it in src_items:
-            p_id = it.get("parameter_id")
-            p_name = it.get("parameter_name")
-            if not p_id and p_name:
-                sql_lines.append(f"INSERT INTO canParameters(canParameterName_ru) VALUES ('{sql_escape(p_name)}');")
-                sql_lines.append("-- canParameterId = last_insert_rowid()")
-                p_ref = "last_insert_rowid()"
-            else:
-                p_ref = str(p_id)
-
-            dim_id = it.get("dimension_id")
-            dim_expr = str(int(dim_id)) if dim_id not in (None, "") else "NULL"
-            can_bus_id = it.get("can_bus_id")
-            bus_type_id = it.get("bus_type_id")
-            # Off/len should be NULL per requirement
-            formula = sql_escape(it.get("formula"))
-            # PID and mask
-            # pid — строкой из 4 цифр (с лидирующими нулями), без перевода в hex
-            def fmt_pid(s: str) -> str:
-                ss = ''.join(ch for ch in (s or '') if ch.isalnum())
-                # Если строка вида 0x...., берём числовую часть как int, но возвращаем десятичную строку
-                try:
-                    if ss.lower().startswith('0x'):
-                        val = int(ss, 16)
-                    else:
-                        val = int(ss or '0')
-                except Exception:
-                    val = 0
-                return f"{val:04d}"
-            pid_text = fmt_pid(it.get("can_id", "0"))
-            pid_blob = f"X'{pid_text}'"
-            is29 = str(it.get("is29bit")).lower() in ("1","true","yes","on")
-            # payload mask: 8 байт, по выбранным байтам FF, иначе 00
-            sel_bits = it.get("selected_bits") or []
-            sel_bytes = set((b // 8) for b in sel_bits)
-            if not sel_bytes and (it.get("offset_bits") not in (None, "") and it.get("length_bits") not in (None, "")):
-                try:
-                    off = int(it.get("offset_bits")); ln = int(it.get("length_bits"));
-                    for idx in range(off, min(64, off+ln)):
-                        sel_bytes.add(idx // 8)
-                except Exception:
-                    pass
-            mask_bytes = ''.join('FF' if i in sel_bytes else '00' for i in range(8))
-            mask_blob = f"X'{mask_bytes}'"
-
-            sql_lines.append(
-                "INSERT INTO canData (pid, pidMask, is29Bit, formula, canBusId, canParameterId, generationId, busType, deprecated, conditionOffset, conditionLength, dimension)\n"
-                f"VALUES ({pid_blob}, {mask_blob}, {1 if is29 else 0}, '{formula}', {int(can_bus_id) if can_bus_id else 'NULL'}, {p_ref}, "
-                + ("last_insert_rowid()" if gen_id is None else str(gen_id))
-                + f", {int(bus_type_id) if bus_type_id is not None else 'NULL'}, 0, NULL, NULL, {dim_expr});"
-            )
-
-        sql_lines.append("COMMIT;")
-        sql_path = out_path[:-5] + "_insert.sql"
-        with open(sql_path, 'w', encoding='utf-8') as sf:
-            sf.write("\n".join(sql_lines))
+        export_writer.submit(ExportJob(
+            payload=payload,
+            items=items if items else None,
+            saved_ids=saved_ids,
+            gen_id=gen_id,
+            is_custom_vehicle=is_custom_vehicle,
+            created=datetime.now(),
+        ))
     except Exception as e:
+        # The submission is committed; only its export file is missing
+        error = "Очередь экспорта переполнена, файл не записан." if isinstance(e, queue.Full) else str(e)
         return JSONResponse({
             "saved": len(saved_ids),
             "status": "ok",
             "file_saved": False,
-            "error": str(e),
+            "file_queued": False,
+            "error": error,
+            "conflicts": conflicts,
         }, status_code=201)
 
-    return JSONResponse({"saved": len(saved_ids), "status": "ok", "file_saved": True}, status_code=201)
+    # The file is only queued here: `file_saved` stays False, `file_queued` tells the rest
+    return JSONResponse({"saved": len(saved_ids), "status": "ok", "file_saved": False, "file_queued": True, "conflicts": conflicts}, status_code=201)
+
+
+def bulk_conflicts(entries: List[Tuple[int, int, dict, dict]]) -> Dict[int, List[Dict[str, Any]]]:
+    """Bit overlaps of a bulk chunk per line, items named by their line number."""
+    by_generation: Dict[int, List[Tuple[int, dict]]] = {}
+    for line, gen, row, _ in entries:
+        by_generation.setdefault(gen, []).append((line, row))
+    found: Dict[int, List[Dict[str, Any]]] = {}
+    for gen, lines in by_generation.items():
+        try:
+            conflicts = overlap_detector.check(gen, [row for _, row in lines], [line for line, _ in lines])
+        except sqlite3.Error as e:
+            log.warning("Overlap check failed for generation %s: %s", gen, e)
+            continue
+        for conflict in conflicts:
+            found.setdefault(conflict.pop("item"), []).append(conflict)
+    return found
+
+
+def process_bulk_chunk(records: List[Tuple[int, Any]], default_vehicle_id: Optional[int]) -> List[Dict[str, Any]]:
+    """Validate and import one chunk of bulk records in a single transaction."""
+    results: Dict[int, Dict[str, Any]] = {}
+    entries: List[Tuple[int, int, dict, dict]] = []  # (line, generation, row, raw record)
+    for line, record in records:
+        try:
+            if not isinstance(record, dict):
+                raise HTTPException(status_code=400, detail="Ожидается JSON-объект")
+            gen = record.get("vehicle_id", default_vehicle_id)
+            gen = int(gen) if gen not in (None, "") else None
+            if gen is None:
+                raise HTTPException(status_code=400, detail="Не выбрано поколение (vehicle_id).")
+            entries.append((line, gen, parse_submission_item(record), record))
+        except HTTPException as e:
+            results[line] = {"line": line, "status": "error", "code": e.status_code, "error": e.detail}
+        except Exception as e:
+            results[line] = {"line": line, "status": "error", "code": 400, "error": str(e)}
+
+    conflicts = bulk_conflicts(entries)
+    if conflicts and OVERLAP_REJECT:
+        for line, found in conflicts.items():
+            results[line] = {
+                "line": line, "status": "error", "code": 409,
+                "error": "Выбранные биты пересекаются с уже известными сопоставлениями этого CAN ID.",
+                "conflicts": found,
+            }
+        entries = [e for e in entries if e[0] not in conflicts]
+
+    try:
+        if entries and export_writer.full():
+            raise WriterBusy()
+        ids = import_submissions([(gen, row) for _, gen, row, _ in entries]) if entries else []
+    except WriterBusy as e:
+        for line, _, _, _ in entries:
+            results[line] = {"line": line, "status": "error", "code": 503, "error": writer_busy_detail(e)}
+        ids = []
+    except Exception as e:
+        for line, _, _, _ in entries:
+            results[line] = {"line": line, "status": "error", "code": 500, "error": f"Insert failed: {e}"}
+        ids = []
+
+    saved_by_generation: Dict[int, Tuple[List[int], List[dict]]] = {}
+    for (line, gen, _, record), sid in zip(entries, ids):
+        if sid is None:
+            results[line] = {"line": line, "status": "error", "code": 409, "error": "Этот параметр уже присутствует для выбранного поколения в БД (canData)."}
+            continue
+        results[line] = {"line": line, "status": "ok", "id": sid}
+        if line in conflicts:
+            results[line]["conflicts"] = conflicts[line]
+        group = saved_by_generation.setdefault(gen, ([], []))
+        group[0].append(sid)
+        group[1].append(record)
+
+    by_generation: Dict[int, Tuple[List[dict], List[Optional[int]]]] = {}
+    for (_, gen, row, _), sid in zip(entries, ids):
+        group = by_generation.setdefault(gen, ([], []))
+        group[0].append(row)
+        group[1].append(sid)
+    for gen, (rows, gen_ids) in by_generation.items():
+        overlap_detector.added(gen, rows, gen_ids)
+
+    now = datetime.now()
+    for gen, (saved_ids, items) in saved_by_generation.items():
+        try:
+            export_writer.submit(ExportJob(
+                payload={"vehicle_id": gen, "items": items},
+                items=items,
+                saved_ids=saved_ids,
+                gen_id=gen,
+                is_custom_vehicle=False,
+                created=now,
+            ))
+        except Exception:
+            log.exception("Could not queue export for bulk submissions %s", saved_ids)
+    return [results[line] for line, _ in records]
+
+
+@app.post("/api/submissions/bulk")
+async def api_submit_bulk(
+    request: Request,
+    vehicle_id: Optional[int] = None,
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000),
+) -> StreamingResponse:
+    """Import NDJSON (or a JSON array) of submission items, one transaction per chunk.
+
+    Each record has the fields of a single `/api/submissions` item plus an
+    optional `vehicle_id` (defaults to the query parameter). The response is
+    NDJSON with one result per record and a final summary line.
+    """
+    require_db()
+    out = tempfile.SpooledTemporaryFile(max_size=1 << 20)
+    totals = {"saved": 0, "errors": 0}
+
+    def emit(results: List[Dict[str, Any]]) -> None:
+        for r in results:
+            totals["saved" if r["status"] == "ok" else "errors"] += 1
+            out.write(json.dumps(r, ensure_ascii=False, separators=(",", ":")).encode("utf-8") + b"\n")
+
+    pending: List[Tuple[int, Any]] = []
+    async for line, record, error in iter_records(request.stream()):
+        if error is not None:
+            emit([{"line": line, "status": "error", "code": 400, "error": error}])
+            continue
+        pending.append((line, record))
+        if len(pending) >= chunk_size:
+            emit(await io_executor.run(process_bulk_chunk, pending, vehicle_id))
+            pending = []
+    if pending:
+        emit(await io_executor.run(process_bulk_chunk, pending, vehicle_id))
+    out.write(json.dumps({"summary": totals}).encode("utf-8") + b"\n")
+    out.seek(0)
+
+    async def body() -> AsyncIterator[bytes]:
+        try:
+            while True:
+                # Past 1 MiB the spool is a real file
+                chunk = await io_executor.run(out.read, 64 * 1024)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            out.close()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={
+        "X-Bulk-Saved": str(totals["saved"]),
+        "X-Bulk-Errors": str(totals["errors"]),
+    })
+
+
+@app.post("/api/dbc")
+async def api_import_dbc(
+    request: Request,
+    vehicle_id: int,
+    encoding: str = "cp1252",
+    chunk_size: int = Query(BULK_CHUNK_SIZE, ge=1, le=10000),
+) -> JSONResponse:
+    """Import the signals of a DBC file (raw request body) for a generation.
+
+    The body is parsed as it arrives; every `chunk_size` signals are inserted
+    in one transaction. Signals already present for the generation are
+    skipped and listed in `duplicates`.
+    """
+    require_db()
+    try:
+        "".encode(encoding)
+    except LookupError:
+        raise HTTPException(status_code=400, detail=f"Неизвестная кодировка: {encoding}")
+    if export_writer.full():
+        raise WriterBusy()
+    job = await db_executor.run(DbcImport, vehicle_id, chunk_size)
+    parser = DbcParser()
+    try:
+        async for line in iter_lines(request.stream(), encoding):
+            signal = parser.feed(line)
+            if signal is not None and job.add(signal):
+                await io_executor.run(job.flush)
+        await io_executor.run(job.flush)
+    except WriterBusy as e:
+        # Earlier chunks are committed: say how far the import got
+        return JSONResponse(
+            {"detail": writer_busy_detail(e), **job.result},
+            status_code=503,
+            headers={"Retry-After": str(e.retry_after)},
+        )
+    return JSONResponse(job.result, status_code=201)
+
+
+@app.post("/api/submissions/{submission_id}/check-log")
+async def api_check_log(
+    request: Request,
+    submission_id: int,
+    format: str = "auto",
+    bins: int = Query(20, ge=1, le=1000),
+    signed: bool = False,
+) -> JSONResponse:
+    """Decode a CAN log (raw request body) with a submission's mapping and summarize the values."""
+    require_db()
+    if format != "auto" and format not in LOG_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Неизвестный формат лога: {format}")
+    mapping = await db_executor.run(get_submission, submission_id)
+    if mapping is None:
+        raise HTTPException(status_code=404, detail="Заявка не найдена")
+    dimension = None
+    if mapping.get("dimension_id") is not None:
+        dimensions = await db_executor.run(get_dimensions)
+        dimension = next((d["name"] for d in dimensions if d["id"] == mapping["dimension_id"]), None)
+
+    # Logs can be hundreds of MB: spool to disk so the checker can mmap them
+    fd, path = tempfile.mkstemp(prefix="webcan-log-", suffix=".log")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            async for chunk in request.stream():
+                await io_executor.run(f.write, chunk)
+        result = await io_executor.run(check_log, path, mapping, format, bins, dimension, signed)
+    except RuntimeError as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except (FormulaError, ArithmeticError) as e:
+        signal = mapping.get("parameter_name")
+        if not signal and mapping.get("parameter_id") is not None:
+            signal = await db_executor.run(get_parameter_name, mapping["parameter_id"])
+        signal = signal or f"#{mapping.get('parameter_id')}"
+        raise HTTPException(
+            status_code=400,
+            detail=f"Формула сигнала {signal} (CAN ID {mapping.get('can_id')}) не вычисляется на кадрах лога: {e}",
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        os.unlink(path)
+    result["submission_id"] = submission_id
+    return JSONResponse(result)
+
+
+@app.get("/api/admin/overlaps")
+async def api_overlaps(generation_id: Optional[int] = None) -> StreamingResponse:
+    """NDJSON audit: every pair of mappings (canData and pending submissions) claiming the same bits."""
+    require_db()
+    return ndjson_response(iter_overlaps(generation_id))
+
+
+@app.get("/api/admin/query-plans")
+async def api_admin_query_plans() -> JSONResponse:
+    require_db()
+    plans = await db_executor.run(query_plans)
+    return JSONResponse({"indexes": index_report, "coverage": coverage_report, "snapshot": snapshot.report, "plans": plans})
+
+
+@app.get("/api/metrics")
+async def api_metrics() -> Response:
+    export_queue_depth.set(export_writer.pending())
+    write_queue_depth.set(writer.pending())
+    return Response(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.get("/api/health")
-def api_health() -> JSONResponse:
+async def api_health() -> JSONResponse:
     return JSONResponse({
         "db_path": DB_PATH,
         "db_exists": db.available(),
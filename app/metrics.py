@@ -0,0 +1,259 @@
+"""Process metrics in Prometheus text format (served at /api/metrics).
+
+Small in-house counters/gauges/histograms, so no client library is needed.
+`MetricsMiddleware` records per-route latency, in-flight requests and
+response sizes; `DB` reports every statement through `observe_query()`
+under a normalized label, and statements slower than
+`WEB_CAN_SLOW_QUERY_MS` are logged.
+"""
+import hashlib
+import logging
+import re
+import threading
+import time
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from .config import SLOW_QUERY_MS
+
+
+log = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _fmt(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_labels(self.labelnames, k)} {_fmt(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *labels: str) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+    def dec(self, amount: float = 1, *labels: str) -> None:
+        self.inc(-amount, *labels)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [bucket counts..., +Inf count, sum]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+                    break
+            else:
+                state[len(self.buckets)] += 1
+            state[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((k, list(v)) for k, v in self._values.items())
+        lines = self.header()
+        for labels, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), state[:-1]):
+                cumulative += count
+                le = 'le="%s"' % _fmt(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, labels, le)} {int(cumulative)}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, labels)} {_fmt(state[-1])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, labels)} {int(cumulative)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> Any:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+http_requests = registry.register(Counter(
+    "webcan_http_requests_total", "HTTP requests by route and status.", ("method", "route", "status")))
+http_latency = registry.register(Histogram(
+    "webcan_http_request_duration_seconds", "Time until the last response byte was sent.", ("method", "route")))
+http_in_flight = registry.register(Gauge(
+    "webcan_http_requests_in_flight", "Requests currently being served."))
+http_response_size = registry.register(Histogram(
+    "webcan_http_response_size_bytes", "Response body size as sent (after compression).", ("method", "route"), SIZE_BUCKETS))
+db_query_latency = registry.register(Histogram(
+    "webcan_db_query_duration_seconds", "SQL statement time by normalized statement.", ("statement",), QUERY_BUCKETS))
+db_rows = registry.register(Counter(
+    "webcan_db_rows_returned_total", "Rows returned by SELECT statements.", ("statement",)))
+db_slow_queries = registry.register(Counter(
+    "webcan_db_slow_queries_total", "Statements slower than WEB_CAN_SLOW_QUERY_MS.", ("statement",)))
+write_batch_size = registry.register(Histogram(
+    "webcan_write_batch_jobs", "Write jobs committed together by the group-commit writer.", (), (1, 2, 4, 8, 16, 32, 64, 128, 256)))
+write_commit_latency = registry.register(Histogram(
+    "webcan_write_commit_duration_seconds", "Time to run and commit one group of write jobs.", (), QUERY_BUCKETS))
+write_queue_depth = registry.register(Gauge(
+    "webcan_write_queue_depth", "Write jobs waiting for the writer thread."))
+snapshot_build_latency = registry.register(Histogram(
+    "webcan_catalog_snapshot_build_seconds", "Time to copy the reference catalog into a new in-memory snapshot."))
+executor_queue_wait = registry.register(Histogram(
+    "webcan_executor_queue_seconds", "Time a task waited for a free executor thread.", ("executor",), QUERY_BUCKETS))
+executor_run_time = registry.register(Histogram(
+    "webcan_executor_run_seconds", "Time a task ran on an executor thread.", ("executor",), QUERY_BUCKETS))
+executor_queued = registry.register(Gauge(
+    "webcan_executor_queued", "Tasks waiting for an executor thread.", ("executor",)))
+executor_active = registry.register(Gauge(
+    "webcan_executor_active", "Tasks running on executor threads.", ("executor",)))
+export_write_latency = registry.register(Histogram(
+    "webcan_export_write_duration_seconds", "Time to number and write one export (JSON + SQL)."))
+export_failures = registry.register(Counter(
+    "webcan_export_failures_total", "Exports that could not be written."))
+export_queue_depth = registry.register(Gauge(
+    "webcan_export_queue_depth", "Export jobs waiting for the writer thread."))
+
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|X'[0-9A-Fa-f]*'")
+_PLACEHOLDER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_TABLE = re.compile(r"\b(?:FROM|INTO|UPDATE|JOIN|TABLE|ON)\s+([A-Za-z_][\w]*)", re.IGNORECASE)
+
+
+@lru_cache(maxsize=1024)
+def statement_label(sql: str) -> Tuple[str, str]:
+    """(label, normalized SQL): `SELECT canParameters #1a2b3c` style, stable per statement shape.
+
+    Literals and `IN (?, ?, ...)` lists are folded so a statement keeps one
+    label whatever its arguments; the hash tells apart statements on the
+    same table.
+    """
+    normalized = " ".join(sql.split())
+    normalized = _PLACEHOLDER_LISTS.sub("?...", _LITERALS.sub("?", normalized))
+    verb = normalized.split(" ", 1)[0].upper() if normalized else "?"
+    if verb == "WITH":
+        verb = "SELECT"
+    m = _TABLE.search(normalized)
+    table = m.group(1) if m else ""
+    digest = hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:6]
+    return " ".join(p for p in (verb, table, "#" + digest) if p), normalized
+
+
+def observe_query(sql: str, seconds: float, rows: Optional[int] = None) -> None:
+    label, normalized = statement_label(sql)
+    db_query_latency.observe(seconds, label)
+    if rows is not None:
+        db_rows.inc(rows, label)
+    if seconds * 1000 >= SLOW_QUERY_MS:
+        db_slow_queries.inc(1, label)
+        log.warning("Slow query %.1f ms [%s]: %s", seconds * 1000, label, normalized[:1000])
+
+
+class MetricsMiddleware:
+    """Per-route request count, latency, in-flight gauge and response size."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+        self._routes: Dict[Any, str] = {}
+
+    def _route_label(self, scope: Scope) -> str:
+        # Label by route template, never the raw path, to keep cardinality bounded
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        label = self._routes.get(endpoint)
+        if label is None:
+            app = scope.get("app")
+            for route in getattr(app, "routes", ()):
+                target = getattr(route, "endpoint", None) or getattr(route, "app", None)
+                self._routes[target] = getattr(route, "path", "") or "/"
+            label = self._routes.get(endpoint, "unmatched")
+        return label
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        http_in_flight.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_in_flight.dec()
+            route = self._route_label(scope)
+            method = scope.get("method", "")
+            http_requests.inc(1, method, route, str(status))
+            http_latency.observe(time.perf_counter() - start, method, route)
+            http_response_size.observe(size, method, route)
@@ -0,0 +1,365 @@
+"""Bit-range overlap detection between mappings of the same CAN ID.
+
+A mapping claims bits of a frame: canData rows through their payload mask,
+pending submissions (status `new`) through `bit_indices` or the
+`offset_bits`/`length_bits` window. Two mappings of the same generation,
+CAN ID and 11/29-bit flag that claim a common bit conflict.
+
+Per generation, every mapping's bits are split into contiguous runs and
+kept per (CAN ID, 29-bit) sorted by start. Runs that overlap [s, e) start
+before e and after s - max_len (max_len: longest run under that key), so
+a lookup is two bisections plus the matches: O(log n + k).
+
+Generation indexes are built on first use and kept in an LRU. Before use
+an index is checked against the generation's `canDataVersions` counter
+(see app/bundle.py; without that table, the count, newest rowid and
+deprecated count of its canData rows); only a canData change rebuilds it.
+Submissions only ever add runs: the ones saved through this process are
+added by `added()` right after their insert, others (another process) are
+read by id past the newest one seen. Each costs O(log n) per run. The audit
+(`iter_overlaps`) streams canData and submissions ordered by generation
+and sweeps each generation once.
+"""
+import bisect
+import json
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from .bundle import VERSION_TABLE, bundle_report, can_id_value, mask_bits, mask_bytes
+from .config import OVERLAP_CACHE_SIZE, TABLES
+from .db import db
+from .decoder import window_bits
+
+PENDING_STATUS = "new"
+
+
+class Mapping(NamedTuple):
+    source: str  # "canData" (id = rowid) or "submission"
+    id: Optional[int]
+    parameter_id: Optional[int]
+    parameter_name: Optional[str]
+
+    def describe(self) -> Dict[str, Any]:
+        return self._asdict()
+
+
+class Run(NamedTuple):
+    start: int
+    end: int  # exclusive
+    mapping: Mapping
+
+
+Key = Tuple[int, bool]  # (CAN ID, 29-bit)
+
+
+def bit_runs(bits: Iterable[int]) -> List[Tuple[int, int]]:
+    """Contiguous [start, end) runs of a set of bit numbers."""
+    runs: List[Tuple[int, int]] = []
+    for b in sorted(set(bits)):
+        if runs and runs[-1][1] == b:
+            runs[-1] = (runs[-1][0], b + 1)
+        else:
+            runs.append((b, b + 1))
+    return runs
+
+
+def _indices(value: Any) -> List[int]:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.strip() else None
+        except ValueError:
+            value = None
+    return [int(b) for b in value] if value else []
+
+
+def submission_bits(row: Dict[str, Any]) -> Tuple[int, ...]:
+    """Bits claimed by a submission row (DB row or parsed item)."""
+    try:
+        return window_bits(_indices(row.get("bit_indices")), row.get("offset_bits"), row.get("length_bits"))
+    except (TypeError, ValueError):
+        return ()
+
+
+def submission_key(row: Dict[str, Any]) -> Optional[Key]:
+    """(CAN ID, 29-bit) of a submission; CAN IDs are hex, as in canData (`can_id_value`)."""
+    try:
+        can_id = int(str(row.get("can_id") or "").strip(), 16)
+    except ValueError:
+        return None
+    return can_id, str(row.get("is29bit")).lower() in ("1", "true", "yes", "on")
+
+
+class IntervalIndex:
+    """Bit runs of one (generation, CAN ID, 29-bit), sorted by start."""
+
+    __slots__ = ("_starts", "_runs", "_max_len")
+
+    def __init__(self, runs: Iterable[Run] = ()):
+        self._runs: List[Run] = sorted(runs, key=lambda r: r.start)
+        self._starts = [r.start for r in self._runs]
+        self._max_len = max((r.end - r.start for r in self._runs), default=0)
+
+    def add(self, run: Run) -> None:
+        i = bisect.bisect_right(self._starts, run.start)
+        self._starts.insert(i, run.start)
+        self._runs.insert(i, run)
+        self._max_len = max(self._max_len, run.end - run.start)
+
+    def overlapping(self, start: int, end: int) -> List[Run]:
+        lo = bisect.bisect_right(self._starts, start - self._max_len)
+        hi = bisect.bisect_left(self._starts, end)
+        return [r for r in self._runs[lo:hi] if r.end > start]
+
+
+class _Generation:
+    __slots__ = ("fingerprint", "newest", "added", "keys")
+
+    def __init__(self, fingerprint: Tuple[Any, ...], newest: Optional[int], keys: Dict[Key, IntervalIndex]):
+        self.fingerprint = fingerprint  # canData state the index was built from
+        self.newest = newest  # newest submission id read from the database
+        self.added: Set[int] = set()  # submission ids past `newest` added by `added()`
+        self.keys = keys
+
+
+def _can_data_sql(where: str) -> str:
+    cd = TABLES["can_data"]
+    pt = TABLES["parameters"]
+    return (
+        f"SELECT c.rowid AS id, c.{cd['generation_id']} AS generation_id, c.pid AS pid, c.pidMask AS mask, "
+        f"c.is29Bit AS is29bit, c.{cd['parameter_id']} AS parameter_id, p.{pt['name']} AS parameter_name "
+        f"FROM {cd['table']} c LEFT JOIN {pt['table']} p ON p.{pt['id']} = c.{cd['parameter_id']} "
+        f"WHERE COALESCE(c.deprecated, 0) = 0 AND {where} "
+        f"ORDER BY c.{cd['generation_id']}"
+    )
+
+
+def _submissions_sql(where: str) -> str:
+    st = TABLES["submissions"]["table"]
+    pt = TABLES["parameters"]
+    return (
+        f"SELECT s.id, s.vehicle_id AS generation_id, s.can_id, s.is29bit, s.bit_indices, s.offset_bits, "
+        f"s.length_bits, s.parameter_id, COALESCE(s.parameter_name, p.{pt['name']}) AS parameter_name "
+        f"FROM {st} s LEFT JOIN {pt['table']} p ON p.{pt['id']} = s.parameter_id "
+        f"WHERE s.status = '{PENDING_STATUS}' AND {where} "
+        f"ORDER BY s.vehicle_id"
+    )
+
+
+def _can_data_runs(row: sqlite3.Row) -> Tuple[Key, Mapping, List[Tuple[int, int]]]:
+    key = (can_id_value(row["pid"]), bool(row["is29bit"]))
+    mapping = Mapping("canData", row["id"], row["parameter_id"], row["parameter_name"])
+    return key, mapping, bit_runs(mask_bits(mask_bytes(row["mask"])))
+
+
+def _submission_runs(row: Any) -> Tuple[Optional[Key], Mapping, List[Tuple[int, int]]]:
+    row = dict(row)
+    mapping = Mapping("submission", row.get("id"), row.get("parameter_id"), row.get("parameter_name"))
+    return submission_key(row), mapping, bit_runs(submission_bits(row))
+
+
+def _index(entries: Iterable[Tuple[Optional[Key], Mapping, List[Tuple[int, int]]]]) -> Dict[Key, IntervalIndex]:
+    grouped: Dict[Key, List[Run]] = {}
+    for key, mapping, runs in entries:
+        if key is None:
+            continue
+        grouped.setdefault(key, []).extend(Run(s, e, mapping) for s, e in runs)
+    return {key: IntervalIndex(runs) for key, runs in grouped.items()}
+
+
+def _conflict(run: Run, other: Run) -> Dict[str, Any]:
+    return {"bits": [max(run.start, other.start), min(run.end, other.end) - 1], "with": other.mapping.describe()}
+
+
+def _newer(a: Optional[int], b: Optional[int]) -> Optional[int]:
+    return b if a is None else a if b is None else max(a, b)
+
+
+class OverlapDetector:
+    """Per-generation interval indexes with an LRU bound on the number of generations kept."""
+
+    def __init__(self, max_generations: int = OVERLAP_CACHE_SIZE):
+        self._max = max_generations
+        self._lock = threading.Lock()
+        self._generations: "OrderedDict[int, _Generation]" = OrderedDict()
+
+    def _fingerprint(self, generation_id: int) -> Tuple[Any, ...]:
+        if bundle_report["versioned"]:
+            rows = db.query(f"SELECT version FROM {VERSION_TABLE} WHERE generationId = ?", (generation_id,))
+            return ("version", rows[0][0] if rows else 0)
+        # No version triggers: catches added, deleted and (un)deprecated rows, not edited masks
+        cd = TABLES["can_data"]
+        row = db.query(
+            f"SELECT COUNT(*), MAX(rowid), TOTAL(COALESCE(deprecated, 0) != 0) FROM {cd['table']} "
+            f"WHERE {cd['generation_id']} = ?",
+            (generation_id,),
+        )[0]
+        return ("rows",) + tuple(row)
+
+    def _newest(self, generation_id: int) -> Optional[int]:
+        st = TABLES["submissions"]["table"]
+        return db.query(f"SELECT MAX(id) FROM {st} WHERE vehicle_id = ?", (generation_id,))[0][0]
+
+    def _build(self, generation_id: int) -> Tuple[Dict[Key, IntervalIndex], Optional[int]]:
+        """Index of a generation and the newest submission id it includes."""
+        cd = TABLES["can_data"]
+        submissions = db.query(_submissions_sql("s.vehicle_id = ?"), (generation_id,))
+        entries: List[Tuple[Optional[Key], Mapping, List[Tuple[int, int]]]] = []
+        entries += [_can_data_runs(r) for r in db.query(_can_data_sql(f"c.{cd['generation_id']} = ?"), (generation_id,))]
+        entries += [_submission_runs(r) for r in submissions]
+        return _index(entries), max((r["id"] for r in submissions), default=None)
+
+    @staticmethod
+    def _add(cached: _Generation, key: Optional[Key], mapping: Mapping, runs: List[Tuple[int, int]]) -> None:
+        if key is None:
+            return
+        index = cached.keys.get(key)
+        if index is None:
+            index = cached.keys[key] = IntervalIndex()
+        for start, end in runs:
+            index.add(Run(start, end, mapping))
+
+    def _store(self, generation_id: int, cached: _Generation) -> None:
+        self._generations[generation_id] = cached
+        self._generations.move_to_end(generation_id)
+        while len(self._generations) > self._max:
+            self._generations.popitem(last=False)
+
+    def _current(self, generation_id: int) -> _Generation:
+        fingerprint = self._fingerprint(generation_id)
+        newest = self._newest(generation_id)
+        with self._lock:
+            cached = self._generations.get(generation_id)
+            if cached is not None and cached.fingerprint == fingerprint:
+                self._generations.move_to_end(generation_id)
+                seen = cached.newest
+                if newest is None or (seen is not None and newest <= seen):
+                    return cached
+            else:
+                cached = None
+        if cached is None:
+            keys, built = self._build(generation_id)
+            with self._lock:
+                # A submission saved after the MAX(id) lookup may already be in `keys`
+                cached = _Generation(fingerprint, _newer(newest, built), keys)
+                self._store(generation_id, cached)
+            return cached
+        # Submissions saved elsewhere since: read just those
+        fresh = db.query(_submissions_sql("s.vehicle_id = ? AND s.id > ?"), (generation_id, seen or 0))
+        with self._lock:
+            for row in fresh:
+                if row["id"] > (cached.newest or 0) and row["id"] not in cached.added:
+                    self._add(cached, *_submission_runs(row))
+            cached.newest = _newer(cached.newest, _newer(newest, max((r["id"] for r in fresh), default=None)))
+            cached.added = {i for i in cached.added if i > cached.newest}
+        return cached
+
+    def index(self, generation_id: int) -> Dict[Key, IntervalIndex]:
+        return self._current(generation_id).keys
+
+    def added(self, generation_id: int, rows: Sequence[Dict[str, Any]], ids: Sequence[Optional[int]]) -> None:
+        """Add just-saved submissions (`ids` as returned by the insert) to a cached index."""
+        with self._lock:
+            cached = self._generations.get(generation_id)
+            if cached is None:
+                return
+            for row, sid in zip(rows, ids):
+                if sid is None or sid <= (cached.newest or 0) or sid in cached.added:
+                    continue
+                cached.added.add(sid)
+                key, mapping, runs = _submission_runs(row)
+                self._add(cached, key, mapping._replace(id=sid), runs)
+
+    def check(
+        self, generation_id: int, rows: Sequence[Dict[str, Any]], labels: Optional[Sequence[Any]] = None
+    ) -> List[Dict[str, Any]]:
+        """Conflicts of new submission items with the generation's mappings and with each other.
+
+        Items are named by their position in `rows`, or by `labels` when given.
+        """
+        cached = self._current(generation_id)
+        batch: Dict[Key, IntervalIndex] = {}
+        conflicts: List[Dict[str, Any]] = []
+        with self._lock:  # `added()` may be growing the same indexes
+            for i, row in enumerate(rows):
+                key = submission_key(row)
+                if key is None:
+                    continue
+                label = labels[i] if labels is not None else i
+                runs = bit_runs(submission_bits(row))
+                mine = Mapping("item", label, row.get("parameter_id"), row.get("parameter_name"))
+                for start, end in runs:
+                    run = Run(start, end, mine)
+                    for index in (cached.keys.get(key), batch.get(key)):
+                        for other in index.overlapping(start, end) if index is not None else ():
+                            conflicts.append({"item": label, "can_id": row.get("can_id"), **_conflict(run, other)})
+                for start, end in runs:
+                    batch.setdefault(key, IntervalIndex()).add(Run(start, end, mine))
+        return conflicts
+
+    def clear(self) -> None:
+        with self._lock:
+            self._generations.clear()
+
+
+overlap_detector = OverlapDetector()
+
+
+def _sweep(runs: List[Run]) -> Iterator[Tuple[Run, Run]]:
+    # Sorted by start; `active` holds the runs that may still reach the next start
+    active: List[Run] = []
+    for run in sorted(runs, key=lambda r: (r.start, r.end)):
+        active = [a for a in active if a.end > run.start]
+        for other in active:
+            if other.mapping != run.mapping:
+                yield other, run
+        active.append(run)
+
+
+def _generation_overlaps(generation_id: int, entries: List[Tuple[Optional[Key], Mapping, List[Tuple[int, int]]]]) -> Iterator[Dict[str, Any]]:
+    grouped: Dict[Key, List[Run]] = {}
+    for key, mapping, runs in entries:
+        if key is not None:
+            grouped.setdefault(key, []).extend(Run(s, e, mapping) for s, e in runs)
+    for (can_id, is29), runs in sorted(grouped.items()):
+        for a, b in _sweep(runs):
+            yield {
+                "generation_id": generation_id,
+                "can_id": f"{can_id:X}",
+                "is29bit": is29,
+                "bits": [max(a.start, b.start), min(a.end, b.end) - 1],
+                "a": a.mapping.describe(),
+                "b": b.mapping.describe(),
+                "same_parameter": a.mapping.parameter_id is not None and a.mapping.parameter_id == b.mapping.parameter_id,
+            }
+
+
+def iter_overlaps(generation_id: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """Every conflicting pair in the database, generation by generation, in one pass over each table."""
+    cd = TABLES["can_data"]
+    if generation_id is None:
+        can_data = db.iter_query(_can_data_sql(f"c.{cd['generation_id']} IS NOT NULL"))
+        submissions = db.iter_query(_submissions_sql("s.vehicle_id IS NOT NULL"))
+    else:
+        can_data = db.iter_query(_can_data_sql(f"c.{cd['generation_id']} = ?"), (generation_id,))
+        submissions = db.iter_query(_submissions_sql("s.vehicle_id = ?"), (generation_id,))
+    try:
+        # Both streams are ordered by generation: merge them one generation at a time
+        left = next(can_data, None)
+        right = next(submissions, None)
+        while left is not None or right is not None:
+            current = min(r["generation_id"] for r in (left, right) if r is not None)
+            entries: List[Tuple[Optional[Key], Mapping, List[Tuple[int, int]]]] = []
+            while left is not None and left["generation_id"] == current:
+                entries.append(_can_data_runs(left))
+                left = next(can_data, None)
+            while right is not None and right["generation_id"] == current:
+                entries.append(_submission_runs(right))
+                right = next(submissions, None)
+            yield from _generation_overlaps(current, entries)
+    finally:
+        for rows in (can_data, submissions):
+            close = getattr(rows, "close", None)
+            if close is not None:
+                close()
@@ -0,0 +1,119 @@
+import bisect
+import re
+import threading
+from typing import Dict, Iterable, List, Set, Tuple
+
+
+_SPACES = re.compile(r"\s+")
+
+
+def fold(text: str) -> str:
+    """Normalize text for case-insensitive matching (Cyrillic included, ё == е)."""
+    return _SPACES.sub(" ", text.casefold().replace("ё", "е")).strip()
+
+
+def trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class ParameterIndex:
+    """In-memory autocomplete index over parameter names.
+
+    Results are ranked: exact match, name prefix, word prefix, then any
+    substring. Prefixes are found by bisecting sorted name/word lists;
+    substrings of 3+ characters by intersecting trigram posting sets, so no
+    query touches every name.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.RLock()
+        self._names: Dict[int, str] = {}
+        self._folded: Dict[int, str] = {}
+        self._sorted: List[Tuple[str, int]] = []  # (folded name, id)
+        self._words: List[Tuple[str, int]] = []  # (folded word, id), words after the first
+        self._postings: Dict[str, Set[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def rebuild(self, rows: Iterable[Tuple[int, str]]) -> None:
+        names: Dict[int, str] = {}
+        folded: Dict[int, str] = {}
+        words: List[Tuple[str, int]] = []
+        postings: Dict[str, Set[int]] = {}
+        for pid, name in rows:
+            f = fold(name)
+            if not f:
+                continue
+            names[pid] = name
+            folded[pid] = f
+            words.extend((w, pid) for w in f.split(" ")[1:])
+            for tg in trigrams(f):
+                postings.setdefault(tg, set()).add(pid)
+        ordered = sorted((f, pid) for pid, f in folded.items())
+        words.sort()
+        with self._lock:
+            self._names, self._folded = names, folded
+            self._sorted, self._words, self._postings = ordered, words, postings
+
+    def add(self, pid: int, name: str) -> None:
+        f = fold(name)
+        if not f:
+            return
+        with self._lock:
+            if pid in self._names:
+                return
+            self._names[pid] = name
+            self._folded[pid] = f
+            bisect.insort(self._sorted, (f, pid))
+            for w in f.split(" ")[1:]:
+                bisect.insort(self._words, (w, pid))
+            for tg in trigrams(f):
+                self._postings.setdefault(tg, set()).add(pid)
+
+    @staticmethod
+    def _prefix_range(items: List[Tuple[str, int]], prefix: str) -> Iterable[Tuple[str, int]]:
+        i = bisect.bisect_left(items, (prefix,))
+        while i < len(items) and items[i][0].startswith(prefix):
+            yield items[i]
+            i += 1
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, object]]:
+        q = fold(query)
+        if limit <= 0:
+            return []
+        with self._lock:
+            if not q:
+                return [{"id": pid, "name": self._names[pid]} for _, pid in self._sorted[:limit]]
+
+            found: List[int] = []
+            seen: Set[int] = set()
+
+            def take(ids: Iterable[int]) -> bool:
+                for pid in ids:
+                    if pid not in seen:
+                        seen.add(pid)
+                        found.append(pid)
+                        if len(found) >= limit:
+                            return True
+                return False
+
+            # Exact and name-prefix matches come out of the sorted list already in order
+            if take(pid for _, pid in self._prefix_range(self._sorted, q)):
+                return self._result(found)
+
+            word_hits = sorted({pid for _, pid in self._prefix_range(self._words, q)} - seen,
+                               key=lambda pid: self._folded[pid])
+            if take(word_hits):
+                return self._result(found)
+
+            if len(q) >= 3:
+                sets = sorted((self._postings.get(tg, set()) for tg in trigrams(q)), key=len)
+                candidates = set(sets[0]).intersection(*sets[1:]) if sets else set()
+                hits = sorted((pid for pid in candidates - seen if q in self._folded[pid]),
+                              key=lambda pid: self._folded[pid])
+                take(hits)
+            return self._result(found)
+
+    def _result(self, ids: List[int]) -> List[Dict[str, object]]:
+        return [{"id": pid, "name": self._names[pid]} for pid in ids]
@@ -0,0 +1,356 @@
+"""Read-only in-memory copy of the reference catalog (opt-in, `WEB_CAN_CATALOG_SNAPSHOT=1`).
+
+The reference tables (makes, models, generations, parameters, bus types,
+CAN buses, dimensions) and the coverage summary are copied into one
+shared-cache `:memory:` database, schema and indexes included. Reader
+connections attach it, so catalog queries (joins included) run unchanged
+but never touch the file or wait on the writer.
+
+A copy is never modified: after a change a new database is built next to
+the old one and swapped in with a single reference assignment. Readers
+re-attach before their next query; the old copy's memory is released when
+the last reader moves on.
+
+`catalogVersions` (kept by triggers on the copied tables) says which tables
+changed, so ordinary submission writes cost nothing and a new parameter only
+reads `canParameters` from the file; the other tables come from the
+previous copy, memory to memory. A background thread polls it every
+`WEB_CAN_CATALOG_SNAPSHOT_POLL_MS`; writers that add parameters wake it
+at once with `request_refresh()`. Without write access to install the
+triggers, any commit to the file re-copies everything.
+
+SQLite's backup API copies whole databases only (canData and submissions
+included), so tables are copied with `INSERT ... SELECT` through at most
+two attachments (the file and the previous copy), well under
+SQLITE_MAX_ATTACHED whatever the number of tables.
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from email.utils import formatdate
+from typing import Any, Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+from urllib.parse import quote
+
+from .metrics import observe_query, snapshot_build_latency
+
+
+log = logging.getLogger(__name__)
+
+VERSION_TABLE = "catalogVersions"
+
+
+class _Snapshot(NamedTuple):
+    uri: str
+    keeper: sqlite3.Connection  # keeps the shared in-memory database alive
+    # Copied tables -> catalogVersions entry they were copied at (None: not tracked)
+    versions: Dict[str, Optional[int]]
+    generation: int
+
+
+def version_trigger_sql(tables: Iterable[str]) -> Dict[str, str]:
+    """Triggers bumping `catalogVersions` on every write to the given tables."""
+    triggers: Dict[str, str] = {}
+    for table in tables:
+        bump = (
+            f"INSERT INTO {VERSION_TABLE} (tableName, version) VALUES ('{table}', 1) "
+            f"ON CONFLICT (tableName) DO UPDATE SET version = version + 1;"
+        )
+        for op in ("INSERT", "UPDATE", "DELETE"):
+            name = f"trg_webcan_version_{table}_{op.lower()}"
+            triggers[name] = f"CREATE TRIGGER {name} AFTER {op} ON {table} BEGIN {bump} END"
+    return triggers
+
+
+class CatalogSnapshot:
+    """Swappable, immutable in-memory copies of a set of tables of the database file."""
+
+    def __init__(self, path: Callable[[], str], tables: Callable[[], Sequence[str]], poll_ms: float):
+        self._path = path
+        self._tables = tables
+        self._poll = poll_ms / 1000.0
+        self._current: Optional[_Snapshot] = None
+        self._serial = 0
+        self._build_lock = threading.Lock()
+        # Refresh requests: one check covers every request made before it started
+        self._ticket_lock = threading.Lock()
+        self._requested = 0
+        self._covered = 0
+        self._local = threading.local()
+        self._readers_lock = threading.Lock()
+        self._readers: List[sqlite3.Connection] = []
+        self._probe: Optional[sqlite3.Connection] = None
+        self._probe_ino: Optional[int] = None
+        self._probe_version: Optional[Tuple[int, int]] = None
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.report: Dict[str, Any] = {"enabled": False, "generation": 0, "tables": [], "built_at": None, "build_ms": None}
+
+    def active(self) -> bool:
+        return self._current is not None
+
+    def version(self) -> Optional[Tuple[int, int]]:
+        """CatalogCache version token: moves exactly when new copies are swapped in."""
+        current = self._current
+        # Inode 0 never names a real file, so this never equals a disk token
+        return (0, current.generation) if current is not None else None
+
+    # -- building -------------------------------------------------------------
+
+    def _disk_uri(self) -> str:
+        return "file:" + quote(os.path.abspath(self._path())) + "?mode=ro"
+
+    def _file_version(self) -> Optional[Tuple[int, int]]:
+        # Caller holds _build_lock. The probe never writes, so its data_version
+        # moves exactly when somebody commits to the file.
+        try:
+            ino = os.stat(self._path()).st_ino
+        except OSError:
+            return None
+        if self._probe is None or self._probe_ino != ino:
+            if self._probe is not None:
+                self._probe.close()
+            self._probe = sqlite3.connect(self._disk_uri(), uri=True, check_same_thread=False)
+            self._probe_ino = ino
+        return ino, self._probe.execute("PRAGMA data_version").fetchone()[0]
+
+    @staticmethod
+    def _versions(con: sqlite3.Connection, schema: str) -> Optional[Dict[str, int]]:
+        """Per-table change counters, or None when the database has no catalogVersions."""
+        exists = con.execute(
+            f"SELECT 1 FROM {schema}.sqlite_master WHERE type = 'table' AND name = ?", (VERSION_TABLE,)
+        ).fetchall()
+        if not exists:
+            return None
+        return {name: version for name, version in con.execute(f"SELECT tableName, version FROM {schema}.{VERSION_TABLE}")}
+
+    @staticmethod
+    def _schema(con: sqlite3.Connection, names: Sequence[str]) -> List[Tuple[str, str, str, str]]:
+        if not names:
+            return []
+        return con.execute(
+            f"SELECT type, name, tbl_name, sql FROM sqlite_master "
+            f"WHERE tbl_name IN ({', '.join('?' * len(names))}) AND type IN ('table', 'index') AND sql IS NOT NULL",
+            list(names),
+        ).fetchall()
+
+    def _copy(self, wanted: Sequence[str], changed: Sequence[str], current: Optional[_Snapshot]) -> Tuple[str, sqlite3.Connection, Dict[str, Optional[int]]]:
+        """Build a new in-memory database of the wanted tables, `changed` ones read from the file."""
+        previous = [n for n in wanted if n not in changed and current is not None and n in current.versions]
+        fresh = [n for n in wanted if n not in previous]
+        schema = self._schema(self._probe, fresh) + (self._schema(current.keeper, previous) if previous else [])
+        self._serial += 1
+        uri = f"file:webcan-catalog-{os.getpid()}-{self._serial}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            tables = [name for kind, name, _, sql in schema if kind == "table"]
+            for kind, _, _, sql in schema:
+                if kind == "table":
+                    keeper.execute(sql)
+            keeper.execute("ATTACH DATABASE ? AS disk", (self._disk_uri(),))
+            if previous:
+                keeper.execute("ATTACH DATABASE ? AS previous", (current.uri,))
+            # One read transaction: every table and its counter describe the same moment
+            keeper.execute("BEGIN")
+            for name in tables:
+                source = "previous" if name in previous else "disk"
+                keeper.execute(f'INSERT INTO main."{name}" SELECT * FROM {source}."{name}"')
+            versions = self._versions(keeper, "disk")
+            keeper.commit()
+            keeper.execute("DETACH DATABASE disk")
+            if previous:
+                keeper.execute("DETACH DATABASE previous")
+            for kind, _, table, sql in schema:
+                if kind == "index" and table in tables:
+                    keeper.execute(sql)
+            keeper.execute("ANALYZE")
+        except BaseException:
+            keeper.close()
+            raise
+        return uri, keeper, {name: versions.get(name, 0) if versions is not None else None for name in tables}
+
+    def refresh(self, force: bool = False) -> bool:
+        """Swap in fresh copies of the tables that changed on disk; True when anything was swapped.
+
+        Callers that queue up behind a running refresh share the next one,
+        so a burst of writers costs one copy rather than one each.
+        """
+        if not self.report["enabled"]:
+            return False
+        with self._ticket_lock:
+            self._requested += 1
+            ticket = self._requested
+        with self._build_lock:
+            if not force and ticket <= self._covered:
+                return False
+            with self._ticket_lock:
+                horizon = self._requested
+            file_version = self._file_version()
+            if file_version is None:
+                return False
+            self._covered = horizon
+            current = self._current
+            if not force and current is not None and file_version == self._probe_version:
+                return False
+            wanted = list(self._tables())
+            if force or current is None:
+                changed = wanted
+            else:
+                versions = self._versions(self._probe, "main")
+                # A table absent from the file counts as version 0 until it gets rows
+                changed = [
+                    name for name in wanted
+                    if versions is None or current.versions.get(name, 0) != versions.get(name, 0)
+                ]
+            if not changed:
+                self._probe_version = file_version
+                return False
+            start = time.perf_counter()
+            uri, keeper, tables = self._copy(wanted, changed, current)
+            elapsed = time.perf_counter() - start
+            generation = (current.generation if current else 0) + 1
+            self._current = _Snapshot(uri, keeper, tables, generation)
+            self._probe_version = file_version
+            if current is not None:
+                current.keeper.close()
+        snapshot_build_latency.observe(elapsed)
+        self.report.update(
+            generation=generation, tables=sorted(tables),
+            built_at=formatdate(time.time(), usegmt=True), build_ms=round(elapsed * 1000, 1),
+        )
+        return True
+
+    # -- lifecycle -------------------------------------------------------------
+
+    def start(self) -> None:
+        """Copy the tables and start watching the file for catalog changes."""
+        self._stop.clear()
+        self.report["enabled"] = True
+        self.refresh(force=True)
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._watch, name="catalog-snapshot", daemon=True)
+            self._thread.start()
+
+    def request_refresh(self) -> None:
+        """Have the watcher check for changes now instead of at its next poll."""
+        self._wake.set()
+
+    def _watch(self) -> None:
+        while True:
+            self._wake.wait(self._poll)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.refresh()
+            except sqlite3.Error:
+                log.exception("Could not refresh the catalog snapshot")
+
+    def close(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        thread, self._thread = self._thread, None
+        if thread is not None:
+            thread.join()
+        with self._build_lock:
+            current, self._current = self._current, None
+            if current is not None:
+                current.keeper.close()
+            if self._probe is not None:
+                self._probe.close()
+                self._probe = None
+            self._probe_ino = self._probe_version = None
+        with self._readers_lock:
+            readers, self._readers = self._readers, []
+        for con in readers:
+            try:
+                con.close()
+            except sqlite3.Error:
+                pass
+        self._local = threading.local()
+        self.report["enabled"] = False
+
+    # -- reading ---------------------------------------------------------------
+
+    @staticmethod
+    def _open() -> sqlite3.Connection:
+        con = sqlite3.connect("file::memory:", uri=True, check_same_thread=False)
+        con.row_factory = sqlite3.Row
+        # Nothing ever writes to the copies: skip shared-cache table locks
+        con.execute("PRAGMA read_uncommitted=1")
+        con.execute("PRAGMA query_only=1")
+        return con
+
+    @staticmethod
+    def _attach(con: sqlite3.Connection, attached: bool, snapshot: _Snapshot) -> None:
+        """Point `con` at the snapshot's database, replacing the one attached before."""
+        if attached:
+            con.execute("DETACH DATABASE catalog")
+        con.execute("ATTACH DATABASE ? AS catalog", (snapshot.uri,))
+
+    def _connection(self, snapshot: _Snapshot) -> sqlite3.Connection:
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = self._local.con = self._open()
+            self._local.generation = None
+            with self._readers_lock:
+                self._readers.append(con)
+        if self._local.generation != snapshot.generation:
+            self._attach(con, self._local.generation is not None, snapshot)
+            self._local.generation = snapshot.generation
+        return con
+
+    @staticmethod
+    def _missing_table(error: sqlite3.OperationalError) -> bool:
+        return str(error).startswith("no such table")
+
+    def query(self, sql: str, params: Iterable[Any] = ()) -> Optional[List[sqlite3.Row]]:
+        """Rows from the in-memory copies; None when inactive or a table is not copied."""
+        snapshot = self._current
+        if snapshot is None:
+            return None
+        con = self._connection(snapshot)
+        start = time.perf_counter()
+        try:
+            rows = con.execute(sql, tuple(params)).fetchall()
+        except sqlite3.OperationalError as e:
+            if self._missing_table(e):
+                return None
+            raise
+        observe_query(sql, time.perf_counter() - start, len(rows))
+        return rows
+
+    def iter_query(self, sql: str, params: Iterable[Any] = (), batch: int = 500) -> Optional[Iterator[sqlite3.Row]]:
+        """Streaming variant of `query` on a dedicated connection (see `DB.iter_query`)."""
+        snapshot = self._current
+        if snapshot is None:
+            return None
+        con = self._open()
+        try:
+            self._attach(con, False, snapshot)
+            cur = con.execute(sql, tuple(params))
+        except sqlite3.OperationalError as e:
+            con.close()
+            if self._missing_table(e):
+                return None
+            raise
+
+        def rows() -> Iterator[sqlite3.Row]:
+            busy = 0.0
+            count = 0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    chunk = cur.fetchmany(batch)
+                    busy += time.perf_counter() - start
+                    if not chunk:
+                        break
+                    count += len(chunk)
+                    yield from chunk
+            finally:
+                con.close()
+                observe_query(sql, busy, count)
+
+        return rows()
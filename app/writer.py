@@ -0,0 +1,200 @@
+import logging
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Any, Callable, List, NamedTuple, Optional
+
+from .config import WRITE_BATCH_WINDOW_MS, WRITE_MAX_BATCH, WRITE_QUEUE_SIZE, WRITE_RETRY_AFTER_S, WRITE_TIMEOUT_S
+from .metrics import write_batch_size, write_commit_latency
+
+
+log = logging.getLogger(__name__)
+
+
+class WriterBusy(Exception):
+    """The write queue is full; the client should retry after `retry_after` seconds."""
+
+    def __init__(self, retry_after: int = WRITE_RETRY_AFTER_S):
+        super().__init__("write queue is full")
+        self.retry_after = retry_after
+
+
+class WriterUnavailable(WriterBusy):
+    """The writer could not run the job: its thread died or the job timed out waiting."""
+
+    def __init__(self, reason: str = "writer unavailable", retry_after: int = WRITE_RETRY_AFTER_S):
+        super().__init__(retry_after)
+        self.args = (reason,)
+
+
+class _Job(NamedTuple):
+    func: Callable[[sqlite3.Connection], Any]
+    future: "Future[Any]"
+
+
+class GroupCommitWriter:
+    """Single writer thread that owns the write connection and commits in groups.
+
+    Jobs are functions of a connection. The writer takes the first queued
+    job, collects whatever else arrives within `window_ms` (up to
+    `max_batch`), runs each one inside its own SAVEPOINT and commits them
+    all at once: one fsync and one lock acquisition for the whole group.
+    A failing job is rolled back to its savepoint and gets the exception;
+    the others are unaffected. Futures resolve only after COMMIT.
+
+    If the thread dies (the connection can't be opened, or an error escapes
+    the commit loop), every queued job fails with WriterUnavailable and the
+    next `submit` starts a new thread. Callers of `run` wait at most
+    `timeout` seconds.
+    """
+
+    def __init__(
+        self,
+        connect: Callable[[], sqlite3.Connection],
+        maxsize: int = WRITE_QUEUE_SIZE,
+        window_ms: float = WRITE_BATCH_WINDOW_MS,
+        max_batch: int = WRITE_MAX_BATCH,
+        timeout: float = WRITE_TIMEOUT_S,
+    ):
+        self._connect = connect
+        self._timeout = timeout
+        self._queue: "queue.Queue[Optional[_Job]]" = queue.Queue(maxsize=maxsize)
+        self._window = window_ms / 1000.0
+        self._max_batch = max_batch
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, func: Callable[[sqlite3.Connection], Any]) -> "Future[Any]":
+        """Queue a job; raises WriterBusy instead of blocking when the queue is full."""
+        self.start()
+        future: "Future[Any]" = Future()
+        try:
+            self._queue.put_nowait(_Job(func, future))
+        except queue.Full:
+            raise WriterBusy() from None
+        return future
+
+    def run(self, func: Callable[[sqlite3.Connection], Any]) -> Any:
+        """Run a job on the writer and wait for its committed result."""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("writer jobs must not wait on the writer")
+        future = self.submit(func)
+        try:
+            return future.result(timeout=self._timeout)
+        except FutureTimeout:
+            # Withdrawn while still queued, so a retry can't write it twice;
+            # a job already in a running group still commits
+            future.cancel()
+            raise WriterUnavailable("write timed out") from None
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def _collect(self, first: _Job) -> List[Optional[_Job]]:
+        batch: List[Optional[_Job]] = [first]
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(job)
+            if job is None:
+                break
+        return batch
+
+    def _commit(self, con: sqlite3.Connection, jobs: List[_Job]) -> None:
+        results: List[Any] = []
+        start = time.perf_counter()
+        try:
+            con.execute("BEGIN IMMEDIATE")
+            for i, job in enumerate(jobs):
+                if not job.future.set_running_or_notify_cancel():
+                    # Its caller gave up waiting
+                    results.append((False, None))
+                    continue
+                con.execute(f"SAVEPOINT job{i}")
+                try:
+                    results.append((True, job.func(con)))
+                    con.execute(f"RELEASE job{i}")
+                except Exception as e:
+                    con.execute(f"ROLLBACK TO job{i}")
+                    con.execute(f"RELEASE job{i}")
+                    results.append((False, e))
+            con.commit()
+        except BaseException as e:
+            # The group could not be committed: nothing of it was written
+            if con.in_transaction:
+                con.rollback()
+            for job in jobs:
+                if not job.future.done():
+                    job.future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+        write_commit_latency.observe(time.perf_counter() - start)
+        write_batch_size.observe(len(jobs))
+        for job, (ok, value) in zip(jobs, results):
+            if job.future.cancelled():
+                continue
+            if ok:
+                job.future.set_result(value)
+            else:
+                job.future.set_exception(value)
+
+    def _run(self) -> None:
+        con: Optional[sqlite3.Connection] = None
+        try:
+            con = self._connect()
+            # Transactions are managed explicitly
+            con.isolation_level = None
+            while True:
+                first = self._queue.get()
+                if first is None:
+                    return
+                batch = self._collect(first)
+                stop = batch[-1] is None
+                jobs = [j for j in batch if j is not None]
+                if jobs:
+                    self._commit(con, jobs)
+                for _ in batch:
+                    self._queue.task_done()
+                if stop:
+                    return
+        except BaseException as e:
+            log.exception("Writer thread stopped")
+            self._fail_pending(WriterUnavailable(f"writer stopped: {e}"))
+            if not isinstance(e, Exception):
+                raise
+        finally:
+            if con is not None:
+                con.close()
+
+    def _fail_pending(self, error: WriterUnavailable) -> None:
+        # Nobody will run these any more; waiting callers get the error now
+        while True:
+            try:
+                job = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            if job is not None and job.future.set_running_or_notify_cancel():
+                job.future.set_exception(error)
+            self._queue.task_done()
+
+    def stop(self) -> None:
+        """Commit everything still queued, then stop the thread."""
+        with self._lock:
+            thread = self._thread
+            self._thread = None
+        if thread is not None and thread.is_alive():
+            self._queue.put(None)
+            thread.join()
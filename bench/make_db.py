@@ -0,0 +1,142 @@
+"""Build a synthetic `db.sqlite` with the schema the app expects.
+
+Usage: python -m bench.make_db bench.sqlite --can-data 1000000 [--makes 40 ...]
+
+Table and column names come from `app.config.TABLES`, so the WEB_CAN_*
+overrides apply. Sizes are configurable; the defaults give a mid-size
+catalogue. canData rows are spread over generations with a skew (a few
+popular generations carry most mappings), parameters are picked Zipf-like
+and CAN IDs repeat within a generation, like real dumps.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from typing import Iterator, List, Tuple
+
+from app.config import TABLES
+
+
+MAKES = [
+    "Lada", "Audi", "BMW", "Chery", "Chevrolet", "Citroën", "Daewoo", "Datsun", "Fiat", "Ford",
+    "Geely", "Haval", "Honda", "Hyundai", "Infiniti", "Jeep", "Kia", "Land Rover", "Lexus", "Mazda",
+    "Mercedes-Benz", "Mitsubishi", "Nissan", "Opel", "Peugeot", "Porsche", "Renault", "Skoda",
+    "SsangYong", "Subaru", "Suzuki", "Toyota", "UAZ", "Volkswagen", "Volvo", "GAZ", "KAMAZ",
+    "Škoda", "Exeed", "Omoda",
+]
+PARAMETERS = [
+    "Обороты двигателя", "Скорость автомобиля", "Температура ОЖ", "Уровень топлива", "Пробег",
+    "Напряжение АКБ", "Ёмкость батареи", "Положение педали газа", "Давление масла",
+    "Температура масла", "Температура воздуха на впуске", "Нагрузка двигателя", "Угол руля",
+    "Давление в шинах", "Состояние дверей", "Ремень водителя", "Ближний свет", "Дальний свет",
+    "Передача АКПП", "Стояночный тормоз", "Расход топлива", "Запас хода", "Наружная температура",
+]
+DIMENSIONS = [
+    ("об/мин", "rpm"), ("км/ч", "km/h"), ("°C", "degC"), ("В", "V"), ("А", "A"), ("%", "%"),
+    ("кПа", "kPa"), ("бар", "bar"), ("км", "km"), ("л", "l"), ("°", "deg"), ("л/100км", "l/100km"),
+]
+
+
+def create_schema(con: sqlite3.Connection) -> None:
+    mt, mdl, gen = TABLES["manufacturers"], TABLES["models"], TABLES["generations"]
+    pt, cd = TABLES["parameters"], TABLES["can_data"]
+    con.executescript(f"""
+    CREATE TABLE {mt['table']} ({mt['id']} INTEGER PRIMARY KEY, {mt['name']} TEXT);
+    CREATE TABLE {mdl['table']} ({mdl['id']} INTEGER PRIMARY KEY, {mdl['name']} TEXT, {mdl['manufacturer_id']} INTEGER);
+    CREATE TABLE {gen['table']} ({gen['id']} INTEGER PRIMARY KEY, {gen['name']} TEXT, {gen['model_id']} INTEGER,
+        {gen['major']} INTEGER, {gen['minor']} INTEGER);
+    CREATE TABLE {pt['table']} ({pt['id']} INTEGER PRIMARY KEY, {pt['name']} TEXT, canParameterName_en TEXT);
+    CREATE TABLE {cd['table']} (pid BLOB, pidMask BLOB, is29Bit INTEGER, formula TEXT, canBusId INTEGER,
+        {cd['parameter_id']} INTEGER, {cd['generation_id']} INTEGER, busType INTEGER, deprecated INTEGER,
+        conditionOffset INTEGER, conditionLength INTEGER, dimension INTEGER);
+    CREATE TABLE busType (idBus INTEGER PRIMARY KEY, busName TEXT);
+    CREATE TABLE canBuses (canBusId INTEGER PRIMARY KEY, canBusName TEXT, canBaudrate INTEGER);
+    CREATE TABLE dimensions (id INTEGER PRIMARY KEY, dimension_ru TEXT, dimension_en TEXT);
+    """)
+
+
+def _can_data_rows(rng: random.Random, generations: List[int], parameters: int, count: int) -> Iterator[Tuple]:
+    # A few popular generations carry most of the mappings
+    weights = [1.0 / (i + 1) ** 0.8 for i in range(len(generations))]
+    rng.shuffle(weights)
+    param_weights = [1.0 / (i + 1) for i in range(parameters)]
+    params = rng.choices(range(1, parameters + 1), param_weights, k=count)
+    ids_per_generation = {}
+    for gen_id, param in zip(rng.choices(generations, weights, k=count), params):
+        can_ids = ids_per_generation.get(gen_id)
+        if can_ids is None:
+            can_ids = ids_per_generation[gen_id] = [rng.randint(0x100, 0x7FF) for _ in range(rng.randint(8, 40))]
+        can_id = rng.choice(can_ids)
+        is29 = rng.random() < 0.1
+        pid = (0x18000000 | can_id << 8 | rng.randint(0, 255)).to_bytes(4, "big") if is29 else can_id.to_bytes(2, "big")
+        first = rng.randint(0, 6)
+        width = rng.choice((1, 1, 2, 2, 4))
+        mask = bytes(0xFF if first <= i < first + width else 0 for i in range(8))
+        formula = rng.choice(("x", "x*0.25", "x*0.1-40", "x/2", "(x*256+y)/4", "x-40"))
+        yield (pid, mask, int(is29), formula, rng.randint(1, 3), param, gen_id, rng.randint(0, 1), 0,
+               None, None, rng.randint(1, len(DIMENSIONS)))
+
+
+def build(path: str, makes: int, models: int, generations: int, parameters: int, can_data: int, seed: int) -> None:
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = random.Random(seed)
+    con = sqlite3.connect(path)
+    # Bulk load: no journal, no fsync; the file is rebuilt from scratch on failure anyway
+    con.execute("PRAGMA journal_mode=OFF")
+    con.execute("PRAGMA synchronous=OFF")
+    create_schema(con)
+    mt, mdl, gen = TABLES["manufacturers"], TABLES["models"], TABLES["generations"]
+    pt, cd = TABLES["parameters"], TABLES["can_data"]
+
+    make_names = [MAKES[i] if i < len(MAKES) else f"Make {i + 1}" for i in range(makes)]
+    con.executemany(f"INSERT INTO {mt['table']} VALUES (?, ?)", list(enumerate(make_names, 1)))
+    model_rows, gen_rows = [], []
+    for make_id in range(1, makes + 1):
+        for j in range(1, rng.randint(max(1, models // 2), models) + 1):
+            model_id = len(model_rows) + 1
+            model_rows.append((model_id, f"Model {j}", make_id))
+            for k in range(1, rng.randint(1, generations) + 1):
+                gen_rows.append((len(gen_rows) + 1, f"Gen {k}", model_id, k, rng.randint(0, 3)))
+    con.executemany(f"INSERT INTO {mdl['table']} VALUES (?, ?, ?)", model_rows)
+    con.executemany(f"INSERT INTO {gen['table']} VALUES (?, ?, ?, ?, ?)", gen_rows)
+
+    param_rows = [
+        (i, PARAMETERS[i - 1] if i <= len(PARAMETERS) else f"Параметр {i}", None)
+        for i in range(1, parameters + 1)
+    ]
+    con.executemany(f"INSERT INTO {pt['table']} VALUES (?, ?, ?)", param_rows)
+    con.executemany("INSERT INTO busType VALUES (?, ?)", [(0, "Основная"), (1, "Вспомогательная")])
+    con.executemany("INSERT INTO canBuses VALUES (?, ?, ?)", [(1, "HS-CAN", 500), (2, "MS-CAN", 125), (3, "LS-CAN", 33)])
+    con.executemany("INSERT INTO dimensions VALUES (?, ?, ?)", [(i, ru, en) for i, (ru, en) in enumerate(DIMENSIONS, 1)])
+
+    rows = _can_data_rows(rng, [g[0] for g in gen_rows], parameters, can_data)
+    sql = f"INSERT INTO {cd['table']} VALUES ({', '.join('?' * 12)})"
+    while True:
+        batch = [row for _, row in zip(range(50000), rows)]
+        if not batch:
+            break
+        con.executemany(sql, batch)
+    con.commit()
+    con.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic web_can database")
+    parser.add_argument("out", nargs="?", default="bench.sqlite")
+    parser.add_argument("--makes", type=int, default=40)
+    parser.add_argument("--models", type=int, default=12, help="max models per make")
+    parser.add_argument("--generations", type=int, default=4, help="max generations per model")
+    parser.add_argument("--parameters", type=int, default=5000)
+    parser.add_argument("--can-data", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    start = time.perf_counter()
+    build(args.out, args.makes, args.models, args.generations, args.parameters, args.can_data, args.seed)
+    print(f"{args.out}: {args.can_data} canData rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
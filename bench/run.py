@@ -0,0 +1,296 @@
+"""Load/benchmark harness: drives the app in-process and reports latency as JSON.
+
+Usage: python -m bench.run --db bench.sqlite [--workload mixed] [--clients 8] [--requests 2000] [--out result.json]
+
+Requests go straight into the ASGI app (no sockets), so numbers reflect the
+application and SQLite, not the network stack. The database is copied to a
+scratch folder first so write workloads never touch the fixture. Each
+workload reports throughput and p50/p95/p99 per endpoint and overall;
+results include the git commit so runs can be compared.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+
+# Share of read vs write requests per workload
+WORKLOADS: Dict[str, Dict[str, float]] = {
+    "read": {"read": 1.0, "write": 0.0},
+    "mixed": {"read": 0.9, "write": 0.1},
+    "write": {"read": 0.0, "write": 1.0},
+}
+
+DBC_SAMPLE = b'''BO_ 2024 EngineData: 8 ECU
+ SG_ EngineSpeed : 24|16@1+ (0.25,0) [0|16383.75] "rpm" Vector__XXX
+ SG_ CoolantTemp : 7|8@0+ (1,-40) [-40|215] "degC" Vector__XXX
+'''
+
+
+class Response:
+    __slots__ = ("status", "headers", "body")
+
+    def __init__(self, status: int, headers: List[Tuple[bytes, bytes]], body: bytes):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self) -> Any:
+        return json.loads(self.body)
+
+
+class ASGIClient:
+    """Minimal in-process HTTP/1.1 client for an ASGI app."""
+
+    def __init__(self, app: Callable):
+        self.app = app
+
+    async def request(self, method: str, path: str, params: Optional[Dict[str, Any]] = None,
+                      body: bytes = b"", headers: Optional[Dict[str, str]] = None) -> Response:
+        query = urlencode(params or {}).encode("ascii")
+        raw_headers = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in (headers or {}).items()]
+        raw_headers.append((b"host", b"bench"))
+        if body:
+            raw_headers.append((b"content-length", str(len(body)).encode("ascii")))
+        scope = {
+            "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+            "method": method, "scheme": "http", "path": path, "raw_path": path.encode("utf-8"),
+            "query_string": query, "root_path": "", "headers": raw_headers,
+            "client": ("127.0.0.1", 0), "server": ("bench", 80),
+        }
+        sent = False
+
+        async def receive() -> Dict[str, Any]:
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await asyncio.Event().wait()  # never disconnects
+            return {"type": "http.disconnect"}
+
+        status = 0
+        out_headers: List[Tuple[bytes, bytes]] = []
+        chunks: List[bytes] = []
+
+        async def send(message: Dict[str, Any]) -> None:
+            nonlocal status, out_headers
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                out_headers = message.get("headers", [])
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, send)
+        return Response(status, out_headers, b"".join(chunks))
+
+
+class Scenario:
+    """Builds random requests against the ids and names present in the database."""
+
+    def __init__(self, db_path: str, seed: int):
+        self.rng = random.Random(seed)
+        from app.config import TABLES
+        mt, mdl, gen = TABLES["manufacturers"], TABLES["models"], TABLES["generations"]
+        pt = TABLES["parameters"]
+        con = sqlite3.connect(db_path)
+        self.models = con.execute(
+            f"SELECT mf.{mt['name']}, m.{mdl['name']} FROM {mdl['table']} m "
+            f"JOIN {mt['table']} mf ON m.{mdl['manufacturer_id']} = mf.{mt['id']}"
+        ).fetchall()
+        self.generations = [r[0] for r in con.execute(f"SELECT {gen['id']} FROM {gen['table']}")]
+        names = [r[0] for r in con.execute(f"SELECT {pt['name']} FROM {pt['table']} WHERE {pt['name']} IS NOT NULL LIMIT 2000")]
+        con.close()
+        self.prefixes = sorted({n[:k] for n in names for k in (2, 3, 5) if len(n) >= k})
+        self.counter = 0
+        self.submission_ids: List[int] = []
+
+    def read(self) -> Tuple[str, str, Dict[str, Any], bytes]:
+        rng = self.rng
+        make, model = rng.choice(self.models)
+        choices = [
+            ("bootstrap", "/api/bootstrap", {}),
+            ("makes", "/api/makes", {}),
+            ("models", "/api/models", {"make": make}),
+            ("generations", "/api/generations", {"make": make, "model": model}),
+            ("generation-parameters", "/api/generation-parameters", {"generation_id": rng.choice(self.generations)}),
+            ("coverage", "/api/coverage", {"make": make, "model": model}),
+            ("parameters-search", "/api/parameters", {"query": rng.choice(self.prefixes), "limit": 20}),
+            ("parameters-page", "/api/parameters", {"limit": 500}),
+            ("vehicles-page", "/api/vehicles", {"make": make, "limit": 200}),
+            ("bus-types", "/api/bus-types", {}),
+            ("can-buses", "/api/can-buses", {}),
+            ("dimensions", "/api/dimensions", {}),
+            ("health", "/api/health", {}),
+            ("metrics", "/api/metrics", {}),
+        ]
+        label, path, params = rng.choice(choices)
+        return label, path, params, b""
+
+    def _item(self) -> Dict[str, Any]:
+        self.counter += 1
+        first = self.rng.randint(0, 48)
+        return {
+            "parameter_name": f"Bench {os.getpid()}-{self.counter}",
+            "can_id": f"{self.rng.randint(0x100, 0x7FF):X}",
+            "endian": self.rng.choice(("little", "big")),
+            "formula": "value * 0.25",
+            "selected_bits": list(range(first, first + 16)),
+        }
+
+    def write(self) -> Tuple[str, str, Dict[str, Any], bytes]:
+        rng = self.rng
+        gen_id = rng.choice(self.generations)
+        kind = rng.random()
+        if kind < 0.6:
+            body = {"vehicle_id": gen_id, "items": [self._item() for _ in range(rng.randint(1, 5))]}
+            return "submit", "/api/submissions", {}, json.dumps(body).encode("utf-8")
+        if kind < 0.85:
+            lines = [json.dumps(self._item()) for _ in range(50)]
+            return "submit-bulk", "/api/submissions/bulk", {"vehicle_id": gen_id}, "\n".join(lines).encode("utf-8")
+        if kind < 0.95 or not self.submission_ids:
+            return "dbc", "/api/dbc", {"vehicle_id": gen_id, "encoding": "utf-8"}, DBC_SAMPLE
+        log = "".join(
+            f"({1700000000 + i * 0.01:.6f}) can0 7E8#{rng.getrandbits(64):016X}\n" for i in range(2000)
+        ).encode("ascii")
+        return "check-log", f"/api/submissions/{rng.choice(self.submission_ids)}/check-log", {}, log
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * q
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def summarize(samples: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    ordered = sorted(samples)
+    ms = lambda v: round(v * 1000, 3)  # noqa: E731
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 1) if elapsed > 0 else None,
+        "latency_ms": {
+            "p50": ms(percentile(ordered, 0.50)),
+            "p95": ms(percentile(ordered, 0.95)),
+            "p99": ms(percentile(ordered, 0.99)),
+            "max": ms(ordered[-1]) if ordered else 0.0,
+            "mean": ms(sum(ordered) / len(ordered)) if ordered else 0.0,
+        },
+    }
+
+
+async def run_workload(client: ASGIClient, scenario: Scenario, name: str, clients: int, total: int) -> Dict[str, Any]:
+    mix = WORKLOADS[name]
+    per_label: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    remaining = total
+
+    async def worker() -> None:
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            kind = "write" if scenario.rng.random() < mix["write"] else "read"
+            label, path, params, body = scenario.write() if kind == "write" else scenario.read()
+            method = "POST" if body else "GET"
+            # Reads negotiate compression like a browser; write responses are parsed below
+            headers = {"content-type": "application/json"} if body else {"accept-encoding": "gzip, br"}
+            start = time.perf_counter()
+            response = await client.request(method, path, params, body, headers)
+            per_label.setdefault(label, []).append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors[label] = errors.get(label, 0) + 1
+            elif label == "submit-bulk":
+                # Later check-log requests pick from these
+                for line in response.body.splitlines():
+                    sid = json.loads(line).get("id")
+                    if sid is not None:
+                        scenario.submission_ids.append(sid)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    everything = [v for values in per_label.values() for v in values]
+    result = summarize(everything, sum(errors.values()), elapsed)
+    result["endpoints"] = {
+        label: summarize(values, errors.get(label, 0), elapsed) for label, values in sorted(per_label.items())
+    }
+    return result
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main_async(args: argparse.Namespace, db_path: str) -> Dict[str, Any]:
+    from app.main import app
+    client = ASGIClient(app)
+    await app.router.startup()
+    try:
+        scenario = Scenario(db_path, args.seed)
+        # Warm caches the way a running server would have them
+        for _ in range(min(200, args.requests)):
+            label, path, params, _ = scenario.read()
+            await client.request("GET", path, params)
+        results = {}
+        for name in args.workload:
+            results[name] = await run_workload(client, scenario, name, args.clients, args.requests)
+        return results
+    finally:
+        await app.router.shutdown()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the web_can API in-process")
+    parser.add_argument("--db", required=True, help="fixture database (see bench.make_db); copied before use")
+    parser.add_argument("--workload", action="append", choices=sorted(WORKLOADS), help="repeatable; default: read, mixed")
+    parser.add_argument("--clients", type=int, default=8, help="concurrent clients")
+    parser.add_argument("--requests", type=int, default=2000, help="requests per workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+    args.workload = args.workload or ["read", "mixed"]
+
+    scratch = tempfile.mkdtemp(prefix="webcan-bench-")
+    try:
+        db_path = os.path.join(scratch, "db.sqlite")
+        shutil.copyfile(args.db, db_path)
+        # The app reads its configuration at import time
+        os.environ["WEB_CAN_DB"] = db_path
+        os.environ["WEB_CAN_EXPORT_DIR"] = os.path.join(scratch, "exports")
+        results = asyncio.run(main_async(args, db_path))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "sqlite": sqlite3.sqlite_version,
+        "config": {"db": os.path.abspath(args.db), "clients": args.clients, "requests": args.requests, "seed": args.seed},
+        "workloads": results,
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
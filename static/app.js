@@ -50,10 +50,68 @@ function setDbCheck(msg, ok = true) {
   els.dbCheck.className = ok ? 'muted' : 'err';
 }
 
+// Reference lists for the whole form come in one request (/api/bootstrap)
+let bootstrapPromise = null;
+function loadBootstrap() {
+  if (!bootstrapPromise) bootstrapPromise = fetchJSON('/api/bootstrap').catch((e) => { bootstrapPromise = null; throw e; });
+  return bootstrapPromise;
+}
+
+// Local catalog (IndexedDB): makes, models, generations and parameters, kept current
+// through /api/catalog/changes so repeat visits render at once and only fetch the delta
+const CATALOG_DB = 'webcan-catalog';
+const CATALOG_KINDS = ['makes', 'models', 'generations', 'parameters'];
+let catalogDbPromise = null;
+let catalogReady = false;
+let catalogSyncPromise = null;
+function idbRequest(req){ return new Promise((resolve,reject)=>{ req.onsuccess=()=>resolve(req.result); req.onerror=()=>reject(req.error); }); }
+function openCatalogDb(){
+  if(!('indexedDB' in window)) return Promise.reject(new Error('IndexedDB недоступна'));
+  if(!catalogDbPromise){
+    catalogDbPromise=new Promise((resolve,reject)=>{
+      const req=indexedDB.open(CATALOG_DB, 1);
+      req.onupgradeneeded=()=>{ const db=req.result; db.createObjectStore('makes',{keyPath:'id'}).createIndex('name','name'); db.createObjectStore('models',{keyPath:'id'}).createIndex('make_id','make_id'); db.createObjectStore('generations',{keyPath:'id'}).createIndex('model_id','model_id'); db.createObjectStore('parameters',{keyPath:'id'}); db.createObjectStore('meta'); };
+      req.onsuccess=()=>resolve(req.result); req.onerror=()=>reject(req.error);
+    }).catch((e)=>{ catalogDbPromise=null; throw e; });
+  }
+  return catalogDbPromise;
+}
+async function catalogGet(store, index, key){ const db=await openCatalogDb(); const s=db.transaction(store).objectStore(store); return idbRequest(index? s.index(index).getAll(key): s.getAll()); }
+// Synced catalog version; undefined until the first sync finished
+async function catalogVersion(){ const db=await openCatalogDb(); return idbRequest(db.transaction('meta').objectStore('meta').get('version')); }
+async function applyCatalogChanges(changes){
+  const db=await openCatalogDb(); const tx=db.transaction([...CATALOG_KINDS,'meta'],'readwrite');
+  for(const kind of CATALOG_KINDS){ const store=tx.objectStore(kind); if(changes.full) store.clear(); const part=changes[kind]; if(!part) continue; for(const row of part.upsert) store.put(row); for(const id of part.delete) store.delete(id); }
+  tx.objectStore('meta').put(changes.version,'version');
+  await new Promise((resolve,reject)=>{ tx.oncomplete=resolve; tx.onerror=()=>reject(tx.error); tx.onabort=()=>reject(tx.error); });
+  // New catalog version: cached suggestions may miss added or renamed parameters
+  paramSuggestCache.clear();
+}
+// Resolves to true when the local catalog changed
+function syncCatalog(){
+  if(!catalogSyncPromise){
+    catalogSyncPromise=(async()=>{ const since=(await catalogVersion()) || 0; const changes=await fetchJSON(`/api/catalog/changes?since=${since}`); const changed=changes.full || CATALOG_KINDS.some((k)=>changes[k]); if(changed || changes.version!==since) await applyCatalogChanges(changes); catalogReady=true; return changed; })().finally(()=>{ catalogSyncPromise=null; });
+  }
+  return catalogSyncPromise;
+}
+// Lists from the local catalog once it exists, from the API before that (or if IndexedDB fails)
+async function catalogList(local, remote){ if(catalogReady){ try{ return await local(); }catch(e){ console.warn(e); } } return remote(); }
+function uniqueNames(rows){ return Array.from(new Set(rows.map((r)=>r.name).filter((n)=>n && n.trim()))).sort(); }
+async function localMakes(){ return uniqueNames(await catalogGet('makes')); }
+async function localModelRows(make){ const makes=await catalogGet('makes','name',make); const rows=[]; for(const m of makes) rows.push(...await catalogGet('models','make_id',m.id)); return rows; }
+async function localModels(make){ return uniqueNames(await localModelRows(make)); }
+async function localGenerations(make, model){
+  const gens=[]; for(const m of (await localModelRows(make)).filter((r)=>r.name===model)) gens.push(...await catalogGet('generations','model_id',m.id));
+  const cmp=(a,b)=> (a===b? 0: a===null||a===undefined? -1: b===null||b===undefined? 1: a<b? -1: 1);
+  gens.sort((a,b)=>cmp(a.name,b.name) || cmp(a.major,b.major) || cmp(a.minor,b.minor));
+  return gens.map((g)=>({ id:g.id, label:g.label }));
+}
+async function localParameters(query, limit){ const q=query.toLowerCase(); return (await catalogGet('parameters')).filter((p)=>p.name && p.name.toLowerCase().includes(q)).sort((a,b)=>a.name.length-b.name.length).slice(0, limit); }
+
 // Health check
 async function initDbCheck() {
   try {
-    const makes = await fetchJSON('/api/makes');
+    const { makes } = await loadBootstrap();
     setDbCheck(`БД доступна. Марок: ${makes.length}.`);
   } catch (e) {
     setDbCheck(`БД недоступна: ${e.message}. Поместите db.sqlite в корень или задайте WEB_CAN_DB.`, false);
@@ -63,7 +121,7 @@ async function initDbCheck() {
 // Loaders
 async function loadMakes() {
   els.make.innerHTML = '';
-  const makes = await fetchJSON('/api/makes');
+  const makes = await catalogList(localMakes, async () => (await loadBootstrap()).makes);
   const def = document.createElement('option');
   def.value = '';
   def.textContent = '— выберите марку —';
@@ -84,7 +142,7 @@ async function loadModels(make) {
     if (els.genCustomWrap) els.genCustomWrap.style.display='';
     return;
   }
-  const models = await fetchJSON(`/api/models?make=${encodeURIComponent(make)}`);
+  const models = await catalogList(() => localModels(make), () => fetchJSON(`/api/models?make=${encodeURIComponent(make)}`));
   const def=document.createElement('option'); def.value=''; def.textContent='— выберите модель —'; def.disabled=true; def.selected=true; els.model.appendChild(def);
   for (const m of models) { const o=document.createElement('option'); o.value=m; o.textContent=m; els.model.appendChild(o); }
   const custom=document.createElement('option'); custom.value='__custom__'; custom.textContent=CUSTOM_TEXT; els.model.appendChild(custom);
@@ -96,17 +154,25 @@ async function loadGenerations(make, model) {
   if (!make || !model || make==='__custom__' || model==='__custom__') {
     els.generationRow.style.display=''; const co=document.createElement('option'); co.value='__custom__'; co.textContent=CUSTOM_TEXT; co.selected=true; els.generation.appendChild(co); if (els.genCustomWrap) els.genCustomWrap.style.display=''; return null;
   }
-  const gens = await fetchJSON(`/api/generations?make=${encodeURIComponent(make)}&model=${encodeURIComponent(model)}`);
+  const gens = await catalogList(() => localGenerations(make, model), () => fetchJSON(`/api/generations?make=${encodeURIComponent(make)}&model=${encodeURIComponent(model)}`));
   const def=document.createElement('option'); def.value=''; def.textContent='— выберите поколение —'; def.disabled=true; def.selected=true; els.generation.appendChild(def);
   for (const g of gens) { const o=document.createElement('option'); o.value=String(g.id); o.textContent=g.label || `generation ${g.id}`; els.generation.appendChild(o); }
   const custom=document.createElement('option'); custom.value='__custom__'; custom.textContent=CUSTOM_TEXT; els.generation.appendChild(custom);
   els.generationRow.style.display='';
 }
 
-async function loadParameters(){ const params=await fetchJSON('/api/parameters?limit=2000'); els.paramList.innerHTML=''; paramIndex.clear(); for(const p of params){ const opt=document.createElement('option'); opt.value=p.name; els.paramList.appendChild(opt); if(!paramIndex.has(p.name)) paramIndex.set(p.name,p.id);} }
-async function loadBusTypes(){ try{return await fetchJSON('/api/bus-types');}catch{return[]} }
-async function loadCanBuses(){ try{return await fetchJSON('/api/can-buses');}catch{return[]} }
-async function loadDimensionTypes(){ try{return await fetchJSON('/api/dimensions');}catch{return[]} }
+// Parameter autocomplete: incremental server-side search instead of preloading the whole list
+const PARAM_SUGGEST_LIMIT = 20;
+const PARAM_SUGGEST_DELAY = 200;
+const paramSuggestCache = new Map();
+let paramSuggestTimer = null;
+let paramSuggestAbort = null;
+function renderParamSuggestions(params){ els.paramList.innerHTML=''; for(const p of params){ const opt=document.createElement('option'); opt.value=p.name; els.paramList.appendChild(opt); if(!paramIndex.has(p.name)) paramIndex.set(p.name,p.id);} }
+async function suggestParameters(query){ const q=query.trim(); if(!q){ renderParamSuggestions([]); return; } const key=q.toLowerCase(); if(paramSuggestCache.has(key)){ renderParamSuggestions(paramSuggestCache.get(key)); return; } if(paramSuggestAbort) paramSuggestAbort.abort(); paramSuggestAbort=new AbortController(); try{ const r=await fetch(`/api/parameters?query=${encodeURIComponent(q)}&limit=${PARAM_SUGGEST_LIMIT}`, { signal: paramSuggestAbort.signal }); if(!r.ok) return; const params=await r.json(); paramSuggestCache.set(key, params); renderParamSuggestions(params); }catch(e){ if(e.name==='AbortError') return; if(catalogReady){ try{ renderParamSuggestions(await localParameters(q, PARAM_SUGGEST_LIMIT)); return; }catch(err){ console.warn(err); } } console.warn(e); } }
+function scheduleParamSuggest(query){ clearTimeout(paramSuggestTimer); paramSuggestTimer=setTimeout(()=>suggestParameters(query), PARAM_SUGGEST_DELAY); }
+async function loadBusTypes(){ try{return (await loadBootstrap()).bus_types;}catch{return[]} }
+async function loadCanBuses(){ try{return (await loadBootstrap()).can_buses;}catch{return[]} }
+async function loadDimensionTypes(){ try{return (await loadBootstrap()).dimensions;}catch{return[]} }
 
 // Vehicle state
 function currentVehicleId(){ if(els.generation && els.generation.value && els.generation.value!=='__custom__') return parseInt(els.generation.value,10); return null; }
@@ -124,13 +190,18 @@ els.form.addEventListener('submit', async (e)=>{
     const payload={ vehicle_id: vehicleId, make: els.make.value==='__custom__'? null: els.make.value, make_custom: els.makeCustomInput? (els.makeCustomInput.value||null): null, model: els.model.value==='__custom__'? null: els.model.value, model_custom: els.modelCustomInput? (els.modelCustomInput.value||null): null, generation_label: generationLabel, generation_custom: els.genCustomInput? (els.genCustomInput.value||null): null, items: paramItems.map(it=>it.toJSON()) };
     const res=await fetch('/api/submissions',{ method:'POST', headers:{'Content-Type':'application/json'}, body: JSON.stringify(payload)});
     if(!res.ok){ const detail=await res.json().catch(()=>({})); throw new Error(detail.detail || `Ошибка ${res.status}`); }
-    const data=await res.json(); setStatus(`Сохранено (${data.saved || 0} шт.).`, true);
+    const data=await res.json(); setStatus(`Сохранено (${data.saved || 0} шт.).`, true); syncCatalog().catch(()=>{});
     els.form.reset(); els.model.disabled=true; if(els.generationRow) els.generationRow.style.display='none'; if(els.generation) els.generation.innerHTML=''; els.paramsContainer.innerHTML=''; paramItems=[]; addParamItem(); const gid=currentVehicleId(); if(els.drawer && els.drawer.classList.contains('open') && gid) loadExistingParams(gid);
   }catch(err){ setStatus(err.message || String(err), false); }
 });
 
 // Init
-async function init(){ await initDbCheck(); try{ await Promise.all([loadMakes(), loadParameters()]); }catch(e){} addParamItem(); initTheme(); if(els.addParamBtn) els.addParamBtn.addEventListener('click', addParamItem); }
+async function initCatalog(){
+  // A previous visit left a local copy: render from it now, fetch only the delta afterwards
+  try{ catalogReady=(await catalogVersion())!==undefined; }catch(e){ catalogReady=false; }
+  syncCatalog().then((changed)=>{ if(changed && !els.make.value) loadMakes().catch(()=>{}); }).catch((e)=>console.warn('Синхронизация справочников не удалась:', e));
+}
+async function init(){ await initCatalog(); initDbCheck(); try{ await loadMakes(); }catch(e){} addParamItem(); initTheme(); if(els.addParamBtn) els.addParamBtn.addEventListener('click', addParamItem); if('serviceWorker' in navigator) navigator.serviceWorker.register('/sw.js').catch((e)=>console.warn(e)); }
 (async()=>{ await init(); })();
 
 // Add parameter item
@@ -226,7 +297,7 @@ function makeParamItem(node){
   offsetBits.addEventListener('input', applyOffsetLengthToBits); lengthBits.addEventListener('input', applyOffsetLengthToBits);
 
   // Пользователь вводит своё название прямо здесь — доп. поле не используем
-  input.addEventListener('input',()=>{ if(customWrap) customWrap.style.display='none'; });
+  input.addEventListener('input',()=>{ if(customWrap) customWrap.style.display='none'; scheduleParamSuggest(input.value); });
   removeBtn.addEventListener('click',()=>{ node.remove(); const i=paramItems.indexOf(api); if(i>=0) paramItems.splice(i,1); });
 
   const api={ toJSON(){ const name=input.value.trim(); const match=paramIndex.has(name); const paramId=match? paramIndex.get(name): null; const paramName = match? undefined : (name || undefined); const endianVal=endian.value; if(!canId.value.trim()) throw new Error('Укажите CAN ID для одного из параметров.'); if(!endianVal) throw new Error('Выберите направление чтения для одного из параметров.'); return { parameter_id:paramId, parameter_name:paramName, can_id:canId.value.trim(), formula:formula.value||null, endian:endianVal, is29bit: is29bit.checked, bus_type_id:busType.value||null, can_bus_id:busSpeed.value||null, offset_bits: offsetBits.value!==''? parseInt(offsetBits.value,10): null, length_bits: lengthBits.value!==''? parseInt(lengthBits.value,10): null, dimension_id: dimension.value||null, notes:null, selected_bits:Array.from(bits).sort((a,b)=>a-b), selected_bytes:Array.from(new Set(Array.from(bits).map(x=>Math.floor(x/8)))).sort((a,b)=>a-b), }; } };
@@ -0,0 +1,52 @@
+// Service worker: keeps the app shell available offline.
+// Catalog data lives in IndexedDB (see app.js) and is synced through /api/catalog/changes,
+// so API calls are never served from here except the bootstrap lists when offline.
+const SHELL_CACHE = 'webcan-shell-v1';
+const SHELL = ['/', '/static/app.js', '/static/styles.css', '/static/favicon.svg'];
+
+self.addEventListener('install', (event) => {
+  event.waitUntil(caches.open(SHELL_CACHE).then((cache) => cache.addAll(SHELL)).then(() => self.skipWaiting()));
+});
+
+self.addEventListener('activate', (event) => {
+  event.waitUntil(
+    caches.keys()
+      .then((keys) => Promise.all(keys.filter((k) => k !== SHELL_CACHE).map((k) => caches.delete(k))))
+      .then(() => self.clients.claim())
+  );
+});
+
+// Network first (so a deploy is picked up at once), cached copy when offline
+async function networkFirst(request) {
+  const cache = await caches.open(SHELL_CACHE);
+  try {
+    const response = await fetch(request);
+    if (response.ok) cache.put(request, response.clone());
+    return response;
+  } catch (e) {
+    const cached = await cache.match(request);
+    if (cached) return cached;
+    throw e;
+  }
+}
+
+// Content-hashed builds never change: cache first
+async function cacheFirst(request) {
+  const cache = await caches.open(SHELL_CACHE);
+  const cached = await cache.match(request);
+  if (cached) return cached;
+  const response = await fetch(request);
+  if (response.ok) cache.put(request, response.clone());
+  return response;
+}
+
+self.addEventListener('fetch', (event) => {
+  const request = event.request;
+  if (request.method !== 'GET') return;
+  const url = new URL(request.url);
+  if (url.origin !== self.location.origin) return;
+  if (url.pathname.startsWith('/static/dist/')) { event.respondWith(cacheFirst(request)); return; }
+  if (url.pathname === '/' || url.pathname.startsWith('/static/') || url.pathname === '/api/bootstrap') {
+    event.respondWith(networkFirst(request));
+  }
+});
@@ -0,0 +1,104 @@
+import asyncio
+import json
+
+from app.bulk import iter_lines, iter_records
+
+
+def parse(*chunks):
+    async def body():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [rec async for rec in iter_records(body())]
+
+    return asyncio.run(collect())
+
+
+def split_every(data: bytes, size: int):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def test_ndjson_record_split_across_chunks():
+    assert parse(b'{"can_id": "7E', b'8"}\n{"can_id"', b': "1"}\n') == [
+        (1, {"can_id": "7E8"}, None),
+        (2, {"can_id": "1"}, None),
+    ]
+
+
+def test_ndjson_multibyte_character_split_across_chunks():
+    data = json.dumps({"parameter_name": "Обороты"}, ensure_ascii=False).encode("utf-8") + b"\n"
+    # Every split point, including ones inside a two-byte UTF-8 sequence
+    for size in range(1, len(data)):
+        assert parse(*split_every(data, size)) == [(1, {"parameter_name": "Обороты"}, None)]
+
+
+def test_ndjson_malformed_line_does_not_stop_the_rest():
+    records = parse(b'{"a": 1}\n{"a": \n\n{"a": 3}')
+    assert records[0] == (1, {"a": 1}, None)
+    assert records[1][0] == 2 and records[1][1] is None and records[1][2].startswith("JSON:")
+    # Blank lines keep their number but yield nothing; the last line needs no newline
+    assert records[2] == (4, {"a": 3}, None)
+
+
+def test_ndjson_crlf_line_endings():
+    assert parse(b'{"a": 1}\r\n{"a": 2}\r\n') == [(1, {"a": 1}, None), (2, {"a": 2}, None)]
+
+
+def test_array_split_at_every_boundary():
+    data = b' [{"a": 1}, {"b": "x,]y"} ,{"c": [1, 2]}] '
+    expected = [(1, {"a": 1}, None), (2, {"b": "x,]y"}, None), (3, {"c": [1, 2]}, None)]
+    for size in range(1, len(data)):
+        assert parse(*split_every(data, size)) == expected
+
+
+def test_array_malformed_element_is_skipped():
+    records = parse(b'[{"a": 1}, {"a": ', b'oops}, {"a": 3},', b' {"b": [1, "],"]}, nope, {"a": 5}]')
+    assert records[0] == (1, {"a": 1}, None)
+    assert records[1][0] == 2 and records[1][1] is None and records[1][2].startswith("JSON:")
+    assert records[2:4] == [(3, {"a": 3}, None), (4, {"b": [1, "],"]}, None)]
+    assert records[4][0] == 5 and records[4][2].startswith("JSON:")
+    assert records[5] == (6, {"a": 5}, None)
+    assert len(records) == 6
+
+
+def test_array_malformed_element_split_at_every_boundary():
+    data = b'[{"a": tru}, {"s": "\\"],", x}, {"a": true}, 12]'
+    for size in range(1, len(data)):
+        records = parse(*split_every(data, size))
+        assert [(n, v) for n, v, _ in records] == [(1, None), (2, None), (3, {"a": True}), (4, 12)]
+
+
+def test_oversized_records(monkeypatch):
+    monkeypatch.setattr("app.bulk.BULK_MAX_RECORD_SIZE", 20)
+    long = b'{"a": "' + b"x" * 30 + b'"}'
+    records = parse(b'{"a": 1}\n' + long[:25], long[25:] + b'\n{"a": 2}\n')
+    assert [(n, v) for n, v, _ in records] == [(1, {"a": 1}), (2, None), (3, {"a": 2})]
+    assert records[1][2].startswith("JSON: запись длиннее")
+    # In an array the element's end can't be found reliably: the stream ends
+    records = parse(b'[{"a": 1}, ' + long[:25], long[25:] + b', {"a": 2}]')
+    assert [(n, v) for n, v, _ in records] == [(1, {"a": 1}), (2, None)]
+
+
+def test_unclosed_array_is_reported():
+    assert parse(b'[{"a": 1},', b' {"a": 2}') == [
+        (1, {"a": 1}, None),
+        (2, {"a": 2}, None),
+        (3, None, "JSON: массив не закрыт"),
+    ]
+
+
+def test_empty_body():
+    assert parse() == []
+    assert parse(b"  \n ") == []
+
+
+def test_iter_lines_joins_split_lines():
+    async def body():
+        for chunk in (b"BO_ 1 A: 8 X\r\n SG_ s", b" : 0|8@1+ (1,0) [0|0] \"\" X\r\n", b"tail"):
+            yield chunk
+
+    async def collect():
+        return [line async for line in iter_lines(body())]
+
+    assert asyncio.run(collect()) == ["BO_ 1 A: 8 X", ' SG_ s : 0|8@1+ (1,0) [0|0] "" X', "tail"]
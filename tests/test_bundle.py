@@ -0,0 +1,32 @@
+import os
+import time
+
+from app.bundle import _remove_superseded
+
+
+def _write(directory, content_hash, age):
+    stamp = time.time() - age
+    for ext in ("json", "json.gz", "bin", "bin.br"):
+        path = os.path.join(directory, f"{content_hash}.{ext}")
+        open(path, "wb").close()
+        os.utime(path, (stamp, stamp))
+
+
+def _hashes(directory):
+    return sorted({name.split(".", 1)[0] for name in os.listdir(directory)})
+
+
+def test_superseded_bundle_kept_during_grace(tmp_path):
+    _write(tmp_path, "old", 5000)
+    _write(tmp_path, "previous", 1000)
+    _write(tmp_path, "current", 0)
+    _remove_superseded(str(tmp_path), "current", grace_s=600)
+    # "old" was replaced 1000 s ago, "previous" only just now
+    assert _hashes(tmp_path) == ["current", "previous"]
+
+
+def test_temporary_files_untouched(tmp_path):
+    _write(tmp_path, "old", 5000)
+    open(tmp_path / ".tmp-123", "wb").close()
+    _remove_superseded(str(tmp_path), "current", grace_s=0)
+    assert os.listdir(tmp_path) == [".tmp-123"]
@@ -0,0 +1,25 @@
+import sqlite3
+
+import app.db as dbmod
+from app.db import DB
+
+
+def test_provision_indexes_survives_locked_database(tmp_path, monkeypatch):
+    path = str(tmp_path / "locked.sqlite")
+    con = sqlite3.connect(path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("CREATE TABLE manufacturers (id INTEGER PRIMARY KEY, name TEXT)")
+    con.commit()
+    monkeypatch.setattr(dbmod, "DB_BUSY_TIMEOUT_MS", 50)
+    database = DB(path)
+    monkeypatch.setattr(dbmod, "db", database)
+    # Another writer holds the lock: reads work, ANALYZE can't write its statistics
+    con.execute("BEGIN IMMEDIATE")
+    try:
+        report = dbmod.provision_indexes()
+    finally:
+        con.rollback()
+        con.close()
+        database.close()
+    assert report["analyzed"] is False
+    assert report["checked_at"] is not None
@@ -0,0 +1,84 @@
+from app.dbc import DbcParser, iter_signals, signal_bits, signal_formula, signal_item
+from app.decoder import SignalDecoder, decoder_for
+
+
+DBC = """\
+VERSION ""
+
+BO_ 2024 EngineData: 8 ECU
+ SG_ EngineSpeed : 24|16@1+ (0.25,0) [0|16383.75] "rpm" Dash
+ SG_ CoolantTemp : 3|8@0+ (1,-40) [-40|215] "degC" Dash
+
+BO_ 2566844926 Extended: 8 ECU
+ SG_ Mode M : 0|4@1+ (1,0) [0|15] "" Dash
+ SG_ Torque m1 : 7|12@0- (0.5,0) [-1024|1023.5] "Nm" Dash
+
+BO_ 3221225472 VECTOR__INDEPENDENT_SIG_MSG: 0 Vector__XXX
+ SG_ Orphan : 0|8@1+ (1,0) [0|0] "" Vector__XXX
+"""
+
+
+def test_intel_signal_bits():
+    assert signal_bits(24, 16, True) == list(range(24, 40))
+
+
+def test_motorola_signal_crossing_a_byte_boundary():
+    # MSB at bit 3 of byte 0: bits 3..0, then bits 7..4 of byte 1
+    bits = signal_bits(3, 8, False)
+    assert bits == [0, 1, 2, 3, 12, 13, 14, 15]
+    frame = bytes([0x0A, 0xB0, 0, 0, 0, 0, 0, 0])
+    assert SignalDecoder(bits, "big", None).raw(frame) == 0xAB
+
+
+def test_motorola_signal_spanning_whole_bytes():
+    bits = signal_bits(7, 16, False)
+    assert bits == list(range(16))
+    assert SignalDecoder(bits, "big", None).raw(bytes([0x12, 0x34])) == 0x1234
+
+
+def test_parser_reads_messages_and_signals():
+    signals = list(iter_signals(DBC.splitlines()))
+    assert [s.name for s in signals] == ["EngineSpeed", "CoolantTemp", "Mode", "Torque"]
+    speed, coolant, mode, torque = signals
+    assert (speed.message_id, speed.is29bit, speed.little_endian) == (2024, False, True)
+    assert (coolant.little_endian, coolant.unit, coolant.offset) == (False, "degC", "-40")
+    # Extended frame flag is stripped from the id
+    assert (torque.message_id, torque.is29bit, torque.signed) == (0x18FEF1FE, True, True)
+    assert (mode.multiplex, torque.multiplex) == ("M", "m1")
+
+
+def test_blank_line_ends_the_message_block():
+    parser = DbcParser()
+    assert parser.feed("BO_ 100 A: 8 X") is None
+    assert parser.feed("") is None
+    assert parser.feed(' SG_ Stray : 0|8@1+ (1,0) [0|0] "" X') is None
+
+
+def test_signal_formula():
+    speed, coolant, _, torque = iter_signals(DBC.splitlines())
+    assert signal_formula(speed) == "value * 0.25"
+    assert signal_formula(coolant) == "value - 40"
+    assert signal_formula(torque) == "value * 0.5"
+
+
+def test_signal_item_for_motorola_signal():
+    coolant = list(iter_signals(DBC.splitlines()))[1]
+    row, item = signal_item(coolant, {"degc": 7})
+    assert row["can_id"] == "7E8"
+    assert row["endian"] == "big"
+    assert row["bit_indices"] == [0, 1, 2, 3, 12, 13, 14, 15]
+    assert row["byte_indices"] == [0, 1]
+    assert row["dimension_id"] == 7
+    assert item["selected_bits"] == row["bit_indices"]
+    # Not a contiguous range: no offset/length window that would decode other bits
+    assert row["offset_bits"] is None and row["length_bits"] is None
+    assert item["offset_bits"] is None and item["length_bits"] is None
+    decoder = decoder_for(row)
+    assert decoder.raw(bytes([0x0A, 0xB0, 0, 0, 0, 0, 0, 0])) == 0xAB
+
+
+def test_signal_item_window_for_contiguous_bits():
+    speed = list(iter_signals(DBC.splitlines()))[0]
+    row, item = signal_item(speed, {})
+    assert (row["offset_bits"], row["length_bits"]) == (24, 16)
+    assert (item["offset_bits"], item["length_bits"]) == (24, 16)
@@ -0,0 +1,80 @@
+import pytest
+
+from app.decoder import FormulaError, SignalDecoder, affine_formula, compile_formula, decoder_for
+
+
+@pytest.mark.parametrize("formula", [
+    "__import__('os')",
+    "value.__class__",
+    "open('x')",
+    "[value]",
+    "value if value else 0",
+    "lambda: 1",
+    "y * 2",
+    "'a' * 3",
+    "True + value",
+    "round(value, ndigits=1)",
+    "2 ** 10 ** 10",
+    "2 ** value",
+    "value ** 65",
+    "1 << 65",
+    "((((9 ** 64) ** 64) ** 64) ** 64) ** 64",
+    "(1 + 9 ** 64) ** 64",
+    "abs(2 ** 3) ** 2",
+    "value *",
+    "round(value, -99999999)",
+    "round(value, 16)",
+    "round(value, value)",
+    "round(value, 1.5)",
+    "value * 99999999999999999999999",
+    "value + 1e300",
+])
+def test_rejected_formulas(formula):
+    with pytest.raises(FormulaError):
+        compile_formula(formula)
+
+
+@pytest.mark.parametrize("formula, value, expected", [
+    (None, 7, 7),
+    ("", 7, 7),
+    ("value * 0.25", 8, 2.0),
+    ("x * 2 + 1", 3, 7),
+    ("(value - 40) / 2", 50, 5.0),
+    ("value ** 2 + 9 ** 2", 3, 90),
+    ("value & 0xFF", 0x1234, 0x34),
+    ("(value >> 4) << 1", 0xF0, 0x1E),
+    ("max(0, min(value, 100))", 250, 100),
+    ("round(sqrt(value), 1)", 2, 1.4),
+    ("round(value, -2)", 1234, 1200),
+    ("value & 0xFFFFFFFFFFFFFFFF", 5, 5),
+    ("-value", 5, -5),
+])
+def test_accepted_formulas(formula, value, expected):
+    assert compile_formula(formula)(value) == expected
+
+
+def test_evaluation_errors_become_formula_errors():
+    decoder = SignalDecoder(range(8), "little", "1 / (value - 1)")
+    assert decoder.decode(bytes([3])) == 0.5
+    with pytest.raises(FormulaError):
+        decoder.decode(bytes([1]))
+    with pytest.raises(FormulaError):
+        SignalDecoder(range(8), "little", "float(value) ** 64").apply(10 ** 10)
+
+
+def test_affine_formulas():
+    assert affine_formula("value * 0.5 - 40") == (0.5, -40.0)
+    assert affine_formula("(x + 10) / 4") == (0.25, 2.5)
+    assert affine_formula("-value") == (-1.0, 0.0)
+    assert affine_formula(None) == (1.0, 0.0)
+    assert affine_formula("value * value") is None
+    assert affine_formula("abs(value)") is None
+
+
+def test_decoder_for_submission_row():
+    row = {"bit_indices": "[8, 9, 10, 11, 12, 13, 14, 15]", "endian": "little", "formula": "value - 40"}
+    assert decoder_for(row).decode(bytes([0, 100])) == 60
+    window = {"offset_bits": 0, "length_bits": 16, "endian": "big", "formula": None}
+    assert decoder_for(window).decode(bytes([0x01, 0x02])) == 0x0102
+    signed = {"offset_bits": 0, "length_bits": 8, "endian": "little"}
+    assert decoder_for(signed, signed=True).decode(bytes([0xFF])) == -1
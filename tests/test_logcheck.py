@@ -0,0 +1,93 @@
+import numpy as np
+import pytest
+
+from app.decoder import FormulaError
+from app.logcheck import check_log, hex_payloads
+
+
+def spans(text: bytes, parts):
+    buf = np.frombuffer(text, dtype=np.uint8)
+    starts = np.array([text.index(p) for p in parts], dtype=np.int64)
+    ends = starts + np.array([len(p) for p in parts], dtype=np.int64)
+    return hex_payloads(buf, starts, ends)
+
+
+def test_hex_payloads_contiguous_and_short():
+    payloads, lengths = spans(b"x 0011AaFf y 12 z", [b"0011AaFf", b"12"])
+    assert payloads.tolist() == [[0x00, 0x11, 0xAA, 0xFF], [0x12, 0, 0, 0]]
+    assert lengths.tolist() == [4, 1]
+
+
+def test_hex_payloads_irregular_separators():
+    # Different separator columns per line take the general path
+    text = b"00 11\t22|0011 22|"
+    payloads, lengths = spans(text, [b"00 11\t22", b"0011 22"])
+    assert payloads[:, :3].tolist() == [[0x00, 0x11, 0x22], [0x00, 0x11, 0x22]]
+    assert lengths.tolist() == [3, 3]
+
+
+def test_hex_payloads_small_chunks():
+    text = b"|".join(b"%02X %02X" % (i, 255 - i) for i in range(10))
+    payloads, _ = hex_payloads(
+        np.frombuffer(text, dtype=np.uint8),
+        np.array([i * 6 for i in range(10)], dtype=np.int64),
+        np.array([i * 6 + 5 for i in range(10)], dtype=np.int64),
+        chunk=3,
+    )
+    assert payloads.tolist() == [[i, 255 - i, 0] for i in range(10)]
+
+
+@pytest.mark.parametrize("log, log_format", [
+    (b"(1.0) can0 7E8#10270000\n(1.5) can0 123#FF\n(2.0) can0 7E8#20270000\n", "candump"),
+    (b"(1.0) can0  7E8   [4]  10 27 00 00\n(2.0) can0  7E8   [4]  20 27 00 00\n", "candump-text"),
+    (b"date Mon\n1.0 1  7E8  Rx   d 4 10 27 00 00\n2.0 1  7E8  Rx   d 4 20 27 00 00\n", "asc"),
+    (b"1.0,7E8,4,10 27 00 00\n2.0,7E8,4,20 27 00 00\n", "csv"),
+])
+def test_check_log_formats(tmp_path, log, log_format):
+    path = tmp_path / "drive.log"
+    path.write_bytes(log)
+    mapping = {"can_id": "7E8", "bit_indices": list(range(16)), "endian": "little", "formula": "value * 0.25"}
+    result = check_log(str(path), mapping)
+    assert result["format"] == log_format
+    assert result["frames"] == 2
+    assert result["raw"]["min"] == 0x2710 and result["raw"]["max"] == 0x2720
+    assert result["value"]["first"] == 0x2710 * 0.25
+    assert result["rate_hz"] == 1.0
+
+
+def test_check_log_formula_error(tmp_path):
+    path = tmp_path / "drive.log"
+    path.write_bytes(b"(1.0) can0 7E8#0100000000000000\n")
+    # 64-bit windows are decoded with Python ints, where 1/0 raises
+    mapping = {"can_id": "7E8", "bit_indices": list(range(64)), "endian": "little", "formula": "1 / (value - 1)"}
+    with pytest.raises(FormulaError):
+        check_log(str(path), mapping)
+
+
+@pytest.mark.parametrize("formula", [
+    "value / (value - 1)",  # division by zero on the frame with raw 1
+    "(value * 1e200) ** 2",  # float overflow
+    "value ** 64 * 10",  # int64 would wrap; too large for a float
+])
+def test_check_log_vectorized_formula_errors(tmp_path, formula):
+    path = tmp_path / "drive.log"
+    path.write_bytes(b"(1.0) can0 7E8#FFFF\n(2.0) can0 7E8#0100\n")
+    mapping = {"can_id": "7E8", "bit_indices": list(range(16)), "endian": "little", "formula": formula}
+    with pytest.raises(FormulaError):
+        check_log(str(path), mapping)
+
+
+def test_check_log_large_integer_formula_not_wrapped(tmp_path):
+    path = tmp_path / "drive.log"
+    path.write_bytes(b"(1.0) can0 7E8#FFFFFFFF\n")
+    # (2 ** 32 - 1) ** 2 wraps in int64 arithmetic
+    mapping = {"can_id": "7E8", "bit_indices": list(range(32)), "endian": "little", "formula": "value ** 2"}
+    assert check_log(str(path), mapping)["value"]["max"] == float((2 ** 32 - 1) ** 2)
+    mapping["formula"] = "(value & 0xFF) << 56"
+    assert check_log(str(path), mapping)["value"]["max"] == float(0xFF << 56)
+
+
+def test_check_log_empty(tmp_path):
+    path = tmp_path / "empty.log"
+    path.write_bytes(b"")
+    assert check_log(str(path), {"can_id": "7E8", "bit_indices": [0]})["frames"] == 0
@@ -0,0 +1,106 @@
+import sqlite3
+
+import pytest
+
+import app.overlap as overlap
+from app.db import DB
+from app.overlap import IntervalIndex, Mapping, OverlapDetector, Run, bit_runs
+
+
+def run(start, end, name="a"):
+    return Run(start, end, Mapping("canData", None, None, name))
+
+
+def item(bits, can_id="7FF", name="p"):
+    return {"can_id": can_id, "is29bit": False, "bit_indices": bits, "parameter_name": name}
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = str(tmp_path / "o.sqlite")
+    con = sqlite3.connect(path)
+    con.executescript("""
+        CREATE TABLE canParameters (canParameterId INTEGER PRIMARY KEY, canParameterName_ru TEXT);
+        CREATE TABLE canData (pid BLOB, pidMask BLOB, is29Bit INTEGER, canParameterId INTEGER,
+                              generationId INTEGER, deprecated INTEGER);
+        CREATE TABLE submissions (id INTEGER PRIMARY KEY, vehicle_id INTEGER, parameter_id INTEGER,
+                                  parameter_name TEXT, can_id TEXT, is29bit INTEGER, bit_indices TEXT,
+                                  offset_bits INTEGER, length_bits INTEGER, status TEXT DEFAULT 'new');
+        INSERT INTO canParameters VALUES (1, 'Обороты');
+        -- CAN ID 0x7FF, bits 0..7 (first payload byte)
+        INSERT INTO canData VALUES (X'07FF', X'FF00000000000000', 0, 1, 10, 0);
+    """)
+    con.commit()
+    con.close()
+    database = DB(path)
+    monkeypatch.setattr(overlap, "db", database)
+    monkeypatch.setitem(overlap.bundle_report, "versioned", False)
+    yield path
+    database.close()
+
+
+def test_bit_runs_merge_contiguous_bits():
+    assert bit_runs([5, 1, 2, 3, 3, 9]) == [(1, 4), (5, 6), (9, 10)]
+    assert bit_runs([]) == []
+
+
+def test_adjacent_runs_do_not_overlap():
+    index = IntervalIndex([run(0, 4)])
+    assert index.overlapping(4, 8) == []
+    index.add(run(8, 12, "b"))
+    assert index.overlapping(4, 8) == []
+
+
+def test_overlapping_runs_found():
+    index = IntervalIndex([run(0, 4, "a"), run(6, 7, "b"), run(20, 30, "c")])
+    assert [r.mapping.parameter_name for r in index.overlapping(3, 7)] == ["a", "b"]
+    # A long run starting far before the window still overlaps it
+    assert [r.mapping.parameter_name for r in index.overlapping(29, 31)] == ["c"]
+
+
+def test_check_against_can_data(database):
+    detector = OverlapDetector()
+    conflicts = detector.check(10, [item([6, 7, 8]), item([9, 10])])
+    assert conflicts == [{
+        "item": 0, "can_id": "7FF", "bits": [6, 7],
+        "with": {"source": "canData", "id": 1, "parameter_id": 1, "parameter_name": "Обороты"},
+    }]
+    assert detector.check(11, [item([0])]) == []
+
+
+def test_check_intra_batch_conflicts(database):
+    detector = OverlapDetector()
+    rows = [item([10, 11], name="a"), item([12], name="b"), item([11, 12], name="c"), item([11], can_id="100")]
+    conflicts = detector.check(10, rows, labels=["l1", "l2", "l3", "l4"])
+    assert [(c["item"], c["bits"], c["with"]["id"]) for c in conflicts] == [("l3", [11, 11], "l1"), ("l3", [12, 12], "l2")]
+    assert all(c["with"]["source"] == "item" for c in conflicts)
+
+
+def test_saved_submissions_extend_cached_index(database, monkeypatch):
+    detector = OverlapDetector()
+    assert detector.check(10, [item([20])]) == []
+    cached = detector._generations[10]
+    builds = []
+    build = detector._build
+    monkeypatch.setattr(detector, "_build", lambda gen: builds.append(gen) or build(gen))
+
+    con = sqlite3.connect(database)
+    con.execute("INSERT INTO submissions (id, vehicle_id, can_id, is29bit, bit_indices) VALUES (1, 10, '7FF', 0, '[20]')")
+    con.commit()
+    detector.added(10, [item([20])], [1])
+    conflicts = detector.check(10, [item([20])])
+    assert [(c["with"]["source"], c["with"]["id"]) for c in conflicts] == [("submission", 1)]
+
+    # Saved by another process: read by id, not rebuilt, not added twice
+    con.execute("INSERT INTO submissions (id, vehicle_id, can_id, is29bit, bit_indices) VALUES (2, 10, '7FF', 0, '[21]')")
+    con.commit()
+    conflicts = detector.check(10, [item([20, 21])])
+    assert sorted(c["with"]["id"] for c in conflicts) == [1, 2]
+    assert builds == [] and detector._generations[10] is cached
+
+    # A canData change without the version table is caught by the row fingerprint
+    con.execute("UPDATE canData SET deprecated = 1")
+    con.commit()
+    con.close()
+    assert [c["with"]["source"] for c in detector.check(10, [item([0, 20])])] == ["submission"]
+    assert builds == [10]
@@ -0,0 +1,110 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from app.db import DB
+from app.writer import GroupCommitWriter, WriterBusy, WriterUnavailable
+
+
+@pytest.fixture
+def database(tmp_path):
+    path = str(tmp_path / "w.sqlite")
+    con = sqlite3.connect(path)
+    con.execute("CREATE TABLE t (v INTEGER UNIQUE)")
+    con.commit()
+    con.close()
+    return DB(path)
+
+
+def values(database):
+    con = sqlite3.connect(database.path)
+    try:
+        return sorted(v for (v,) in con.execute("SELECT v FROM t"))
+    finally:
+        con.close()
+
+
+def insert(v):
+    return lambda con: con.execute("INSERT INTO t (v) VALUES (?)", (v,)).lastrowid
+
+
+def test_failing_job_does_not_roll_back_its_group(database):
+    writer = GroupCommitWriter(database.connect, window_ms=200)
+    try:
+        # Queued within one window: committed as one group
+        futures = [writer.submit(insert(1)), writer.submit(insert(1)), writer.submit(insert(2))]
+        assert futures[0].result(timeout=5) == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            futures[1].result(timeout=5)
+        assert futures[2].result(timeout=5) == 2
+    finally:
+        writer.stop()
+    assert values(database) == [1, 2]
+
+
+def test_partial_writes_of_a_failing_job_are_undone(database):
+    def half_done(con):
+        con.execute("INSERT INTO t (v) VALUES (10)")
+        raise ValueError("boom")
+
+    writer = GroupCommitWriter(database.connect, window_ms=200)
+    try:
+        futures = [writer.submit(insert(9)), writer.submit(half_done), writer.submit(insert(11))]
+        with pytest.raises(ValueError):
+            futures[1].result(timeout=5)
+        assert [futures[0].result(timeout=5), futures[2].result(timeout=5)] == [1, 2]
+    finally:
+        writer.stop()
+    assert values(database) == [9, 11]
+
+
+def test_stop_commits_what_is_queued(database):
+    writer = GroupCommitWriter(database.connect, window_ms=50)
+    futures = [writer.submit(insert(v)) for v in range(5)]
+    writer.stop()
+    assert all(f.done() for f in futures)
+    assert values(database) == [0, 1, 2, 3, 4]
+
+
+def test_dead_writer_fails_waiting_callers(tmp_path):
+    missing = DB(str(tmp_path / "missing.sqlite"))
+    writer = GroupCommitWriter(missing.connect, timeout=10)
+    start = time.monotonic()
+    with pytest.raises(WriterUnavailable):
+        writer.run(insert(1))
+    assert time.monotonic() - start < 5
+    # The connection is opened with mode=rw: the file is never created
+    assert not missing.available()
+
+
+def test_timed_out_job_is_withdrawn(database):
+    release = threading.Event()
+    writer = GroupCommitWriter(database.connect, window_ms=0, timeout=0.2)
+    try:
+        blocker = writer.submit(lambda con: release.wait(5))
+        time.sleep(0.05)
+        with pytest.raises(WriterUnavailable):
+            writer.run(insert(1))
+        release.set()
+        assert blocker.result(timeout=5) is True
+        assert writer.run(insert(2)) is not None
+    finally:
+        release.set()
+        writer.stop()
+    assert values(database) == [2]
+
+
+def test_full_queue_raises_writer_busy(database):
+    release = threading.Event()
+    writer = GroupCommitWriter(database.connect, maxsize=1, window_ms=0)
+    try:
+        writer.submit(lambda con: release.wait(5))
+        time.sleep(0.05)
+        writer.submit(insert(1))
+        with pytest.raises(WriterBusy):
+            writer.submit(insert(2))
+    finally:
+        release.set()
+        writer.stop()